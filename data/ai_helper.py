@@ -1,4 +1,7 @@
-from data.technical_analysis import EMA, SMA, BollingerBands, MACD, RSI
+from data.models import HistoryFrame
+from data.technical_analysis import IndicatorPipeline, hurst_series
+
+import numpy as np
 
 import pandas as pd
 
@@ -15,20 +18,25 @@ def generate(securities) -> list():
 
     rows = list()
 
+    # the history of all securities in one query
+    frames = HistoryFrame.load_many([security for security in securities if security.type == "EQUITY"])
+
     for security in securities:
         if security.type != "EQUITY":
             logger.debug(f"skipping {security} as not an equity")
             continue
         else:
-            history = security.daily_data.order_by("date").all()
-            logger.info(f"processing {security} with {history.count()} entries in history")
+            frame = frames[security.pk]
+            history = list(zip(frame.date.tolist(), frame.close.tolist()))
+            logger.info(f"processing {security} with {len(history)} entries in history")
             
             # define the list of features
-            sma50 = SMA(50)         # mid term sma: rel. slope, delta, hurst and sigma delta
-            ema20 = EMA(20)         # short term ema: rel. slope, delta
-            macd = MACD()           # not sure if we want to use the MACD, requires a lot of regularisation
-            rsi = RSI()             # using a simple momentum indicator
-            bb = BollingerBands()   # bollinger bands
+            pipeline = IndicatorPipeline()
+            sma50 = pipeline.sma("sma50", 50)   # mid term sma: rel. slope, delta, hurst and sigma delta
+            pipeline.ema("ema20", 20)           # short term ema: rel. slope, delta
+            pipeline.macd("macd")               # not sure if we want to use the MACD, requires a lot of regularisation
+            pipeline.rsi("rsi")                 # using a simple momentum indicator
+            pipeline.bollinger("bb")            # bollinger bands
 
             previous_sma50 = 0
             previous_ema20 = 0
@@ -42,24 +50,26 @@ def generate(securities) -> list():
             macd_signal_list = list()
             macd_histogram_list = list()
 
+            # the rolling hurst for the whole history at once
+            hurst_values = hurst_series([close for date, close in history], 50)
+
             # loop through history
-            for entry in history:
+            for position, (date, close) in enumerate(history):
 
                 # the disctionary holding the different values
                 row = {}
 
-                # the close as input for all the indicators
-                close = float(entry.close)
-                # logger.debug(f"processing {entry.date} with close at {__close}")
-                
+                # the close is the input for all the indicators
+                # logger.debug(f"processing {date} with close at {close}")
+
                 # keep those three as reference
-                row["time"] = str(entry.date)
+                row["time"] = str(date)
                 row["close"] = close
                 row["symbol"] = security.symbol
 
                 # this will be our label
                 try:
-                    next_close = float(history[index + FORWARD_LABEL_SIZE].close)
+                    next_close = history[index + FORWARD_LABEL_SIZE][1]
                 except:
                     continue
 
@@ -79,16 +89,18 @@ def generate(securities) -> list():
                 
                 index += 1
 
-                # now we work on the features
+                # now we work on the features, feeding all indicators at once
+                values = pipeline.add(close)
+
                 # macd -> 3 values
-                macd_value = macd.add(close)
+                macd_value = values["macd"]
                 if macd_value is not None:
                     row["macd_line"] = macd_value[0]
                     row["macd_signal"] = macd_value[1]
                     row["macd_histogram"] = macd_value[2]
 
                 # ema20 -> 3
-                ema20_value = ema20.add(close)
+                ema20_value = values["ema20"]
                 if previous_ema20 != 0:
                     if ema20_value is not None and previous_ema20 is not None:
                         # just as a reference
@@ -101,11 +113,13 @@ def generate(securities) -> list():
                 previous_ema20 = ema20_value
 
                 # sma50 -> 5
-                sma50_value = sma50.add(close)
+                sma50_value = values["sma50"]
                 if previous_sma50 != 0:
                     if sma50_value is not None and previous_sma50 is not None:
                         sma50_sd = sma50.sigma_delta()
-                        sma50_hurst = sma50.hurst()
+                        sma50_hurst = hurst_values[position]
+                        if np.isnan(sma50_hurst):
+                            sma50_hurst = None
                         if (
                             sma50_value is not None
                             and sma50_sd is not None
@@ -122,7 +136,7 @@ def generate(securities) -> list():
                 previous_sma50 = sma50_value
 
                 # rsi -> 2
-                rsi_value = rsi.add(close)
+                rsi_value = values["rsi"]
                 if previous_rsi != 0:
                     if rsi_value is not None and previous_rsi is not None:
                         row["rsi_value"] = rsi_value
@@ -131,7 +145,7 @@ def generate(securities) -> list():
                 previous_rsi = rsi_value
 
                 # bollinger bands -> 1
-                bb_value = bb.add(close)
+                bb_value = values["bb"]
                 if bb_value is not None:
                     bb_center = (bb_value[0] + bb_value[1])/2
                     bb_position_rel = close - bb_center
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DataConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "data"
+
+    def ready(self):
+        # connects the signal receivers
+        from data import signals  # noqa: F401
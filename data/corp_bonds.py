@@ -1,5 +1,4 @@
 import pymongo
-import time
 import urllib3
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
@@ -8,6 +7,7 @@ from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from data.technical_analysis import EMA
 
+from data import rate_limit
 from data.meta_dao import MetaData_Factory
 
 from logging import getLogger
@@ -144,6 +144,7 @@ class OnlineReader:
 
         url += "&_=" + str(milliseconds)
 
+        rate_limit.limiter("Finra").acquire()
         response = self._http.request("GET", url, headers={"Cookie": self.__cookie__})
 
         logger.debug(f"Response for {response.geturl()}: {response.status} ... ")
@@ -290,7 +291,6 @@ def update_range(from_date: str, to_date: str) -> int:
                         local_dao.write(online_data)
                 except RuntimeError as rt:
                     logger.warn(f"Could not get data for {d}: {rt}")
-                time.sleep(4)
         d += delta
     
     return update_count
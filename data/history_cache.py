@@ -0,0 +1,128 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from django.conf import settings
+
+from data.models import Security, DailyUpdate, HistoryFrame
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# one record per bar, the columns of a HistoryFrame
+DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("adj_close", "f8"),
+    ("volume", "i8"),
+])
+
+
+def _cache_dir() -> Path:
+    return Path(getattr(settings, "HISTORY_CACHE_DIR", settings.BASE_DIR / "history_cache"))
+
+
+def _marker(security: Security) -> Optional[tuple]:
+    """
+    (id, date) of the daily update marker, recreated with every update of the history
+    """
+    return DailyUpdate.objects.filter(security=security).values_list("pk", "date").first()
+
+
+def _path(security: Security, interval: str, marker: tuple) -> Path:
+    pk, day = marker
+    return _cache_dir() / f"{security.pk}_{interval}_{day:%Y%m%d}_{pk}.npy"
+
+
+def write(security: Security, interval: str = "d", marker: Optional[tuple] = None) -> Optional[Path]:
+    """
+    writes the history of the given interval (d, w or m) to the cache file of the current daily update
+    and removes the files of previous updates; returns the path or None if there is no update marker
+    or the marker has been replaced meanwhile
+
+    the file is written next to its destination and renamed, so readers either map the previous or
+    the complete new file
+    """
+    if interval not in HistoryFrame.intervals:
+        raise ValueError(f"Invalid interval {interval}.")
+    if marker is None:
+        marker = _marker(security)
+        if marker is None:
+            return None
+
+    frame = HistoryFrame.load(security, interval)
+    bars = np.empty(len(frame), dtype=DTYPE)
+    for name in DTYPE.names:
+        bars[name] = getattr(frame, name)
+
+    path = _path(security, interval, marker)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            np.save(file, bars)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+    # the marker has been replaced while writing, the file of the new marker is written by its update
+    if _marker(security) != tuple(marker):
+        path.unlink(missing_ok=True)
+        return None
+
+    # processes still mapping a removed file keep reading it until they are done; the markers are
+    # recreated with ascending ids, files of newer markers are kept
+    for stale in path.parent.glob(f"{security.pk}_{interval}_*.npy"):
+        if stale != path and int(stale.stem.rsplit("_", 1)[1]) < marker[0]:
+            stale.unlink(missing_ok=True)
+
+    logger.debug(f"cached {len(bars)} bars of {security} in {path}")
+    return path
+
+
+def load(security: Security, interval: str = "d", start=None, end=None, limit: Optional[int] = None) -> HistoryFrame:
+    """
+    the history as HistoryFrame.load returns it, with the columns mapped read only from the cache
+    file of the current daily update, so all processes share the same pages; the file is written if
+    missing and the database is used if there is no update marker or the cache is not usable
+    """
+    if interval not in HistoryFrame.intervals:
+        raise ValueError(f"Invalid interval {interval}.")
+
+    marker = _marker(security)
+    if marker is None:
+        return HistoryFrame.load(security, interval, start=start, end=end, limit=limit)
+
+    path = _path(security, interval, marker)
+    try:
+        try:
+            bars = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            # the file is only written for the current marker, the marker read may have been replaced
+            path = write(security, interval)
+            if path is None:
+                return HistoryFrame.load(security, interval, start=start, end=end, limit=limit)
+            bars = np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as error:
+        logger.warning(f"history cache of {security} not usable: {error}")
+        return HistoryFrame.load(security, interval, start=start, end=end, limit=limit)
+
+    # the bars are ascending by date
+    first, last = 0, len(bars)
+    if start is not None:
+        first = np.searchsorted(bars["date"], np.datetime64(start, "D"), side="left")
+    if end is not None:
+        last = np.searchsorted(bars["date"], np.datetime64(end, "D"), side="right")
+    if limit is not None:
+        first = max(first, last - limit)
+    bars = bars[first:last]
+
+    return HistoryFrame(*(bars[name] for name in DTYPE.names))
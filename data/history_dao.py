@@ -2,10 +2,10 @@ import json
 import csv
 import urllib3
 from io import StringIO
-import decimal
 
 import pymongo
 import threading
+from multiprocessing.pool import ThreadPool
 
 lock = threading.Lock()
 
@@ -19,8 +19,11 @@ from logging import getLogger
 
 logger = getLogger(__name__)
 
-from data.models import Daily, Security
+from typing import Optional
+
+from data.models import Daily, Weekly, Monthly, Security
 from data.meta_dao import MetaData_Factory
+from data import lookup_cache, rate_limit, single_flight
 
 
 class Interval(Enum):
@@ -30,6 +33,14 @@ class Interval(Enum):
     MONTHLY = "1mo"
 
 
+# the model storing the history of an interval
+HISTORY_MODELS = {
+    Interval.DAILY: Daily,
+    Interval.WEEKLY: Weekly,
+    Interval.MONTHLY: Monthly,
+}
+
+
 def synchronized(lock):
     """ Synchronization decorator """
     def wrap(f):
@@ -73,6 +84,10 @@ class History_DAO_Factory():
             raise ValueError(format)
         
 
+# concurrent price requests, as well the connections kept per host
+PRICE_REQUESTS = 8
+
+
 class YahooDAO():
     _instance = None
     _lock = threading.Lock()
@@ -91,7 +106,7 @@ class YahooDAO():
                     cls._instance = super(YahooDAO, cls).__new__(cls)
                     # initialisation
                     # cls._http_client = urllib3.HTTPConnectionPool("yahoo.com", maxsize=10)
-                    cls._history_client = urllib3.PoolManager()
+                    cls._history_client = urllib3.PoolManager(maxsize=PRICE_REQUESTS)
                     # cls._mongo_db = MetaData_Factory().db("market_analysis")
                     # we have to ensure, that each process receives its own client 
                     cls._mongo_db = MetaData_Factory().client().db["market_analysis"]
@@ -109,6 +124,7 @@ class YahooDAO():
 
         """
 
+        rate_limit.limiter("YahooQuotes").acquire()
         http = self._history_client
         r = http.request(
             "GET",
@@ -159,29 +175,53 @@ class YahooDAO():
                     "shortName":"Apple Inc.","longName":"Apple Inc.","currency":"USD","quoteSourceName":"Nasdaq Real Time Price",
                     "currencySymbol":"$","fromCurrency":null,"toCurrency":null,"lastMarket":null,"volume24Hr":{},"volumeAllCurrencies":{},"circulatingSupply":{},"marketCap":{"raw":2649060540416,"fmt":"2.65T","longFmt":"2,649,060,540,416.00"}}}],"error":null}}
         """
-        _price = self._mongo_db["yahoo_price"]
+        return self.lookupPrices([symbol])[symbol]
 
-        try:
-            # check if we have a price entry in the mongo-db
-            db_price = _price.find_one({"symbol": symbol})
-            if db_price is None:
-                logger.debug("no 'price' for %s" % symbol)
+    def lookupPrices(self, symbols: list) -> dict:
+        """
+        returns the "price" data set, as lookupPrice does, keyed by symbol
+
+        the cached prices are read with a single query, the prices not cached or outdated are
+        requested concurrently and written back at once; a price requested by another thread or
+        process is awaited instead of requested again
+        """
+        _price = lookup_cache.shared("yahoo_price", self._mongo_db)
+        symbols = list(dict.fromkeys(symbols))
+
+        prices, outdated = _price.get_many(symbols)
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if len(missing) == 0:
+            return prices
+
+        def fetch(symbols: list) -> dict:
+            # quoteSummary serves a single symbol, the requests share the connections of the pool
+            with ThreadPool(min(len(symbols), PRICE_REQUESTS)) as pool:
+                requested = dict(zip(symbols, pool.map(self._request_price, symbols)))
+            _price.put_many({symbol: price for symbol, (price, _) in requested.items() if price is not None})
+            return requested
+
+        def cached(symbols: list) -> dict:
+            return {symbol: (price, None) for symbol, price in _price.get_many(symbols)[0].items()}
+
+        # concurrent lookups of the same symbols, in this or other processes, wait for one request
+        requested = single_flight.shared(self._mongo_db).do_many("yahoo:price", missing, fetch, cached)
+
+        for symbol in missing:
+            price, error_description = requested[symbol]
+            if price is not None:
+                prices[symbol] = price
+            elif symbol in outdated:
+                prices[symbol] = outdated[symbol]
             else:
-                # check if the available entry is older than 5 minutes
-                entry_ts = db_price["timestamp"]
-                current_ts = datetime.now().timestamp()
-
-                if entry_ts + 300 > current_ts:   # for production 5 minutes
-                #if entry_ts + 3600 > current_ts:  # for testing 1 hour
-                    # print(f"serving price for {symbol} from db")
-                    logger.debug("serving price for %s from db" % symbol)
-                    return db_price["price"]
-                else:
-                    logger.debug("update of price required for %s" % symbol)
+                prices[symbol] = {"error": error_description}
 
-        except pymongo.errors.ServerSelectionTimeoutError as e:
-            logger.error("Could not read data from locale storage: ", e)
+        return prices
 
+    def _request_price(self, symbol: str) -> tuple:
+        """
+        requests the "price" data set, returns (price, None) or (None, error description)
+        """
+        rate_limit.limiter("YahooQuotes").acquire()
         http = self._history_client
         r = http.request(
             "GET",
@@ -198,11 +238,7 @@ class YahooDAO():
         summary_profile = json.loads(r.data.decode("utf-8"))
 
         if r.status == 200:
-            price = summary_profile["quoteSummary"]["result"][0]["price"]
-
-            _data = {"timestamp": datetime.now().timestamp(), "price": price}
-            _price.update_one({"symbol": symbol}, {"$set": _data}, upsert=True)
-            return price
+            return summary_profile["quoteSummary"]["result"][0]["price"], None
         else:
             logger.error("status for requesting 'price' of %s: %s " % (symbol, r.status))
             if "finance" in summary_profile:
@@ -212,26 +248,25 @@ class YahooDAO():
             else:
                 logger.error(summary_profile)
                 error_description = f"could not get quoteSummary for {symbol}"
-            
-            logger.error(f"with error: {error_description}")
-            if db_price is not None:
-                return db_price["price"]
-            else:
-                return {"error": error_description}
 
-            
+            logger.error(f"with error: {error_description}")
+            return None, error_description
 
-    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200):
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date: Optional[date] = None):
         """
-        returns, if found, the "historic" data set
+        returns, if found, the "historic" data set, starting look_back days ago or at start_date
         """
 
         to_time = int(round(time()))
-        start_time: datetime = datetime.today() - timedelta(days=look_back)
+        if start_date is not None:
+            start_time: datetime = datetime.combine(start_date, datetime.min.time())
+        else:
+            start_time: datetime = datetime.today() - timedelta(days=look_back)
         from_time = int(round(start_time.timestamp()))
 
         # print(f"requesting from: {from_time} to: {to_time} with interval: {interval.value}")
 
+        rate_limit.limiter("Yahoo").acquire()
         http = self._history_client
         r = http.request(
             "GET",
@@ -271,14 +306,14 @@ class YahooDAO():
             close_str = row["Close"]
             volume_str = row["Volume"]
 
-            entry = Daily(
+            entry = HISTORY_MODELS[interval](
                 date=datetime.strptime(date_str, "%Y-%m-%d").date(),
                 security=security,
-                open_price=decimal.Decimal(open_str),
-                high_price=decimal.Decimal(high_str),
-                low=decimal.Decimal(low_str),
-                close=decimal.Decimal(close_str),
-                adj_close=decimal.Decimal(close_adj_str),
+                open_price=float(open_str),
+                high_price=float(high_str),
+                low=float(low_str),
+                close=float(close_str),
+                adj_close=float(close_adj_str),
                 volume=int(volume_str),
             )
 
@@ -286,35 +321,55 @@ class YahooDAO():
 
         return historic_entries
 
-    def lookup_default_key_statistics(self, security: Security) -> dict:
+    def lookup_modules(self, security: Security, modules: list) -> dict:
         """
-        returns, if found, the "defaultKeyStatistics" data set
+        returns, if found, the data set of each of the quoteSummary modules, e.g. "financialData",
+        keyed by module; a module not found holds {"error": description}
+
+        each module is cached in the lookup cache of its name, the modules not cached are requested
+        with a single quoteSummary request
         """
         if security.type != "EQUITY":
-            return {"error": "Not an equity."}
+            return {module: {"error": "Not an equity."} for module in modules}
         else:
             symbol = security.symbol
 
-        _defaultKeyStatistics = self._mongo_db["defaultKeyStatistics"]
-        try:
-            # check if we have a price entry in the mongo-db
-            defaultKeyStatistics = _defaultKeyStatistics.find_one({"symbol": symbol})
-            if defaultKeyStatistics is None:
-                logger.debug("no 'default key statistics' for %s" % symbol)
-            else:
-                # check if the available entry is older than 5 minutes
-                entry_ts = defaultKeyStatistics["timestamp"]
-                current_ts = datetime.now().timestamp()
-
-                if entry_ts + 86400 > current_ts:  # for testing 1 day
-                    print(f"serving 'defaultKeyStatistics' for {symbol} from db")
-                    return defaultKeyStatistics["defaultKeyStatistics"]
-                else:
-                    print(f"need to refresh the 'defaultKeyStatistics' in the database")
-
-        except pymongo.errors.ServerSelectionTimeoutError as e:
-            print("Could not write data to locale storage: ", e)
+        caches = {module: lookup_cache.shared(module, self._mongo_db) for module in modules}
+        result = dict()
+        for module, cache in caches.items():
+            value = cache.get(symbol)
+            if value is not None:
+                result[module] = value
+
+        missing = [module for module in modules if module not in result]
+        if len(missing) == 0:
+            return result
+
+        def fetch(modules: list) -> dict:
+            requested = self._request_modules(symbol, modules)
+            for module, value in requested.items():
+                if "error" not in value:
+                    caches[module].put(symbol, value)
+            return requested
+
+        def cached(modules: list) -> dict:
+            values = dict()
+            for module in modules:
+                value = caches[module].get(symbol)
+                if value is not None:
+                    values[module] = value
+            return values
+
+        # concurrent lookups of the same modules, in this or other processes, wait for one request
+        result.update(single_flight.shared(self._mongo_db).do_many(f"yahoo:{symbol}", missing, fetch, cached))
+        return result
 
+    def _request_modules(self, symbol: str, modules: list) -> dict:
+        """
+        requests the quoteSummary modules with a single request, keyed by module; a module not
+        found holds {"error": description}
+        """
+        rate_limit.limiter("YahooQuotes").acquire()
         http = self._history_client
         r = http.request(
             "GET",
@@ -323,221 +378,55 @@ class YahooDAO():
                 "formatted": "true",
                 "lang": "en-US",
                 "region": "US",
-                "modules": "defaultKeyStatistics",
+                "modules": ",".join(modules),
                 "corsDomain": "finance.yahoo.com",
             },
         )
         logger.debug(
-            "status for requesting 'default key statistics' of %s: %s "
-            % (symbol, r.status)
+            "status for requesting %s of %s: %s " % (modules, symbol, r.status)
         )
         summary_profile = json.loads(r.data.decode("utf-8"))
 
+        result = dict()
         if r.status == 200:
-            defaultKeyStatistics = summary_profile["quoteSummary"]["result"][0][
-                "defaultKeyStatistics"
-            ]
-
-            _data = {
-                "timestamp": datetime.now().timestamp(),
-                "defaultKeyStatistics": defaultKeyStatistics,
-            }
-            _defaultKeyStatistics.update_one(
-                {"symbol": symbol}, {"$set": _data}, upsert=True
-            )
-            return defaultKeyStatistics
+            summary = summary_profile["quoteSummary"]["result"][0]
+            for module in modules:
+                # yahoo leaves out the modules without data
+                result[module] = summary.get(module, {"error": f"no {module} for {symbol}"})
         else:
-            error = summary_profile["quoteSummary"]["error"]
-            return {"error": error["description"]}
+            if "finance" in summary_profile:
+                error_description = summary_profile["finance"]["error"]["description"]
+            else:
+                error_description = summary_profile["quoteSummary"]["error"]["description"]
+            logger.error(f"requesting {modules} of {symbol} failed with error: {error_description}")
+            for module in modules:
+                result[module] = {"error": error_description}
+
+        return result
+
+    def lookup_default_key_statistics(self, security: Security) -> dict:
+        """
+        returns, if found, the "defaultKeyStatistics" data set
+        """
+        return self.lookup_modules(security, ["defaultKeyStatistics"])["defaultKeyStatistics"]
 
-    # assetProfile
     def lookupAssetProfile(self, security: Security) -> dict:
         """
         returns, if found, the "assetProfile" data set
         """
-        if security.type != "EQUITY":
-            return {"error": "Not an equity."}
-        else:
-            symbol = security.symbol
-        _collection_assetProfile = self._mongo_db["assetProfile"]
-        try:
-            # check if we have a price entry in the mongo-db
-            assetProfile = _collection_assetProfile.find_one({"symbol": symbol})
-            if assetProfile is None:
-                print(f"no price object for {symbol}")
-            else:
-                # check if the available entry is older than 5 minutes
-                entry_ts = assetProfile["timestamp"]
-                current_ts = datetime.now().timestamp()
-
-                if entry_ts + 86400 > current_ts:  # for testing 1 day
-                    print(f"serving 'assetProfile' for {symbol} from db")
-                    return assetProfile["assetProfile"]
-                else:
-                    print(f"need to refresh the 'assetProfile' in the database")
-
-        except pymongo.errors.ServerSelectionTimeoutError as e:
-            print("Could not write data to locale storage: ", e)
-
-        http = self._history_client
-        r = http.request(
-            "GET",
-            "https://query2.finance.yahoo.com/v10/finance/quoteSummary/" + symbol,
-            fields={
-                "formatted": "true",
-                "lang": "en-US",
-                "region": "US",
-                "modules": "assetProfile",
-                "corsDomain": "finance.yahoo.com",
-            },
-        )
-        logger.debug(
-            "status for requesting 'asset profile' of %s: %s " % (symbol, r.status)
-        )
-        summary_profile = json.loads(r.data.decode("utf-8"))
-
-        if r.status == 200:
-            assetProfile = summary_profile["quoteSummary"]["result"][0]["assetProfile"]
-
-            _data = {
-                "timestamp": datetime.now().timestamp(),
-                "assetProfile": assetProfile,
-            }
-            _collection_assetProfile.update_one(
-                {"symbol": symbol}, {"$set": _data}, upsert=True
-            )
-            return assetProfile
-        else:
-            error = summary_profile["quoteSummary"]["error"]
-            return {"error": error["description"]}
+        return self.lookup_modules(security, ["assetProfile"])["assetProfile"]
 
-    # financialData
     def lookup_financial_data(self, security: Security) -> dict:
         """
         returns, if found, the "financialData" data set
         """
-        if security.type != "EQUITY":
-            return {"error": "Not an equity."}
-        else:
-            symbol = security.symbol
-        _collection_financialData = self._mongo_db["financialData"]
-        try:
-            # check if we have a price entry in the mongo-db
-            financialData = _collection_financialData.find_one({"symbol": symbol})
-            if financialData is None:
-                print(f"no price object for {symbol}")
-            else:
-                # check if the available entry is older than 5 minutes
-                entry_ts = financialData["timestamp"]
-                current_ts = datetime.now().timestamp()
-
-                if entry_ts + 86400 > current_ts:  # for testing 1 day
-                    print(f"serving 'financialData' for {symbol} from db")
-                    return financialData["financialData"]
-                else:
-                    print(f"need to refresh the 'financialData' in the database")
-
-        except pymongo.errors.ServerSelectionTimeoutError as e:
-            print("Could not write data to locale storage: ", e)
-
-        http = self._history_client
-        r = http.request(
-            "GET",
-            "https://query2.finance.yahoo.com/v10/finance/quoteSummary/" + symbol,
-            fields={
-                "formatted": "true",
-                "lang": "en-US",
-                "region": "US",
-                "modules": "financialData",
-                "corsDomain": "finance.yahoo.com",
-            },
-        )
-        logger.debug(
-            "status for requesting 'finacial data' of %s: %s " % (symbol, r.status)
-        )
-        summary_profile = json.loads(r.data.decode("utf-8"))
-
-        if r.status == 200:
-            financialData = summary_profile["quoteSummary"]["result"][0][
-                "financialData"
-            ]
-
-            _data = {
-                "timestamp": datetime.now().timestamp(),
-                "financialData": financialData,
-            }
-            _collection_financialData.update_one(
-                {"symbol": symbol}, {"$set": _data}, upsert=True
-            )
-            return financialData
-        else:
-            error = summary_profile["quoteSummary"]["error"]
-            return {"error": error["description"]}
+        return self.lookup_modules(security, ["financialData"])["financialData"]
 
-    # summary_detail
     def lookup_summary_detail(self, security: Security) -> dict:
         """
         returns, if found, the "summaryDetail" data set
         """
-        if security.type != "EQUITY":
-            return {"error": "Not an equity."}
-        else:
-            symbol = security.symbol
-
-        _collection_summaryDetail = self._mongo_db["summaryDetail"]
-        try:
-            # check if we have a price entry in the mongo-db
-            summaryDetail = _collection_summaryDetail.find_one({"symbol": symbol})
-            if summaryDetail is None:
-                logger.debug("no 'summary detail' for %s" % symbol)
-            else:
-                # check if the available entry is older than 5 minutes
-                entry_ts = summaryDetail["timestamp"]
-                current_ts = datetime.now().timestamp()
-
-                if entry_ts + 86400 > current_ts:  # for testing 1 day
-                    logger.debug("serving 'summary detail' for %s from db " % symbol)
-                    return summaryDetail["summaryDetail"]
-                else:
-                    logger.debug("need to refresh 'summary detail' for %s" % symbol)
-
-        except pymongo.errors.ServerSelectionTimeoutError as e:
-            logger.error("Could not write data to local storage: %s" % e)
-
-        http = self._history_client
-        r = http.request(
-            "GET",
-            "https://query2.finance.yahoo.com/v10/finance/quoteSummary/" + symbol,
-            fields={
-                "formatted": "true",
-                "lang": "en-US",
-                "region": "US",
-                "modules": "summaryDetail",
-                "corsDomain": "finance.yahoo.com",
-            },
-        )
-        logger.debug(
-            "status for requesting 'summary detail' of %s: %s " % (symbol, r.status)
-        )
-
-        summary_profile = json.loads(r.data.decode("utf-8"))
-
-        if r.status == 200:
-            summaryDetail = summary_profile["quoteSummary"]["result"][0][
-                "summaryDetail"
-            ]
-
-            _data = {
-                "timestamp": datetime.now().timestamp(),
-                "summaryDetail": summaryDetail,
-            }
-            _collection_summaryDetail.update_one(
-                {"symbol": symbol}, {"$set": _data}, upsert=True
-            )
-            return summaryDetail
-        else:
-            error = summary_profile["quoteSummary"]["error"]
-            return {"error": error["description"]}
+        return self.lookup_modules(security, ["summaryDetail"])["summaryDetail"]
 
 
 class PolygonDAO:
@@ -556,12 +445,15 @@ class PolygonDAO:
 
         return cls._instance
 
-    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200):
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date: Optional[date] = None):
         # Contact API
 
         # data used to complie the query to get the history -> 2year in this case
         now = datetime.now()
-        fromDate = (now - timedelta(look_back)).strftime("%Y-%m-%d")
+        if start_date is not None:
+            fromDate = start_date.strftime("%Y-%m-%d")
+        else:
+            fromDate = (now - timedelta(look_back)).strftime("%Y-%m-%d")
         endDate = now.strftime("%Y-%m-%d")
 
         logger.debug(
@@ -573,6 +465,7 @@ class PolygonDAO:
         else:
             range = "nope"
 
+        rate_limit.limiter("Polygon").acquire()
         http = self._http_client
         try:
             r = http.request(
@@ -664,24 +557,13 @@ class PolygonDAO:
                     "currencySymbol":"$","fromCurrency":null,"toCurrency":null,"lastMarket":null,"volume24Hr":{},"volumeAllCurrencies":{},"circulatingSupply":{},"marketCap":{"raw":2649060540416,"fmt":"2.65T","longFmt":"2,649,060,540,416.00"}}}],"error":null}}
         """
 
-        _price = self._mongo_db["polygon_price"]
-        try:
-            # check if we have a price entry in the mongo-db
-            price = _price.find_one({"symbol": symbol})
-            return price["price"]
-        except:
-            logger.warn("No data found for " + symbol)
-            return None
+        price = lookup_cache.shared("polygon_price", self._mongo_db).get(symbol)
+        if price is None:
+            logger.warning("No data found for " + symbol)
+        return price
 
     def storePriceMetadata(self, metadata):
-        _price = self._mongo_db["polygon_price"]
-        try:
-            _data = {"timestamp": datetime.now().timestamp(), "price": metadata}
-            _price.update_one(
-                {"symbol": metadata["symbol"]}, {"$set": _data}, upsert=True
-            )
-        except:
-            logger.info("Could not store data")
+        lookup_cache.shared("polygon_price", self._mongo_db).put(metadata["symbol"], metadata)
 
     def lookupSymbol(self, symbol):
         return None
@@ -711,20 +593,24 @@ class TiingoDAO:
                     cls._mongo_db = MetaData_Factory().client().db["market_analysis"]
         return cls._instance
 
-    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200):
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date: Optional[date] = None):
         """
-        returns, if found, the "historic" data set
+        returns, if found, the "historic" data set, starting look_back days ago or at start_date
         """
 
         # data used to complie the query to get the history -> 2year in this case
         now = datetime.now()
-        fromDate = (now - timedelta(look_back)).strftime("%Y-%m-%d")
+        if start_date is not None:
+            fromDate = start_date.strftime("%Y-%m-%d")
+        else:
+            fromDate = (now - timedelta(look_back)).strftime("%Y-%m-%d")
         endDate = now.strftime("%Y-%m-%d")
 
         logger.debug(
             f"requesting {security.symbol} from: {fromDate} to: {endDate} with interval: {interval.value}"
         )
 
+        rate_limit.limiter("Tiingo").acquire()
         http = self._history_client
         r = http.request(
             "GET",
@@ -768,11 +654,11 @@ class TiingoDAO:
             entry = Daily(
                 date=datetime.strptime(date_str, "%Y-%m-%d").date(),
                 security=security,
-                open_price=decimal.Decimal(open_str),
-                high_price=decimal.Decimal(high_str),
-                low=decimal.Decimal(low_str),
-                close=decimal.Decimal(close_str),
-                adj_close=decimal.Decimal(close_adj_str),
+                open_price=float(open_str),
+                high_price=float(high_str),
+                low=float(low_str),
+                close=float(close_str),
+                adj_close=float(close_adj_str),
                 volume=int(volume_str),
             )
 
@@ -806,24 +692,13 @@ class TiingoDAO:
                     "currencySymbol":"$","fromCurrency":null,"toCurrency":null,"lastMarket":null,"volume24Hr":{},"volumeAllCurrencies":{},"circulatingSupply":{},"marketCap":{"raw":2649060540416,"fmt":"2.65T","longFmt":"2,649,060,540,416.00"}}}],"error":null}}
         """
 
-        _price = self._mongo_db["polygon_price"]
-        try:
-            # check if we have a price entry in the mongo-db
-            price = _price.find_one({"symbol": symbol})
-            return price["price"]
-        except:
-            logger.warn("No data found for " + symbol)
-            return None
+        price = lookup_cache.shared("polygon_price", self._mongo_db).get(symbol)
+        if price is None:
+            logger.warning("No data found for " + symbol)
+        return price
 
     def storePriceMetadata(self, metadata):
-        _price = self._mongo_db["polygon_price"]
-        try:
-            _data = {"timestamp": datetime.now().timestamp(), "price": metadata}
-            _price.update_one(
-                {"symbol": metadata["symbol"]}, {"$set": _data}, upsert=True
-            )
-        except:
-            logger.info("Could not store data")
+        lookup_cache.shared("polygon_price", self._mongo_db).put(metadata["symbol"], metadata)
 
     def lookupSymbol(self, symbol):
         return None
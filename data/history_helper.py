@@ -0,0 +1,204 @@
+from django.db import DatabaseError, router, transaction
+from urllib3.exceptions import HTTPError
+
+from datetime import date
+import numpy as np
+
+from data import history_cache
+from data.history_dao import History_DAO_Factory, Interval, HISTORY_MODELS
+from data.indicator_helper import update_indicators
+from data.models import Security, DataProvider, Daily, DailyUpdate, WeeklyUpdate, MonthlyUpdate, HistoryFrame
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# the model marking the last update of an interval
+UPDATE_MODELS = {
+    Interval.DAILY: DailyUpdate,
+    Interval.WEEKLY: WeeklyUpdate,
+    Interval.MONTHLY: MonthlyUpdate,
+}
+
+# number of stored bars requested again to detect revisions or splits
+OVERLAP = 5
+
+# relative difference of the close tolerated within the overlap
+TOLERANCE = 1e-6
+
+# the intervals derived from the stored daily history instead of being requested from the provider
+RESAMPLED = {
+    Interval.WEEKLY: "w",
+    Interval.MONTHLY: "m",
+}
+
+
+def _matches(stored, requested) -> bool:
+    """
+    True if the requested bar confirms the stored one
+    """
+    stored_close = float(stored.close)
+    return abs(float(requested.close) - stored_close) <= TOLERANCE * max(1.0, abs(stored_close))
+
+
+def _write_cache(security: Security, interval: Interval) -> None:
+    try:
+        history_cache.write(security, RESAMPLED.get(interval, "d"))
+    except OSError as error:
+        logger.warning(f"could not cache the {interval.name.lower()} history of {security}: {error}")
+
+
+def _merge_history(security: Security, interval: Interval, result: list, prune: bool = False) -> dict:
+    update_model = UPDATE_MODELS[interval]
+    with transaction.atomic(using=router.db_for_write(update_model)):
+        counts = HISTORY_MODELS[interval].merge(security, result, prune=prune)
+        # the update date is set on creation
+        update_model.objects.filter(security=security).delete()
+        update_model.objects.create(security=security)
+        # readers map the cache file of the new daily update once it is visible
+        transaction.on_commit(lambda: _write_cache(security, interval))
+    return counts
+
+
+def resample_history(security: Security, interval: Interval, complete: bool = False) -> int:
+    """
+    derives the weekly or monthly history from the stored daily bars, returns the number of bars
+    written
+
+    only the period of the latest stored bar, which may have been partial, and the periods after it
+    are recomputed; complete recomputes all periods covered by the daily history, i.e. after it has
+    been revised
+    """
+    model = HISTORY_MODELS[interval]
+    start = None
+    if not complete:
+        latest = model.objects.filter(security=security).values_list("date", flat=True).first()
+        if latest is not None:
+            start = HistoryFrame.period_start(np.array([latest], dtype="datetime64[D]"), RESAMPLED[interval])[0].item()
+
+    frame = HistoryFrame.load(security, "d", start=start).resample(RESAMPLED[interval])
+    if len(frame) == 0:
+        return 0
+
+    result = [
+        model(date=day, open_price=open_price, high_price=high, low=low, close=close, adj_close=adj_close, volume=volume)
+        for day, open_price, high, low, close, adj_close, volume in zip(
+            frame.date.astype(object), frame.open.tolist(), frame.high.tolist(), frame.low.tolist(),
+            frame.close.tolist(), frame.adj_close.tolist(), frame.volume.tolist(),
+        )
+    ]
+    with transaction.atomic(using=router.db_for_write(model)):
+        if complete:
+            # bars within the resampled range not matching a period start, i.e. dated by the provider
+            model.objects.filter(security=security, date__gte=result[0].date).exclude(
+                date__in=[entry.date for entry in result]
+            ).delete()
+        counts = _merge_history(security, interval, result)
+    logger.debug(f"resampled the {interval.name.lower()} history of {security}: {counts}")
+    return counts["inserted"] + counts["updated"]
+
+
+def _derive_from_daily(security: Security, since=None, complete: bool = False) -> None:
+    """
+    resamples the weekly and monthly history and updates the indicators from since on
+    """
+    for interval in RESAMPLED:
+        resample_history(security, interval, complete=complete)
+    update_indicators(security, since=since, complete=complete)
+
+
+def _request_history(security: Security, interval: Interval, look_back: int, online_dao) -> tuple:
+    """
+    requests the bars missing since the latest stored ones, see update_history; returns the bars and
+    whether they are the complete history, None if the response is not usable
+    """
+    model = HISTORY_MODELS[interval]
+
+    stored = list(model.objects.filter(security=security).order_by("-date")[:OVERLAP])
+    if len(stored) > 0:
+        result = online_dao.lookupHistory(security=security, interval=interval, start_date=stored[-1].date)
+        requested = {entry.date: entry for entry in result}
+
+        overlap = [(entry, requested[entry.date]) for entry in stored if entry.date in requested]
+        if len(overlap) > 0 and all(_matches(entry, requested_entry) for entry, requested_entry in overlap):
+            return result, False
+
+        logger.info(f"history of {security} has been revised, requesting the complete history")
+
+    result = online_dao.lookupHistory(security=security, interval=interval, look_back=look_back)
+    # a broken response must not replace the stored history
+    if len(result) > 10:
+        return result, True
+
+    return None, False
+
+
+def _apply_history(security: Security, interval: Interval, result: list, complete: bool) -> dict:
+    counts = _merge_history(security, interval, result, prune=complete)
+    logger.info(f"merged the {'complete ' if complete else ''}history of {security}: {counts}")
+    return counts
+
+
+def update_history(security: Security, interval=Interval.DAILY, look_back=5000, online_dao=None) -> int:
+    """
+    updates the stored history of the security, returns the number of bars written
+
+    only the bars since the latest stored ones are requested, including an overlap of the last
+    OVERLAP stored bars; if the provider reports different values within the overlap (i.e. due to a
+    split or a revision) or the overlap can not be verified, the complete look_back history is
+    requested and merged, dropping the stored bars not part of it
+
+    the weekly and monthly history and the daily indicators are derived from the daily history:
+    requesting the weekly or monthly interval updates the daily history, returning the number of
+    daily bars written
+    """
+    if interval in RESAMPLED:
+        interval = Interval.DAILY
+
+    if online_dao is None:
+        online_dao = History_DAO_Factory().get_online_dao(security.data_provider)
+
+    result, complete = _request_history(security, interval, look_back, online_dao)
+    if result is None:
+        return 0
+
+    return store_history(security, result, complete)
+
+
+def store_history(security: Security, result: list, complete: bool = False) -> int:
+    """
+    merges the requested daily bars and derives the weekly and monthly history and the indicators
+    from them, returns the number of bars written; complete drops the stored bars not part of the
+    result
+    """
+    counts = _apply_history(security, Interval.DAILY, result, complete)
+    _derive_from_daily(security, since=min((entry.date for entry in result), default=None), complete=complete)
+    return counts["inserted"] + counts["updated"]
+
+
+def refresh_provider(data_provider: DataProvider, look_back=5000, online_dao=None) -> int:
+    """
+    updates the daily history of all securities of the data provider not updated today, returns the
+    number of bars written
+
+    the requests take long, as the DAO paces them by the rate limit of the provider; each security
+    is merged within its own short transaction as soon as its bars are received, so readers never
+    wait for the refresh, and a security failing to update does not affect the others
+    """
+    if online_dao is None:
+        online_dao = History_DAO_Factory().get_online_dao(data_provider)
+
+    written = 0
+    today = date.today()
+    for security in Security.objects.filter(data_provider=data_provider):
+        last_updated = security.dailyupdate_data.first()
+        if last_updated is not None and last_updated.date == today:
+            logger.info(f"no update required for {security}")
+            continue
+
+        try:
+            written += update_history(security, Interval.DAILY, look_back, online_dao)
+        except (ValueError, KeyError, HTTPError, DatabaseError) as error:
+            logger.error(f"could not update the history of {security}: {error}")
+
+    return written
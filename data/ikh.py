@@ -1,88 +1,46 @@
-def ichimoku(Data, close, high, low, kijun_lookback, 
-             tenkan_lookback,
-             chikou_lookback,
-             senkou_span_projection,
-             senkou_span_b_lookback,
-             where):
-    
-    Data = adder(Data, 3)
-    
-    # Kijun-sen
-    for i in range(len(Data)):
-        try:
-            Data[i, where] = max(Data[i - kijun_lookback:i + 1,  high]) + min(Data[i - kijun_lookback:i + 1, low])
-    
-        except ValueError:
-            pass
-        
-    Data[:, where] = Data[:, where] / 2
-    
-    # Tenkan-sen
-    for i in range(len(Data)):
-        try:
-            Data[i, where + 1] = max(Data[i - tenkan_lookback:i + 1, high]) + min(Data[i - tenkan_lookback:i + 1, low])
-    
-        except ValueError:
-            pass
-        
-    Data[:, where + 1] = Data[:, where + 1] / 2
-    
-    # Senkou-span A
-    senkou_span_a = (Data[:, where] + Data[:, where + 1]) / 2
-    senkou_span_a = np.reshape(senkou_span_a, (-1, 1))
-    
-    # Senkou-span B
-    for i in range(len(Data)):
-        try:
-            Data[i, where + 2] = max(Data[i - senkou_span_b_lookback:i + 1, high]) + min(Data[i - senkou_span_b_lookback:i + 1, low])
-    
-        except ValueError:
-            pass
-    
-    Data[:, where + 2] = Data[:, where + 2] / 2  
-    senkou_span_b = Data[:, where + 2]
-    senkou_span_b = np.reshape(senkou_span_b, (-1, 1))
-    kumo = np.concatenate((senkou_span_a, senkou_span_b), axis = 1)
-    
-    Data = deleter(Data, where + 2, 1)
-    
-    # Creating the Cloud
-    Data = np.concatenate((Data, kumo), axis = 1)
-    Data = Data[senkou_span_b_lookback:, ]
-for i in range (1, 7):
-        
-        new_array = shift(Data[:, 0], -senkou_span_projection, cval = 0)
-        new_array = np.reshape(new_array, (-1, 1))
-        Data = np.concatenate((Data, new_array), axis = 1)
-        Data = deleter(Data, 0, 1)
-    kumo = Data[:, 0:2]
-    Data = deleter(Data, 0, 2)
-    Data = np.concatenate((Data, kumo), axis = 1)
-    
-    Data = adder(Data, 1)   
-    
-    for i in range(len(Data)):  
-        try:   
-            Data[i, 8] = Data[i + chikou_lookback, 3]
-        except IndexError:
-            pass
-    # Forcing the projection of the cloud
-    Data[-senkou_span_projection:, 0] = Data[-senkou_span_projection:, 0] / 0
-    Data[-senkou_span_projection:, 1] = Data[-senkou_span_projection:, 1] / 0
-    Data[-senkou_span_projection:, 2] = Data[-senkou_span_projection:, 2] / 0
-    Data[-senkou_span_projection:, 3] = Data[-senkou_span_projection:, 3] / 0
-    Data[-senkou_span_projection:, 4] = Data[-senkou_span_projection:, 4] / 0
-    Data[-senkou_span_projection:, 5] = Data[-senkou_span_projection:, 5] / 0
-    Data[-52:, 8] = Data[-52:, 8] / 0
-    
-    return Data
-'''
-An example of using the above function on an array containing OHLC Data
-'''
-kijun_lookback  = 26
-tenkan_lookback =  9
-chikou_lookback = 26
-senkou_span_projection = 26
-senkou_span_b_lookback = 52
-Data = ichimoku(Data, 3, 1, 2, kijun_lookback, tenkan_lookback, chikou_lookback, senkou_span_projection, senkou_span_b_lookback, 4)
-# The 3, 1, 2 constants refer to the Close, High, and Low columns
\ No newline at end of file
+import numpy as np
+
+from data.technical_analysis import rolling_max_series, rolling_min_series
+
+
+def _midpoint(high: np.ndarray, low: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    (highest high + lowest low) / 2 of the lookback window ending at each bar
+    """
+    return (rolling_max_series(high, lookback) + rolling_min_series(low, lookback)) / 2
+
+
+def ichimoku(high, low, close,
+             kijun_lookback = 26,
+             tenkan_lookback = 9,
+             chikou_lookback = 26,
+             senkou_span_projection = 26,
+             senkou_span_b_lookback = 52) -> dict:
+    """
+    calculates the Ichimoku Kinko Hyo lines for the whole OHLC series
+
+    all series have len(close) + senkou_span_projection entries, the cloud (senkou span a and b) is
+    projected senkou_span_projection bars forward, the chikou span holds the close shifted
+    chikou_lookback bars back; not available values are NaN
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    size = len(close)
+
+    tenkan_sen = _midpoint(high, low, tenkan_lookback)
+    kijun_sen = _midpoint(high, low, kijun_lookback)
+    senkou_span_a = (tenkan_sen + kijun_sen) / 2
+    senkou_span_b = _midpoint(high, low, senkou_span_b_lookback)
+
+    ikh = {key: np.full(size + senkou_span_projection, np.nan) for key in (
+        "tenkan_sen", "kijun_sen", "senkou_span_a", "senkou_span_b", "chikou_span",
+    )}
+    ikh["tenkan_sen"][:size] = tenkan_sen
+    ikh["kijun_sen"][:size] = kijun_sen
+    ikh["senkou_span_a"][senkou_span_projection:] = senkou_span_a
+    ikh["senkou_span_b"][senkou_span_projection:] = senkou_span_b
+    if size > chikou_lookback:
+        ikh["chikou_span"][:size - chikou_lookback] = close[chikou_lookback:]
+
+    return ikh
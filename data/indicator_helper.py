@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+from django.db import router, transaction
+
+import numpy as np
+
+from data.models import Security, DailyIndicators, HistoryFrame
+from data.technical_analysis import (
+    ema_series,
+    sma_series,
+    sigma_delta_series,
+    hurst_series,
+    bollinger_series,
+    macd_series,
+    rsi_series,
+    evaluate_ikh_series,
+)
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# the latest bars the ichimoku evaluation is based on, as for the watchlist
+IKH_BARS = 200
+
+
+def indicator_series(frame: HistoryFrame, first: int = 0) -> dict:
+    """
+    the values of DailyIndicators.indicator_fields for the bars of the daily frame from first on,
+    calculated on the complete frame; values not available are NaN
+
+    the hurst and the ichimoku evaluation are windowed and only calculated for the requested bars
+    """
+    close, size = frame.close, len(frame)
+    first = min(first, size)
+
+    sma50 = sma_series(close, 50)
+    # SMA.add returns the mean of the available values before the window is complete
+    sma50[:49] = np.nan
+    bb_lower, bb_upper = bollinger_series(close)
+    macd_line, macd_signal, macd_histogram = macd_series(close)
+
+    series = {
+        "ema20": ema_series(close, 20),
+        "ema50": ema_series(close, 50),
+        "ema200": ema_series(close, 200),
+        "sma50": sma50,
+        "sigma_delta50": sigma_delta_series(close, 50),
+        "bb_lower": bb_lower,
+        "bb_upper": bb_upper,
+        "macd_line": macd_line,
+        "macd_signal": macd_signal,
+        "macd_histogram": macd_histogram,
+        "rsi": rsi_series(close),
+    }
+    series = {name: values[first:] for name, values in series.items()}
+
+    # the windows ending at the requested bars
+    offset = max(first - 49, 0)
+    series["hurst50"] = hurst_series(close[offset:], 50)[first - offset:]
+    offset = max(first - IKH_BARS + 1, 0)
+    series["ikh_evaluation"] = evaluate_ikh_series(
+        frame.close[offset:], frame.high[offset:], frame.low[offset:], IKH_BARS
+    )[first - offset:]
+
+    return {name: series[name] for name in DailyIndicators.indicator_fields}
+
+
+def calculate_indicators(security: Security, since=None, complete: bool = False) -> list:
+    """
+    calculates the indicators of the daily history for the bars from since on, by default the bars
+    following the latest stored indicators; complete calculates all bars
+    """
+    frame = HistoryFrame.load(security, "d")
+    if complete:
+        since = None
+    elif since is None:
+        latest = security.dailyindicators_data.values_list("date", flat=True).first()
+        if latest is not None:
+            since = latest + timedelta(days=1)
+
+    first = 0 if since is None else int(np.searchsorted(frame.date, np.datetime64(since, "D")))
+    series = indicator_series(frame, first)
+
+    return [
+        DailyIndicators(
+            security_id=security.pk,
+            date=day,
+            **{name: (None if np.isnan(value) else value) for name, value in zip(series, values)},
+        )
+        for day, *values in zip(frame.date[first:].astype(object), *(values.tolist() for values in series.values()))
+    ]
+
+
+def store_indicators(security: Security, entries: list, complete: bool = False) -> int:
+    """
+    writes the calculated indicators, replacing stored ones of the same bars; complete removes the
+    indicators of bars not part of the entries, i.e. not part of the daily history anymore
+
+    returns the number of bars written
+    """
+    with transaction.atomic(using=router.db_for_write(DailyIndicators)):
+        if complete:
+            security.dailyindicators_data.exclude(date__in=[entry.date for entry in entries]).delete()
+        DailyIndicators.objects.bulk_create(
+            entries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["security", "date"],
+            update_fields=DailyIndicators.indicator_fields,
+        )
+
+    logger.debug(f"wrote the indicators of {len(entries)} bars of {security}")
+    return len(entries)
+
+
+def update_indicators(security: Security, since=None, complete: bool = False) -> int:
+    """
+    calculates and stores the indicators of the daily history, see calculate_indicators
+    """
+    return store_indicators(security, calculate_indicators(security, since, complete), complete)
+
+
+def indicators_of(security: Security, frame: HistoryFrame) -> dict:
+    """
+    the indicators for the bars of the daily frame as arrays; read if they are stored up to the
+    latest bar of the frame, calculated on the frame otherwise
+    """
+    if len(frame) > 0:
+        stored = list(
+            security.dailyindicators_data.filter(date__gte=frame.date[0].item(), date__lte=frame.date[-1].item())
+            .order_by("date")
+            .values_list("date", *DailyIndicators.indicator_fields)
+        )
+        if len(stored) == len(frame) and stored[-1][0] == frame.date[-1].item():
+            columns = list(zip(*stored))
+            return {
+                name: np.array(column, dtype=float)
+                for name, column in zip(DailyIndicators.indicator_fields, columns[1:])
+            }
+
+    logger.debug(f"indicators of {security} not stored, calculating them")
+    return indicator_series(frame)
+
+
+def latest_of(security: Security, frame: HistoryFrame) -> dict:
+    """
+    the indicators of the latest bar of the daily frame, NaN if not available; read if stored,
+    calculated on the frame otherwise
+    """
+    if len(frame) == 0:
+        return {name: np.nan for name in DailyIndicators.indicator_fields}
+
+    stored = DailyIndicators.latest([security]).get(security.pk)
+    if stored is not None and stored["date"] == frame.date[-1].item():
+        return {name: (np.nan if stored[name] is None else stored[name]) for name in DailyIndicators.indicator_fields}
+
+    logger.debug(f"indicators of {security} not stored, calculating them")
+    return {name: values[-1] for name, values in indicator_series(frame, len(frame) - 1).items()}
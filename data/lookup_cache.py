@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import pymongo
+
+from django.conf import settings
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# per collection: the field holding the value, seconds a value is served (None for ever), the
+# entries kept in process and seconds mongo keeps an entry after its last update (None for ever);
+# the outdated entries are kept to be served if a refresh fails
+DEFAULTS = {
+    "yahoo_price": {"field": "price", "ttl": 300, "size": 2000, "retention": 7 * 86400},
+    "defaultKeyStatistics": {"field": "defaultKeyStatistics", "ttl": 86400, "size": 1000, "retention": 30 * 86400},
+    "assetProfile": {"field": "assetProfile", "ttl": 86400, "size": 1000, "retention": 30 * 86400},
+    "financialData": {"field": "financialData", "ttl": 86400, "size": 1000, "retention": 30 * 86400},
+    "summaryDetail": {"field": "summaryDetail", "ttl": 86400, "size": 1000, "retention": 30 * 86400},
+    "polygon_price": {"field": "price", "ttl": None, "size": 2000, "retention": None},
+}
+
+_caches = dict()
+_lock = threading.Lock()
+
+
+class LookupCache:
+    """
+    Two tier cache of provider lookups keyed by symbol: an in process LRU (L1) in front of a mongo
+    collection (L2) shared by all processes. The documents keep the layout of the collections,
+    {"symbol", "timestamp", field}, plus the "updated" date of the TTL index.
+
+        cache = shared("yahoo_price", mongo_db)
+        fresh, outdated = cache.get_many(["AAPL", "MSFT"])
+        cache.put_many({"AAPL": price})
+    """
+
+    def __init__(self, collection, field: str, ttl: Optional[int] = None, size: int = 1000,
+                 retention: Optional[int] = None):
+        self.collection = collection
+        self.field = field
+        self.ttl = ttl
+        self.size = size
+        self.retention = retention
+        self.counters = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def _fresh(self, timestamp: float, now: float) -> bool:
+        return self.ttl is None or timestamp + self.ttl > now
+
+    def _remember(self, key: str, timestamp: float, value) -> None:
+        self._entries[key] = (timestamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys: list) -> tuple:
+        """
+        (fresh, outdated) values of the keys found, the keys not in process are read with a single
+        query; outdated values are older than the ttl
+        """
+        fresh, outdated = dict(), dict()
+        now = datetime.now().timestamp()
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and self._fresh(entry[0], now):
+                    self._entries.move_to_end(key)
+                    fresh[key] = entry[1]
+            self.counters["l1_hits"] += len(fresh)
+
+        remaining = [key for key in keys if key not in fresh]
+        if len(remaining) == 0:
+            return fresh, outdated
+
+        documents = list()
+        try:
+            documents = list(self.collection.find({"symbol": {"$in": remaining}}))
+        except pymongo.errors.PyMongoError as e:
+            logger.error("Could not read %s from local storage: %s" % (self.collection.name, e))
+
+        with self._lock:
+            for document in documents:
+                key, timestamp, value = document["symbol"], document["timestamp"], document.get(self.field)
+                if self._fresh(timestamp, now):
+                    fresh[key] = value
+                    self._remember(key, timestamp, value)
+                    self.counters["l2_hits"] += 1
+                else:
+                    outdated[key] = value
+            self.counters["misses"] += len(remaining) - len(documents) + len(outdated)
+
+        return fresh, outdated
+
+    def get(self, key: str):
+        """
+        the fresh value of the key or None
+        """
+        return self.get_many([key])[0].get(key)
+
+    def put_many(self, values: dict) -> None:
+        """
+        stores the values of the keys in process and writes them with a single bulk write
+        """
+        if len(values) == 0:
+            return
+
+        timestamp = datetime.now().timestamp()
+        with self._lock:
+            for key, value in values.items():
+                self._remember(key, timestamp, value)
+
+        updated = datetime.now(timezone.utc)
+        try:
+            self._ensure_index()
+            self.collection.bulk_write(
+                [
+                    pymongo.UpdateOne(
+                        {"symbol": key},
+                        {"$set": {"timestamp": timestamp, "updated": updated, self.field: value}},
+                        upsert=True,
+                    )
+                    for key, value in values.items()
+                ],
+                ordered=False,
+            )
+        except pymongo.errors.PyMongoError as e:
+            logger.error("Could not write %s to local storage: %s" % (self.collection.name, e))
+
+    def put(self, key: str, value) -> None:
+        self.put_many({key: value})
+
+    def _ensure_index(self) -> None:
+        """
+        the TTL index removing the entries not updated for retention seconds
+        """
+        if self._indexed or self.retention is None:
+            return
+        self.collection.create_index("updated", expireAfterSeconds=self.retention)
+        self._indexed = True
+
+    def stats(self) -> dict:
+        return {**self.counters, "size": len(self._entries)}
+
+
+def shared(name: str, mongo_db) -> LookupCache:
+    """
+    the cache of the collection name within the mongo database, shared by all DAOs of the process;
+    the DEFAULTS of the collection are updated by the LOOKUP_CACHES setting
+    """
+    collection = mongo_db[name]
+    cache = _caches.get(collection.full_name)
+    if cache is None:
+        with _lock:
+            cache = _caches.get(collection.full_name)
+            if cache is None:
+                options = {**DEFAULTS.get(name, {"field": name}), **getattr(settings, "LOOKUP_CACHES", {}).get(name, {})}
+                cache = LookupCache(collection, **options)
+                _caches[collection.full_name] = cache
+    return cache
+
+
+def statistics() -> dict:
+    """
+    the hit and miss counters of all caches of the process
+    """
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,59 @@
+import multiprocessing as mp
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from data.indicator_helper import calculate_indicators, store_indicators
+from data.models import Security
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+def _calculate(arguments: tuple) -> tuple:
+    security_id, complete = arguments
+    security = Security.objects.get(pk=security_id)
+    return security, calculate_indicators(security, complete=complete)
+
+
+class Command(BaseCommand):
+    help = "Calculates the DailyIndicators of the stored daily history of all securities"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="number of processes calculating the indicators",
+        )
+        parser.add_argument(
+            "--complete",
+            action="store_true",
+            help="recalculate all bars instead of the bars following the latest stored indicators",
+        )
+
+    def handle(self, *args, **options):
+        security_ids = list(
+            Security.objects.filter(daily_data__isnull=False).distinct().values_list("pk", flat=True)
+        )
+        tasks = [(security_id, options["complete"]) for security_id in security_ids]
+
+        if options["processes"] > 1:
+            # the workers only read and calculate, the database is written by this process only; the
+            # forked workers must not share the connections of this process
+            connections.close_all()
+            with mp.get_context("fork").Pool(options["processes"]) as pool:
+                written = self._store(pool.imap_unordered(_calculate, tasks), options["complete"])
+        else:
+            written = self._store(map(_calculate, tasks), options["complete"])
+
+        self.stdout.write(f"Wrote the indicators of {written} bars of {len(security_ids)} securities.")
+
+    def _store(self, results, complete: bool) -> int:
+        written = 0
+        for security, entries in results:
+            written += store_indicators(security, entries, complete)
+            logger.info(f"backfilled the indicators of {len(entries)} bars of {security}")
+        return written
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:51
+
+from django.db import migrations, models
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+
+PRICES = ["open_price", "high_price", "low", "close", "adj_close"]
+
+
+def cast_prices(apps, schema_editor):
+    """
+    stores the existing prices as doubles with a single update per table instead of converting the
+    rows one by one; the altered columns already convert on most backends, sqlite keeps values with
+    their previous storage class though
+    """
+    for model_name in ["Daily", "Weekly", "Monthly"]:
+        model = apps.get_model("data", model_name)
+        model.objects.using(schema_editor.connection.alias).update(
+            **{price: Cast(price, FloatField()) for price in PRICES}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data", "0002_limit"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="daily",
+            name="adj_close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="daily",
+            name="close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="daily",
+            name="high_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="daily",
+            name="low",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="daily",
+            name="open_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="daily",
+            name="volume",
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="adj_close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="high_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="low",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="open_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="monthly",
+            name="volume",
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="adj_close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="close",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="high_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="low",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="open_price",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weekly",
+            name="volume",
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.RunPython(cast_prices, migrations.RunPython.noop),
+    ]
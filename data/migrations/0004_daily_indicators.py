@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data", "0003_float_prices"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyIndicators",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("ema20", models.FloatField(null=True)),
+                ("ema50", models.FloatField(null=True)),
+                ("ema200", models.FloatField(null=True)),
+                ("sma50", models.FloatField(null=True)),
+                ("sigma_delta50", models.FloatField(null=True)),
+                ("hurst50", models.FloatField(null=True)),
+                ("bb_lower", models.FloatField(null=True)),
+                ("bb_upper", models.FloatField(null=True)),
+                ("macd_line", models.FloatField(null=True)),
+                ("macd_signal", models.FloatField(null=True)),
+                ("macd_histogram", models.FloatField(null=True)),
+                ("rsi", models.FloatField(null=True)),
+                ("ikh_evaluation", models.FloatField(null=True)),
+                ("security", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="%(class)s_%(app_label)s", to="data.security")),
+            ],
+            options={
+                "ordering": ["-date"],
+                "constraints": [models.UniqueConstraint(fields=("security", "date"), name="unique_sec_date_indicators_combination")],
+            },
+        ),
+    ]
@@ -1,6 +1,13 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
 
 
 # Create your models here.
@@ -102,16 +109,88 @@ class HistoricData(models.Model):
         related_name="%(class)s_%(app_label)s",
     )
     date = models.DateField(null=False, blank=False)
-    open_price = models.DecimalField(max_digits=16, decimal_places=6)
-    high_price = models.DecimalField(max_digits=16, decimal_places=6)
-    low = models.DecimalField(max_digits=16, decimal_places=6)
-    close = models.DecimalField(max_digits=16, decimal_places=6)
-    adj_close = models.DecimalField(max_digits=16, decimal_places=6)
-    volume = models.PositiveIntegerField()
+    # prices are stored as doubles, read without a Decimal conversion per value; Decimal or str
+    # values assigned by older callers are converted on save
+    open_price = models.FloatField()
+    high_price = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    adj_close = models.FloatField()
+    volume = models.PositiveBigIntegerField()
 
     def __str__(self):
         return self.security.name + " " + str(self.date) + " " + str(self.close)
 
+    # the values of a bar, all updated if one of them has changed
+    bar_fields = ["open_price", "high_price", "low", "close", "adj_close", "volume"]
+
+    # decimal places of the prices as shown and as previously stored
+    price_places = 6
+
+    def decimal(self, name: str) -> Decimal:
+        """
+        the price of the given field as Decimal with price_places decimal places, as returned before
+        the prices have been stored as floats
+        """
+        return Decimal(repr(float(getattr(self, name)))).quantize(Decimal(1).scaleb(-self.price_places))
+
+    @property
+    def decimal_close(self) -> Decimal:
+        return self.decimal("close")
+
+    @property
+    def decimal_adj_close(self) -> Decimal:
+        return self.decimal("adj_close")
+
+    @classmethod
+    def _normalized(cls, entry) -> tuple:
+        """
+        the bar values as stored in the database, so requested and stored bars are comparable
+        """
+        return tuple(cls._meta.get_field(name).to_python(getattr(entry, name)) for name in cls.bar_fields)
+
+    @classmethod
+    def merge(cls, security: Security, entries: list, prune: bool = False) -> dict:
+        """
+        merges the entries into the stored history of the security: new dates are inserted, changed
+        bars are updated and unchanged bars are not written at all; with prune, stored bars missing in
+        the entries are deleted
+
+        returns the number of inserted, updated, unchanged and deleted bars
+        """
+        stored = {
+            entry.date: cls._normalized(entry)
+            for entry in cls.objects.filter(security=security).only("date", *cls.bar_fields)
+        }
+
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        changed = list()
+        for entry in entries:
+            if entry.date not in stored:
+                counts["inserted"] += 1
+            elif stored[entry.date] != cls._normalized(entry):
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            entry.security = security
+            changed.append(entry)
+
+        # new dates and changed bars in one statement, using the unique (security, date) constraint
+        cls.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["security", "date"],
+            update_fields=cls.bar_fields,
+        )
+
+        if prune:
+            missing = stored.keys() - {entry.date for entry in entries}
+            if len(missing) > 0:
+                counts["deleted"] = cls.objects.filter(security=security, date__in=missing).delete()[0]
+
+        return counts
+
     class Meta:
         abstract = True
         ordering = ["-date"]
@@ -187,6 +266,241 @@ class MonthlyUpdate(HistoryLastUpdate):
             )
         ]
 
+class DailyIndicators(models.Model):
+    """
+    the indicators of the daily history per bar, maintained whenever the daily history is merged, so
+    the views do not calculate them per request; values not available (yet) are null
+    """
+
+    security = models.ForeignKey(
+        Security,
+        on_delete=models.CASCADE,
+        related_name="%(class)s_%(app_label)s",
+    )
+    date = models.DateField(null=False, blank=False)
+
+    ema20 = models.FloatField(null=True)
+    ema50 = models.FloatField(null=True)
+    ema200 = models.FloatField(null=True)
+    sma50 = models.FloatField(null=True)
+    sigma_delta50 = models.FloatField(null=True)
+    hurst50 = models.FloatField(null=True)
+    bb_lower = models.FloatField(null=True)
+    bb_upper = models.FloatField(null=True)
+    macd_line = models.FloatField(null=True)
+    macd_signal = models.FloatField(null=True)
+    macd_histogram = models.FloatField(null=True)
+    rsi = models.FloatField(null=True)
+    ikh_evaluation = models.FloatField(null=True)
+
+    # the calculated values
+    indicator_fields = [
+        "ema20", "ema50", "ema200", "sma50", "sigma_delta50", "hurst50", "bb_lower", "bb_upper",
+        "macd_line", "macd_signal", "macd_histogram", "rsi", "ikh_evaluation",
+    ]
+
+    def __str__(self):
+        return str(self.security) + " " + str(self.date)
+
+    @classmethod
+    def latest(cls, securities: list) -> dict:
+        """
+        the latest stored indicators of all securities with a single query, as dictionary of the
+        date and the indicator fields per security id
+        """
+        latest = (
+            cls.objects.filter(security__in=securities)
+            .annotate(position=Window(RowNumber(), partition_by=[F("security")], order_by=F("date").desc()))
+            .filter(position=1)
+            .values("security_id", "date", *cls.indicator_fields)
+        )
+        return {entry.pop("security_id"): entry for entry in latest}
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["security", "date"],
+                name="unique_sec_date_indicators_combination",
+            )
+        ]
+
+
+class HistoryFrame:
+    """
+    Columnar history of a security, loaded via values_list straight into numpy arrays instead of
+    instantiating a model per bar. The columns are the same for daily, weekly and
+    monthly history, all ascending by date with prices as float.
+
+        frame = HistoryFrame.load(security, "d", limit=400)
+        sma_series(frame.close, 50)
+    """
+
+    intervals = {"d": Daily, "w": Weekly, "m": Monthly}
+
+    # column -> model field
+    prices = {
+        "open": "open_price",
+        "high": "high_price",
+        "low": "low",
+        "close": "close",
+        "adj_close": "adj_close",
+    }
+
+    def __init__(self, date: np.ndarray, open: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 close: np.ndarray, adj_close: np.ndarray, volume: np.ndarray):
+        self.date = date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.adj_close = adj_close
+        self.volume = volume
+
+    @classmethod
+    def load(cls, security: Security, interval: str = "d", start=None, end=None, limit: Optional[int] = None) -> "HistoryFrame":
+        """
+        loads the history of the given interval (d, w or m) within start and end (both including),
+        limited to the latest limit bars
+        """
+        if interval not in cls.intervals:
+            raise ValueError(f"Invalid interval {interval}.")
+
+        history = cls.intervals[interval].objects.filter(security=security)
+        if start is not None:
+            history = history.filter(date__gte=start)
+        if end is not None:
+            history = history.filter(date__lte=end)
+        history = history.order_by("-date").values_list(
+            "date", *cls.prices.values(), "volume"
+        )
+        if limit is not None:
+            history = history[:limit]
+
+        rows = list(history)
+        rows.reverse()
+        return cls._from_columns(list(zip(*rows)), len(rows))
+
+    @classmethod
+    def _from_columns(cls, columns: list, size: int) -> "HistoryFrame":
+        """
+        the frame of the ascending date, open, high, low, close, adj_close and volume columns
+        """
+        if size == 0:
+            columns = [()] * (len(cls.prices) + 2)
+
+        epoch = date(1970, 1, 1).toordinal()
+        return cls(
+            np.fromiter((day.toordinal() - epoch for day in columns[0]), dtype=np.int64, count=size).astype("datetime64[D]"),
+            *(np.fromiter(column, dtype=float, count=size) for column in columns[1:-1]),
+            np.fromiter(columns[-1], dtype=np.int64, count=size),
+        )
+
+    @classmethod
+    def load_many(cls, securities: list, interval: str = "d", limit: Optional[int] = None, since=None) -> dict:
+        """
+        loads the latest limit bars since the given date of all securities (instances or ids) with a
+        single query, numbering the bars per security within the database
+
+        returns a frame per security id, empty if there is no history
+        """
+        if interval not in cls.intervals:
+            raise ValueError(f"Invalid interval {interval}.")
+
+        ids = [getattr(security, "pk", security) for security in securities]
+        frames = dict()
+        if len(ids) == 0:
+            return frames
+
+        history = cls.intervals[interval].objects.filter(security_id__in=ids)
+        if since is not None:
+            history = history.filter(date__gte=since)
+        if limit is not None:
+            history = history.annotate(
+                position=Window(RowNumber(), partition_by=[F("security")], order_by=F("date").desc())
+            ).filter(position__lte=limit)
+        history = history.order_by("security_id", "date").values_list(
+            "security_id", "date", *cls.prices.values(), "volume"
+        )
+
+        # the database already returns floats, fetching the rows directly skips the per row converters
+        sql, params = history.query.sql_with_params()
+        with connections[history.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        # convert column wise once, each security is a contiguous slice of the columns
+        size = len(rows)
+        if size > 0:
+            columns = list(zip(*rows))
+            security_ids = np.fromiter(columns[0], dtype=np.int64, count=size)
+            bars = cls._from_columns(columns[1:], size)
+            starts = np.flatnonzero(np.r_[True, security_ids[1:] != security_ids[:-1]])
+            for start, end in zip(starts, np.r_[starts[1:], size]):
+                frames[int(security_ids[start])] = bars[start:end]
+
+        for pk in ids:
+            if pk not in frames:
+                frames[pk] = cls._from_columns([], 0)
+        return frames
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def __getitem__(self, bars: slice) -> "HistoryFrame":
+        """
+        the frame of a slice of the bars, the columns are views of this frame
+        """
+        return HistoryFrame(
+            self.date[bars], self.open[bars], self.high[bars], self.low[bars],
+            self.close[bars], self.adj_close[bars], self.volume[bars],
+        )
+
+    def times(self) -> list:
+        """
+        the dates as ISO strings, as used by the charts
+        """
+        return np.datetime_as_string(self.date, unit="D").tolist()
+
+    @staticmethod
+    def period_start(dates: np.ndarray, interval: str) -> np.ndarray:
+        """
+        the first day of the ISO week (w) or the month (m) of each date
+        """
+        if interval == "w":
+            # 1970-01-01 has been a Thursday, ISO weeks start on Monday
+            days = dates.astype(np.int64)
+            return (days - (days + 3) % 7).astype("datetime64[D]")
+        if interval == "m":
+            return dates.astype("datetime64[M]").astype("datetime64[D]")
+        raise ValueError(f"Invalid interval {interval}.")
+
+    def resample(self, interval: str) -> "HistoryFrame":
+        """
+        aggregates daily bars to weekly (w, ISO weeks) or monthly (m) bars, dated with the first day
+        of the period: open of the first bar, highest high, lowest low, close and adjusted close of
+        the last bar and the summed volume
+        """
+        periods = self.period_start(self.date, interval)
+        if len(periods) == 0:
+            return HistoryFrame(periods, *(np.array(column) for column in (
+                self.open, self.high, self.low, self.close, self.adj_close, self.volume
+            )))
+
+        # the bars are ascending, so each period is a contiguous slice starting at starts
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        ends = np.r_[starts[1:], len(periods)] - 1
+        return HistoryFrame(
+            periods[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            self.adj_close[ends],
+            np.add.reduceat(self.volume, starts),
+        )
+
+
 class Limit(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     security = models.ForeignKey(Security, on_delete=models.CASCADE)
@@ -1,7 +1,6 @@
 import calendar
 import pymongo
 import tabulate
-import time
 import urllib3
 
 from typing import Optional
@@ -9,6 +8,7 @@ from bs4 import BeautifulSoup
 from lxml import etree
 from datetime import date, datetime, timedelta
 
+from data import rate_limit
 from data.meta_dao import MetaData_Factory
 
 from logging import getLogger
@@ -26,6 +26,7 @@ class OnlineReader:
         # url = generate_url_(product, type, expiry_date, bus_date)
         url = generate_url(**parameters)
 
+        rate_limit.limiter("Eurex").acquire()
         response = self._http.request("GET", url)
         logger.debug(f"Response for {response.geturl()}: {response.status} ... ")
 
@@ -161,7 +162,6 @@ def update_data(parameter: dict) -> None:
             if not online_data["data"]:
                 continue
             locale_dao.write(online_data)
-            time.sleep(5)
         else:
             logger.debug(
                 f"Entry already in local storage: {parameter['type']}, {parameter['bus_date']}"
@@ -175,7 +175,6 @@ def update_data(parameter: dict) -> None:
             if not online_data["data"]:
                 continue
             locale_dao.write(online_data)
-            time.sleep(5)
         else:
             logger.warn(
                 f"Entry already in local storage: {parameter['type']}, {parameter['bus_date']}"
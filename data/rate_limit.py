@@ -0,0 +1,109 @@
+import fcntl
+import struct
+import threading
+from pathlib import Path
+from time import sleep, time
+
+from django.conf import settings
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# per provider: tokens (requests) refilled per second and the tokens available at most, i.e. the
+# requests sent at once after an idle period; updated by the RATE_LIMITS setting
+DEFAULTS = {
+    # 5 calls per minute
+    "Polygon": {"rate": 5 / 60, "burst": 5},
+    # 500 requests per hour
+    "Tiingo": {"rate": 500 / 3600, "burst": 10},
+    "Yahoo": {"rate": 2.0, "burst": 10},
+    # the quoteSummary lookups of the views (symbols, prices and modules) apart from the history
+    # requests of the batch jobs; a cold watchlist of the S&P 500, price and forward pe of each
+    # security, passes at once, the limit only guards against runaway loops
+    "YahooQuotes": {"rate": 50.0, "burst": 1000},
+    "Eurex": {"rate": 0.2, "burst": 5},
+    "Finra": {"rate": 0.25, "burst": 5},
+}
+
+# level and timestamp of the bucket
+_STATE = struct.Struct("dd")
+
+_buckets = dict()
+_lock = threading.Lock()
+
+
+def _limits_dir() -> Path:
+    return Path(getattr(settings, "RATE_LIMIT_DIR", settings.BASE_DIR / "rate_limits"))
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all processes of the host: the level is kept in a file, locked while a
+    token is taken, and refilled by the time passed since the last take.
+
+        limiter("Tiingo").acquire()
+        r = http.request(...)
+    """
+
+    def __init__(self, path: Path, rate: float, burst: float):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        takes the tokens, waiting for the bucket to be refilled if required; returns the seconds
+        waited
+        """
+        waited = 0.0
+        while True:
+            wait = self._take(tokens)
+            if wait <= 0:
+                return waited
+            sleep(wait)
+            waited += wait
+
+    def _take(self, tokens: float) -> float:
+        """
+        takes the tokens if available and returns 0, the seconds until they are available otherwise
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a+b") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            file.seek(0)
+            state = file.read(_STATE.size)
+            now = time()
+            if len(state) == _STATE.size:
+                level, timestamp = _STATE.unpack(state)
+                level = min(self.burst, level + max(now - timestamp, 0) * self.rate)
+            else:
+                level = self.burst
+
+            wait = 0.0
+            if level >= tokens:
+                level -= tokens
+            else:
+                wait = (tokens - level) / self.rate
+
+            file.seek(0)
+            file.truncate()
+            file.write(_STATE.pack(level, now))
+            file.flush()
+        return wait
+
+
+def limiter(provider: str) -> TokenBucket:
+    """
+    the rate limiter of the provider shared by all DAOs and processes; the DEFAULTS of the provider
+    are updated by the RATE_LIMITS setting
+    """
+    bucket = _buckets.get(provider)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.get(provider)
+            if bucket is None:
+                options = {**DEFAULTS.get(provider, {"rate": 1.0, "burst": 1}), **getattr(settings, "RATE_LIMITS", {}).get(provider, {})}
+                bucket = TokenBucket(_limits_dir() / f"{provider}.bucket", **options)
+                _buckets[provider] = bucket
+    return bucket
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# the models written by the history updates
+HISTORY_MODELS = {
+    "daily",
+    "dailyupdate",
+    "weekly",
+    "weeklyupdate",
+    "monthly",
+    "monthlyupdate",
+    "dailyindicators",
+}
+
+
+def history_writer() -> str:
+    """
+    the alias the history is written with, HISTORY_WRITER_DB unless the database is in memory (i.e.
+    while testing), as a second connection does not see its uncommitted changes
+    """
+    default = connections[DEFAULT_DB_ALIAS]
+    if default.vendor == "sqlite" and default.is_in_memory_db():
+        return DEFAULT_DB_ALIAS
+    return getattr(settings, "HISTORY_WRITER_DB", DEFAULT_DB_ALIAS)
+
+
+class HistoryWriterRouter:
+    """
+    routes the writes of the history models to a dedicated connection to the same database file, so
+    long running updates do not share the connection of the requests; reads are left to the
+    default routing
+    """
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == "data" and model._meta.model_name in HISTORY_MODELS:
+            return history_writer()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # all aliases point to the same database
+        return True
@@ -0,0 +1,30 @@
+from cachalot.api import invalidate
+from cachalot.signals import post_invalidation
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from data.routers import history_writer
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    switches sqlite to write ahead logging: readers see the last committed state instead of waiting
+    for a writer, and a writer waits for the lock of another writer instead of failing at once
+    """
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=20000")
+
+
+@receiver(post_invalidation)
+def invalidate_readers(sender, db_alias, **kwargs):
+    """
+    the query cache is kept per alias, the tables written with the history writer connection are
+    invalidated for the readers using the default connection as well
+    """
+    if db_alias != DEFAULT_DB_ALIAS and db_alias == history_writer():
+        invalidate(sender, db_alias=DEFAULT_DB_ALIAS)
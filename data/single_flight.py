@@ -0,0 +1,224 @@
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from time import monotonic, sleep
+from typing import Callable
+
+import pymongo
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# seconds a lease is held unless renewed, the leading process renews it while fetching; a process
+# failing to release it blocks others no longer
+LEASE_SECONDS = 30
+# seconds between the checks for the leases of other processes
+POLL_SECONDS = 0.2
+
+_flights = dict()
+_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        # the last time the lease of the item was seen renewed
+        self.renewed = monotonic()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent fetches of the same item, e.g. the price of a symbol: within the process
+    the callers wait for the thread fetching it, across processes the fetching process holds a lease
+    document in mongo and the others read the result from the cache it writes. The lease is renewed
+    while the fetch is running, so the others wait as long as the fetch makes progress, even if it
+    takes longer than the lease, e.g. as it is paced by a rate limit.
+
+        flight = shared(mongo_db)
+        prices = flight.do_many("yahoo:price", symbols, fetch, cached)
+    """
+
+    def __init__(self, leases, lease_seconds: int = LEASE_SECONDS, poll_seconds: float = POLL_SECONDS):
+        self.leases = leases
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = uuid.uuid4().hex
+        self._flights = dict()
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def do_many(self, namespace: str, items: list, fetch: Callable[[list], dict], cached: Callable[[list], dict]) -> dict:
+        """
+        the values of the items, keyed by item: fetch(items) is called for the items no other thread
+        or process is fetching and has to store them where cached(items) of the other processes reads
+        them; the items fetched by others are awaited
+        """
+        led, awaited = list(), dict()
+        with self._lock:
+            for item in dict.fromkeys(items):
+                key = f"{namespace}:{item}"
+                if key in self._flights:
+                    awaited[item] = self._flights[key]
+                else:
+                    self._flights[key] = _Flight()
+                    led.append(item)
+
+        values = dict()
+        try:
+            if len(led) > 0:
+                values.update(self._lead(namespace, led, fetch, cached))
+        finally:
+            with self._lock:
+                for item in led:
+                    flight = self._flights.pop(f"{namespace}:{item}")
+                    flight.value = values.get(item)
+                    flight.done.set()
+
+        for item, flight in awaited.items():
+            if self._wait(flight) and flight.value is not None:
+                values[item] = flight.value
+            else:
+                # the leading thread failed or stalled, fetching it on our own
+                values.update(fetch([item]))
+        return values
+
+    def _wait(self, flight: _Flight) -> bool:
+        """
+        waits for the flight as long as its lease is renewed, False if it is not renewed in time
+        """
+        while not flight.done.wait(self.lease_seconds):
+            if monotonic() - flight.renewed > self.lease_seconds:
+                return False
+        return True
+
+    def _lead(self, namespace: str, items: list, fetch: Callable[[list], dict], cached: Callable[[list], dict]) -> dict:
+        leased = self._acquire(namespace, items)
+        values = dict()
+        stop = threading.Event()
+        renewal = threading.Thread(target=self._renew, args=(namespace, leased, stop), daemon=True)
+        try:
+            if len(leased) > 0:
+                renewal.start()
+                values.update(fetch(leased))
+        finally:
+            stop.set()
+            if renewal.is_alive():
+                renewal.join()
+            self._release(namespace, leased)
+
+        remote = [item for item in items if item not in leased]
+        if len(remote) > 0:
+            self._await(namespace, remote)
+            values.update(cached(remote))
+            # the items the other process failed to fetch
+            missing = [item for item in remote if item not in values]
+            if len(missing) > 0:
+                values.update(fetch(missing))
+        return values
+
+    def _acquire(self, namespace: str, items: list) -> list:
+        """
+        the items leased, the others are leased by another process
+        """
+        now = datetime.now(timezone.utc)
+        expires = now + timedelta(seconds=self.lease_seconds)
+        held = set()
+        try:
+            self._ensure_index()
+            try:
+                self.leases.insert_many(
+                    [{"_id": f"{namespace}:{item}", "owner": self.owner, "expires": expires} for item in items],
+                    ordered=False,
+                )
+            except pymongo.errors.BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    held.add(items[error["index"]])
+
+            # leases not released by a failed process are taken over once expired
+            for item in list(held):
+                taken = self.leases.find_one_and_update(
+                    {"_id": f"{namespace}:{item}", "expires": {"$lt": now}},
+                    {"$set": {"owner": self.owner, "expires": expires}},
+                )
+                if taken is not None:
+                    held.discard(item)
+        except pymongo.errors.PyMongoError as e:
+            logger.error("Could not lease %s: %s" % (namespace, e))
+            held = set()
+
+        return [item for item in items if item not in held]
+
+    def _renew(self, namespace: str, items: list, stop: threading.Event) -> None:
+        """
+        renews the leases of the items every third of the lease until stop is set
+        """
+        keys = [f"{namespace}:{item}" for item in items]
+        while not stop.wait(self.lease_seconds / 3):
+            expires = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+            try:
+                self.leases.update_many({"_id": {"$in": keys}, "owner": self.owner}, {"$set": {"expires": expires}})
+            except pymongo.errors.PyMongoError as e:
+                logger.error("Could not renew the leases of %s: %s" % (namespace, e))
+            self._touch(keys)
+
+    def _touch(self, keys: list) -> None:
+        """
+        marks the leases of the keys as renewed for the threads waiting for them
+        """
+        renewed = monotonic()
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.renewed = renewed
+
+    def _release(self, namespace: str, items: list) -> None:
+        if len(items) == 0:
+            return
+        try:
+            self.leases.delete_many({"_id": {"$in": [f"{namespace}:{item}" for item in items]}, "owner": self.owner})
+        except pymongo.errors.PyMongoError as e:
+            logger.error("Could not release the leases of %s: %s" % (namespace, e))
+
+    def _await(self, namespace: str, items: list) -> None:
+        """
+        waits until the leases of the items are released or expired, i.e. no longer renewed by the
+        process holding them
+        """
+        keys = [f"{namespace}:{item}" for item in items]
+        while True:
+            try:
+                now = datetime.now(timezone.utc)
+                if self.leases.count_documents({"_id": {"$in": keys}, "expires": {"$gt": now}}) == 0:
+                    return
+            except pymongo.errors.PyMongoError as e:
+                logger.error("Could not read the leases of %s: %s" % (namespace, e))
+                return
+            # the threads of this process waiting for the items keep waiting as well
+            self._touch(keys)
+            sleep(self.poll_seconds)
+
+    def _ensure_index(self) -> None:
+        """
+        the TTL index removing the expired leases
+        """
+        if not self._indexed:
+            self.leases.create_index("expires", expireAfterSeconds=0)
+            self._indexed = True
+
+
+def shared(mongo_db) -> SingleFlight:
+    """
+    the single flight of the leases within the mongo database, shared by all DAOs of the process
+    """
+    leases = mongo_db["leases"]
+    flight = _flights.get(leases.full_name)
+    if flight is None:
+        with _lock:
+            flight = _flights.get(leases.full_name)
+            if flight is None:
+                flight = SingleFlight(leases)
+                _flights[leases.full_name] = flight
+    return flight
@@ -1,9 +1,9 @@
 import csv
-import time
-from data.models import User, Watchlist, Security, DataProvider, Daily, DailyUpdate
+from data.models import User, Watchlist, Security, DataProvider
 from data.history_dao import History_DAO_Factory
+from data.history_helper import store_history
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import DatabaseError, transaction
+from django.db import DatabaseError
 
 from logging import getLogger
 
@@ -99,25 +99,13 @@ def import_sp500():
                         watchlist.securities.add(sec)
                         history_dao.storePriceMetadata(price_metadata)
 
-                        with transaction.atomic():
-                            # drop current history
-                            Daily.objects.filter(security=sec).delete()
-                            try:
-                                DailyUpdate.objects.get(security=sec).delete()
-                            except:
-                                pass
-
-                            # crate new history
-                            Daily.objects.bulk_create(result)
-                            DailyUpdate.objects.create(security=sec)
-                            logger.info("History has been updated for " + symbol)
+                        # replace the current history, deriving the weekly and monthly history and
+                        # the indicators as any update does
+                        store_history(sec, result, complete=True)
+                        logger.info("History has been updated for " + symbol)
 
                     except DatabaseError as db_error:
                         logger.warn(db_error)
             except ValueError as v_error:
                 logger.error(v_error)
-
-            # Polygon wait for 12 sec as the API only accepts 5 calls/minute
-            # Tiingo 7 sec
-            time.sleep(7)
     
\ No newline at end of file
@@ -11,6 +11,9 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 
 
+// the bars of the initial chart and of each window loaded when scrolling back
+const HISTORY_BARS = 250
+
 function show_history(security_id, parameter){
 
     fetch("/data/security_history/" + security_id, {
@@ -18,14 +21,15 @@ function show_history(security_id, parameter){
         headers: {"X-CSRFToken": document.querySelector('[name=csrfmiddlewaretoken]').value},
         mode: "same-origin",
         body: JSON.stringify({
-            "interval":parameter
+            "interval":parameter,
+            "limit":HISTORY_BARS
         })
     })
     .then((response) => {
 
         if (response.ok){
             response.json().then( data => {
-                generate_chart(data)
+                generate_chart(data, security_id)
             })
         } else {
           response.json().then((data) => {
@@ -204,7 +208,44 @@ function show_fa(security_id){
 }
 
 
-function generate_chart(data){
+/**
+ * loads the bars preceding the cursor and prepends them to the data of the chart series
+ */
+function load_earlier_history(security_id, data, series){
+
+    fetch("/data/security_history/" + security_id, {
+        method: "POST",
+        headers: {"X-CSRFToken": document.querySelector('[name=csrfmiddlewaretoken]').value},
+        mode: "same-origin",
+        body: JSON.stringify({
+            "interval":data.interval,
+            "limit":HISTORY_BARS,
+            "cursor":data.cursor
+        })
+    })
+    .then((response) => {
+
+        if (response.ok){
+            response.json().then( earlier => {
+                for (let key in series) {
+                    data[key] = earlier[key].concat(data[key])
+                    series[key].setData(data[key])
+                }
+                data.cursor = earlier.cursor
+                data.loading = false
+            })
+        } else {
+            data.loading = false
+        }
+    })
+    .catch( error => {
+        console.log('Error:', error);
+        data.loading = false
+    })
+}
+
+
+function generate_chart(data, security_id){
 	var width = 800;
 	var height = 450;
 
@@ -326,6 +367,22 @@ function generate_chart(data){
 	var candles = data.price
 	candleSeries.setData(candles);
 
+	// lazy load the earlier bars once the first loaded bars are scrolled into view
+	var series = {"price": candleSeries, "ema50": ema50, "ema20": ema20, "bb_lower": bb_lower, "bb_upper": bb_upper}
+	if (volumeSeries !== undefined){
+		series["volume"] = volumeSeries
+	}
+	// the MACD pane above is disabled, its bars are prepended as well once it is shown
+	if (typeof macdHistogram !== "undefined"){
+		series["macd"] = macdHistogram
+	}
+	chart.timeScale().subscribeVisibleLogicalRangeChange(range => {
+		if (range !== null && range.from < 10 && data.cursor && !data.loading){
+			data.loading = true
+			load_earlier_history(security_id, data, series)
+		}
+	})
+
 	document.querySelector("#nl_daily").classList.remove("active")
 	document.querySelector("#nl_weekly").classList.remove("active")
 	document.querySelector("#nl_monthly").classList.remove("active")
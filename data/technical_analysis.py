@@ -1,14 +1,31 @@
 from typing import Optional, Tuple
 from collections import deque
-from statistics import mean, stdev
-from data.models import HistoricData, Security
+from itertools import repeat
+from functools import lru_cache
+from math import fsum, sqrt
+from statistics import mean
+from data.models import Daily, DailyIndicators, HistoricData, HistoryFrame, Security
+from data.meta_dao import MetaData_Factory
+from django.db.models import Max
 from django.db.models.query import QuerySet
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from logging import getLogger
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
+import pymongo
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = getLogger(__name__)
 
 
 class MovingAverage:
+    __slots__ = ("_length", "_queue")
+
+    # number of values written per bar by write
+    width = 1
+
     def __init__(self, length: int):
         # ma length
         self._length = length
@@ -27,51 +44,210 @@ class EMA(MovingAverage):
 
     """
 
+    __slots__ = ("__factor", "__ema_reached", "__ema", "__latest")
+
     def __init__(self, length: int):
         super().__init__(length)
 
         self.__factor = float(2 / (1 + length))
         self.__ema_reached = False
+        self.__ema = None
+        self.__latest = None
 
     def add(self, value: float) -> Optional[float]:
         """
         returns the current ema for the given value if a valid ema does exist, else None
         """
 
-        self.__value = value
-
         # if the threshold for the ema is reached, we can use the factor calculation
         # in addition we use this value now for the queue
         if self.__ema_reached:
             self.__ema = (value * self.__factor) + (self.__ema * (1 - self.__factor))
             self._queue.appendleft(self.__ema)
-            return self.__ema
+            self.__latest = self.__ema
         # for the first ema value, we have to calculate the sma as a first basis
         else:
             self._queue.appendleft(value)
             if len(self._queue) == self._length:
                 self.__ema_reached = True
                 self.__ema = mean(self._queue)
-            return None
+            self.__latest = None
+
+        return self.__latest
+
+    def current_value(self) -> Optional[float]:
+        """
+        returns the value of the latest add
+        """
+        return self.__latest
+
+    def write(self, out: np.ndarray, row: int) -> None:
+        """
+        writes the value of the latest add into the output buffer, NaN instead of None
+        """
+        out[row] = self.__latest
+
+    def get_state(self) -> dict:
+        """
+        returns the state as plain (json/bson serialisable) dictionary
+        """
+        return {
+            "queue": list(self._queue),
+            "ema_reached": self.__ema_reached,
+            "ema": self.__ema,
+            "latest": self.__latest,
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        continues from a state provided by get_state
+        """
+        self._queue = deque(state["queue"], maxlen=self._length)
+        self.__ema_reached = state["ema_reached"]
+        self.__ema = state["ema"]
+        self.__latest = state["latest"]
+
+
+class RollingStatistics:
+    """
+    Rolling mean and variance over a window using Welford's algorithm, extended to also remove the
+    value leaving the window, so each update is O(1) independent of the window size.
+
+    Compared to statistics.mean/stdev on the same window, the results agree within a relative
+    tolerance of 1e-9 for price like data. As rounding errors accumulate over time, the owner of the
+    window should call reset with the current window every now and then.
+    """
+
+    __slots__ = ("__n", "__mean", "__m2")
+
+    def __init__(self):
+        self.__n = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+
+    def add(self, value: float) -> None:
+        """
+        adds a value to the window, hence increases the window size by one
+        """
+        self.__n += 1
+        delta = value - self.__mean
+        self.__mean += delta / self.__n
+        self.__m2 += delta * (value - self.__mean)
+
+    def replace(self, old_value: float, new_value: float) -> None:
+        """
+        the new value enters the window while the old value leaves it, the window size stays the same
+        """
+        old_mean = self.__mean
+        self.__mean += (new_value - old_value) / self.__n
+        self.__m2 += (new_value - old_value) * (new_value - self.__mean + old_value - old_mean)
+        # rounding errors could drive a flat window slightly below zero
+        if self.__m2 < 0:
+            self.__m2 = 0.0
+
+    def reset(self, values) -> None:
+        """
+        re-calculates mean and variance from the given window values
+        """
+        self.__n = len(values)
+        self.__mean = fsum(values) / self.__n
+        self.__m2 = fsum((value - self.__mean) ** 2 for value in values)
+
+    def mean(self) -> float:
+        return self.__mean
+
+    def get_state(self) -> dict:
+        return {"n": self.__n, "mean": self.__mean, "m2": self.__m2}
+
+    def set_state(self, state: dict) -> None:
+        self.__n = state["n"]
+        self.__mean = state["mean"]
+        self.__m2 = state["m2"]
+
+    def variance(self) -> float:
+        """
+        sample variance, as statistics.variance
+        """
+        return self.__m2 / (self.__n - 1)
+
+    def stdev(self) -> float:
+        """
+        sample standard deviation, as statistics.stdev
+        """
+        return sqrt(self.variance())
 
 
 class SMA(MovingAverage):
-    def __init__(self, length: int):
+    """
+    Simple Moving Average based on RollingStatistics, so each new value is added in constant time
+    instead of summing up the whole queue again, the same applies for the standard deviation.
+
+    As adding and subtracting floats accumulates rounding errors, the statistics are re-calculated
+    from the queue every resum_interval additions, use 0 to disable the re-summation.
+    """
+
+    __slots__ = ("__statistics", "__resum_interval", "__adds_since_resum", "__value", "__sma")
+
+    def __init__(self, length: int, resum_interval: int = 1000):
         super().__init__(length)
 
+        self.__statistics = RollingStatistics()
+        self.__resum_interval = resum_interval
+        self.__adds_since_resum = 0
+        self.__value = None
+        self.__sma = None
+
     def add(self, value: float) -> float:
         """
-        returns the current ema for the given value if a valid ema does exist, else None
+        returns the current sma for the given value, for the first entries the sma is based on
+        the entries available so far
         """
 
         self.__value = value
+
+        # the queue is full, hence the oldest entry will be dropped by the deque
+        if len(self._queue) == self._length:
+            self.__statistics.replace(self._queue[-1], self.__value)
+        else:
+            self.__statistics.add(self.__value)
         self._queue.appendleft(self.__value)
-        self.__sma = mean(self._queue)
+
+        self.__adds_since_resum += 1
+        if self.__resum_interval > 0 and self.__adds_since_resum >= self.__resum_interval:
+            self.__statistics.reset(self._queue)
+            self.__adds_since_resum = 0
+
+        self.__sma = self.__statistics.mean()
 
         return self.__sma
     
     def current_value(self) -> float:
         return self.__sma
+
+    def write(self, out: np.ndarray, row: int) -> None:
+        out[row] = self.__sma
+
+    def get_state(self) -> dict:
+        """
+        returns the state as plain (json/bson serialisable) dictionary
+        """
+        return {
+            "queue": list(self._queue),
+            "statistics": self.__statistics.get_state(),
+            "adds_since_resum": self.__adds_since_resum,
+            "value": self.__value,
+            "sma": self.__sma,
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        continues from a state provided by get_state
+        """
+        self._queue = deque(state["queue"], maxlen=self._length)
+        self.__statistics.set_state(state["statistics"])
+        self.__adds_since_resum = state["adds_since_resum"]
+        self.__value = state["value"]
+        self.__sma = state["sma"]
     
     def getN(self) -> int:
         return len(self._queue)
@@ -90,13 +266,13 @@ class SMA(MovingAverage):
 
     def sigma_delta(self) -> Optional[float]:
         if len(self._queue) == self._length:
-            return (self.__value - self.__sma) / stdev(self._queue)
+            return (self.__value - self.__sma) / self.__statistics.stdev()
         else:
             return None
 
     def stdev(self) -> Optional[float]:
         if len(self._queue) == self._length:
-            return stdev(self._queue)
+            return self.__statistics.stdev()
         else:
             return None
 
@@ -128,13 +304,36 @@ class SMA(MovingAverage):
 
 
 class BollingerBands:
-    def __init__(self, window_size=20, std=2):
+    """
+    the sma can be shared with other users of the same window, i.e. within an IndicatorPipeline,
+    in that case the owner of the sma adds the values and this instance only evaluates
+    """
+
+    __slots__ = ("__length", "__std", "__ma")
+
+    # lower and upper band
+    width = 2
+
+    def __init__(self, window_size=20, std=2, sma: Optional[SMA] = None):
         self.__length = window_size
         self.__std = std
-        self.__ma = SMA(window_size)
+        self.__ma = sma if sma is not None else SMA(window_size)
 
     def add(self, value: float) -> Optional[Tuple[float, float]]:
-        current_ma = self.__ma.add(value)
+        self.__ma.add(value)
+        return self.evaluate()
+
+    def get_state(self) -> dict:
+        return {"sma": self.__ma.get_state()}
+
+    def set_state(self, state: dict) -> None:
+        self.__ma.set_state(state["sma"])
+
+    def evaluate(self) -> Optional[Tuple[float, float]]:
+        """
+        returns lower and upper band for the current state of the sma
+        """
+        current_ma = self.__ma.current_value()
         current_stdev = self.__ma.stdev()
         if current_stdev is not None:
             upper_limit = current_ma + current_stdev * self.__std
@@ -143,43 +342,141 @@ class BollingerBands:
         else:
             return None
 
+    def current_value(self) -> Optional[Tuple[float, float]]:
+        return self.evaluate()
+
+    def write(self, out: np.ndarray, row: int) -> None:
+        """
+        as evaluate, but writing lower and upper band into the columns of the output buffer
+        """
+        current_stdev = self.__ma.stdev()
+        if current_stdev is not None:
+            current_ma = self.__ma.current_value()
+            out[row, 0] = current_ma - current_stdev * self.__std
+            out[row, 1] = current_ma + current_stdev * self.__std
+        else:
+            out[row] = np.nan
+
 
 class MACD:
-    def __init__(self, fast_period=12, slow_period=26, signal_period=9):
+    """
+    the fast and slow ema can be shared with other users of the same ema, i.e. within an
+    IndicatorPipeline, in that case the owner of the emas adds the values and this instance only evaluates
+    """
+
+    __slots__ = (
+        "__fast_period", "__slow_period", "__signal_period",
+        "__fast_ma", "__slow_ma", "__macd_ma",
+        "__macd_line", "__signal_line", "__histogram",
+    )
+
+    # macd line, signal line and histogram
+    width = 3
+
+    def __init__(self, fast_period=12, slow_period=26, signal_period=9,
+                 fast_ma: Optional[EMA] = None, slow_ma: Optional[EMA] = None):
         self.__fast_period = fast_period
         self.__slow_period = slow_period
         self.__signal_period = signal_period
         
-        self.__fast_ma = EMA(fast_period)
-        self.__slow_ma = EMA(slow_period)
+        self.__fast_ma = fast_ma if fast_ma is not None else EMA(fast_period)
+        self.__slow_ma = slow_ma if slow_ma is not None else EMA(slow_period)
         self.__macd_ma = EMA(signal_period)
 
+        self.__macd_line = None
+        self.__signal_line = None
+        self.__histogram = None
+
     def add(self, value: float) -> Optional[Tuple[float, float, float, float]]:
         """
         returning a tupel with macd line, signal line and histogram
         Note: all values are normalized
         """
-        current_fast_ma = self.__fast_ma.add(value)
-        current_slow_ma = self.__slow_ma.add(value)
+        self.__fast_ma.add(value)
+        self.__slow_ma.add(value)
+        return self.evaluate(value)
+
+    def get_state(self) -> dict:
+        return {
+            "fast_ma": self.__fast_ma.get_state(),
+            "slow_ma": self.__slow_ma.get_state(),
+            "macd_ma": self.__macd_ma.get_state(),
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.__fast_ma.set_state(state["fast_ma"])
+        self.__slow_ma.set_state(state["slow_ma"])
+        self.__macd_ma.set_state(state["macd_ma"])
+
+    def evaluate(self, value: float) -> Optional[Tuple[float, float, float, float]]:
+        """
+        as add, but for the current state of the fast and slow ema
+        """
+        self.update(value)
+        return self.current_value()
 
+    def update(self, value: float) -> None:
+        """
+        as evaluate, without returning the values
+        """
+        current_fast_ma = self.__fast_ma.current_value()
+        current_slow_ma = self.__slow_ma.current_value()
+
+        self.__signal_line = None
         if current_slow_ma is not None:
-            macd_line = 100 * (current_fast_ma - current_slow_ma) / value
-            signal_line = self.__macd_ma.add(macd_line)
+            self.__macd_line = 100 * (current_fast_ma - current_slow_ma) / value
+            self.__signal_line = self.__macd_ma.add(self.__macd_line)
 
-            if signal_line is not None:
+            if self.__signal_line is not None:
                 # normalize also the signal line
-                histogram = macd_line - signal_line
-                return (macd_line, signal_line, histogram)
+                self.__histogram = self.__macd_line - self.__signal_line
 
+    def current_value(self) -> Optional[Tuple[float, float, float]]:
+        if self.__signal_line is not None:
+            return (self.__macd_line, self.__signal_line, self.__histogram)
         else:
             return None
 
+    def write(self, out: np.ndarray, row: int) -> None:
+        if self.__signal_line is not None:
+            out[row, 0] = self.__macd_line
+            out[row, 1] = self.__signal_line
+            out[row, 2] = self.__histogram
+        else:
+            out[row] = np.nan
+
 
 class RSI:
+    __slots__ = ("__period", "__previous", "__gain_sma", "__loss_sma", "__gains", "__losses", "__latest")
+
+    width = 1
+
     def __init__(self, period=14):
+        self.__period = period
         self.__previous = None
+        self.__latest = None
         self.__gain_sma = SMA(period)
         self.__loss_sma = SMA(period)
+        # number of non zero gains/losses within the window, as the rolling mean of a window full
+        # of zeros is not necessarily exactly zero
+        self.__gains = 0
+        self.__losses = 0
+
+    def get_state(self) -> dict:
+        return {
+            "previous": self.__previous,
+            "gain_sma": self.__gain_sma.get_state(),
+            "loss_sma": self.__loss_sma.get_state(),
+            "gains": self.__gains,
+            "losses": self.__losses,
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.__previous = state["previous"]
+        self.__gain_sma.set_state(state["gain_sma"])
+        self.__loss_sma.set_state(state["loss_sma"])
+        self.__gains = state["gains"]
+        self.__losses = state["losses"]
 
     def add(self, value: float) -> Optional[float]:
         
@@ -192,22 +489,39 @@ class RSI:
             gain = max(0, delta)
             loss = max(0, -delta)
 
+            # the oldest gain/loss is about to leave the window
+            if self.__gain_sma.getN() == self.__period:
+                self.__gains -= self.__gain_sma.getLast() > 0
+                self.__losses -= self.__loss_sma.getLast() > 0
+            self.__gains += gain > 0
+            self.__losses += loss > 0
+
             # Calculate average gain and loss
             avg_gain = self.__gain_sma.add(gain)
             avg_loss = self.__loss_sma.add(loss)
 
             self.__previous = value
 
-            if avg_gain != 0 and avg_loss != 0:
-                return 100 - (100 / (1 + (avg_gain / avg_loss)))
+            if self.__gains > 0 and self.__losses > 0:
+                self.__latest = 100 - (100 / (1 + (avg_gain / avg_loss)))
             else:
-                return None
+                self.__latest = None
+            return self.__latest
+
+    def current_value(self) -> Optional[float]:
+        return self.__latest
+
+    def write(self, out: np.ndarray, row: int) -> None:
+        out[row] = self.__latest
 
 
 class Momentum:
     """
     typical length is 14 or 30
     """
+
+    __slots__ = ("_length", "_queue")
+
     def __init__(self, length=14):
         # ma length
         self._length = length
@@ -226,10 +540,94 @@ class Momentum:
             return self._queue[-1] - self._queue[0]
         else:
             return None
-        
+
+    def get_state(self) -> dict:
+        return {"queue": list(self._queue)}
+
+    def set_state(self, state: dict) -> None:
+        self._queue = deque(state["queue"], maxlen=self._length)
+
+
+class RollingExtremum:
+    """
+    Rolling maximum (or minimum) over the last length values.
+
+    Using a monotonic deque holding only the values that could still become the extremum,
+    each add is amortised O(1) instead of scanning the whole window.
+    """
+
+    __slots__ = ("__length", "__maximum", "__count", "__positions", "__values")
+
+    def __init__(self, length: int, maximum: bool = True):
+        self.__length = length
+        self.__maximum = maximum
+        self.__count = 0
+        # positions and values of the candidates, values are monotonic, the extremum is on the left;
+        # two deques instead of one holding (position, value) pairs, so no tuple is created per add
+        self.__positions: deque = deque()
+        self.__values: deque = deque()
+
+    def add(self, value: float) -> float:
+        """
+        returns the extremum of the window including the given value
+        """
+        positions = self.__positions
+        values = self.__values
+
+        # values dominated by the new one will never become the extremum again
+        if self.__maximum:
+            while values and values[-1] <= value:
+                positions.pop()
+                values.pop()
+        else:
+            while values and values[-1] >= value:
+                positions.pop()
+                values.pop()
+        positions.append(self.__count)
+        values.append(value)
+
+        # drop the extremum once it has left the window
+        if positions[0] <= self.__count - self.__length:
+            positions.popleft()
+            values.popleft()
+
+        self.__count += 1
+        return values[0]
+
+    def current_value(self) -> float:
+        return self.__values[0]
+
+    def get_state(self) -> dict:
+        return {"count": self.__count, "candidates": [list(candidate) for candidate in zip(self.__positions, self.__values)]}
+
+    def set_state(self, state: dict) -> None:
+        self.__count = state["count"]
+        self.__positions = deque(position for position, value in state["candidates"])
+        self.__values = deque(value for position, value in state["candidates"])
+
+    def getN(self) -> int:
+        return min(self.__count, self.__length)
+
 
 class Ichimoku:
 
+    __slots__ = (
+        "__tenkan_length", "__kijun_length", "__senko_span_length",
+        "tenkan_sen_highs", "tenkan_sen_lows", "kijun_sen_highs", "kijun_sen_lows",
+        "chikous", "chikous_span_1s", "chikous_span_2s",
+        "senko_span_highs", "senko_span_lows", "senko_a_history", "senko_b_history",
+        "__senko_a_count", "__values",
+    )
+
+    # the keys of the values returned by add, in the order of the columns written by write
+    fields = (
+        "tenkan_sen", "kijun_sen",
+        "senko_span_1_current", "senko_span_2_current",
+        "close_at_chikou", "chikou_span_1", "chikou_span_2",
+        "senko_span_1_future", "senko_span_2_future",
+    )
+    width = len(fields)
+
     def __init__(self, 
                  kijun_lookback  = 26, 
                  tenkan_lookback =  9, 
@@ -240,77 +638,132 @@ class Ichimoku:
         self.__kijun_length = kijun_lookback
         self.__senko_span_length = senkou_span_b_lookback
         
-        self.tenkan_sen_highs = SMA(self.__tenkan_length)
-        self.tenkan_sen_lows = SMA(self.__tenkan_length)
+        self.tenkan_sen_highs = RollingExtremum(self.__tenkan_length, maximum=True)
+        self.tenkan_sen_lows = RollingExtremum(self.__tenkan_length, maximum=False)
 
-        self.kijun_sen_highs = SMA(self.__kijun_length)
-        self.kijun_sen_lows = SMA(self.__kijun_length)
+        self.kijun_sen_highs = RollingExtremum(self.__kijun_length, maximum=True)
+        self.kijun_sen_lows = RollingExtremum(self.__kijun_length, maximum=False)
 
-        self.chikous = SMA(chikou_lookback)
-        self.chikous_span_1s = SMA(chikou_lookback)
-        self.chikous_span_2s = SMA(chikou_lookback)
+        # the oldest entry (left) of these queues is the value at the chikou position
+        self.chikous: deque = deque(maxlen=chikou_lookback)
+        self.chikous_span_1s: deque = deque(maxlen=chikou_lookback)
+        self.chikous_span_2s: deque = deque(maxlen=chikou_lookback)
 
-        self.senko_span_highs = SMA(self.__senko_span_length)
-        self.senko_span_lows = SMA(self.__senko_span_length)
+        self.senko_span_highs = RollingExtremum(self.__senko_span_length, maximum=True)
+        self.senko_span_lows = RollingExtremum(self.__senko_span_length, maximum=False)
 
-        self.senko_a_history = list()
-        self.senko_b_history = list()
+        # only the current and the projected senko spans are required
+        self.senko_a_history: deque = deque(maxlen=self.__kijun_length + 1)
+        self.senko_b_history: deque = deque(maxlen=self.__kijun_length + 1)
+        self.__senko_a_count = 0
 
-        self.__latest = None
+        # the current values in the order of fields, None until the cloud is complete
+        self.__values = None
 
     def add(self, high, low, close) -> Optional[dict]:
         """
         returns the current ichimoku values: tenkan, kijun, senkos (cumo), chikou and future senkos, so the furture cloud
         """
+        self.update(high, low, close)
+        return self.current_value()
 
-        self.tenkan_sen_highs.add(high)
-        self.kijun_sen_highs.add(high)
-        self.senko_span_highs.add(high)
+    def update(self, high, low, close) -> None:
+        """
+        as add, without returning the values
+        """
+
+        tenkan_high = self.tenkan_sen_highs.add(high)
+        kijun_high = self.kijun_sen_highs.add(high)
+        senko_span_high = self.senko_span_highs.add(high)
 
-        self.tenkan_sen_lows.add(low)
-        self.kijun_sen_lows.add(low)
-        self.senko_span_lows.add(low)
+        tenkan_low = self.tenkan_sen_lows.add(low)
+        kijun_low = self.kijun_sen_lows.add(low)
+        senko_span_low = self.senko_span_lows.add(low)
 
-        self.chikous.add(close)
+        self.chikous.append(close)
 
         if (self.tenkan_sen_highs.getN() == self.__tenkan_length and self.kijun_sen_highs.getN() == self.__kijun_length):
-            tenkan_sen = (self.tenkan_sen_highs.getMax() + self.tenkan_sen_lows.getMin()) / 2
-            kijun_sen = (self.kijun_sen_highs.getMax() + self.kijun_sen_lows.getMin()) / 2
+            tenkan_sen = (tenkan_high + tenkan_low) / 2
+            kijun_sen = (kijun_high + kijun_low) / 2
 
             senko = (tenkan_sen + kijun_sen) / 2
             self.senko_a_history.append(senko)
+            self.__senko_a_count += 1
 
         if self.senko_span_highs.getN() == self.__senko_span_length:
-            senko_span = (self.senko_span_highs.getMax() + self.senko_span_lows.getMin()) / 2
+            senko_span = (senko_span_high + senko_span_low) / 2
             self.senko_b_history.append(senko_span)
 
-        if len(self.senko_a_history) > self.__kijun_length + self.__senko_span_length:
-
-            senko_span_1 = self.senko_a_history[-1 - self.__kijun_length]
-            senko_span_2 = self.senko_b_history[-1 - self.__kijun_length]
-
-            self.chikous_span_1s.add(senko_span_1)
-            self.chikous_span_2s.add(senko_span_2)
-
-            self.__latest = {"tenkan_sen": tenkan_sen,
-                    "kijun_sen": kijun_sen,
-                    # kumo boundaries
-                    "senko_span_1_current": senko_span_1,
-                    "senko_span_2_current": senko_span_2,
-                    # behind
-                    "close_at_chikou": self.chikous.getLast(),
-                    # the kumo at chikou position
-                    "chikou_span_1": self.chikous_span_1s.getLast(),
-                    "chikou_span_2": self.chikous_span_2s.getLast(),
-                    # up front (future kumo)
-                    "senko_span_1_future": self.senko_a_history[-1],
-                    "senko_span_2_future": self.senko_b_history[-1]
-                    }
-            
-            return self.__latest
-    
+        if self.__senko_a_count > self.__kijun_length + self.__senko_span_length:
+
+            senko_span_1 = self.senko_a_history[0]
+            senko_span_2 = self.senko_b_history[0]
+
+            self.chikous_span_1s.append(senko_span_1)
+            self.chikous_span_2s.append(senko_span_2)
+
+            if self.__values is None:
+                self.__values = [None] * self.width
+            values = self.__values
+            values[0] = tenkan_sen
+            values[1] = kijun_sen
+            # kumo boundaries
+            values[2] = senko_span_1
+            values[3] = senko_span_2
+            # behind
+            values[4] = self.chikous[0]
+            # the kumo at chikou position
+            values[5] = self.chikous_span_1s[0]
+            values[6] = self.chikous_span_2s[0]
+            # up front (future kumo)
+            values[7] = self.senko_a_history[-1]
+            values[8] = self.senko_b_history[-1]
+
     def current_value(self) -> Optional[dict]:
-        return self.__latest
+        if self.__values is not None:
+            return dict(zip(self.fields, self.__values))
+        else:
+            return None
+
+    def write(self, out: np.ndarray, row: int) -> None:
+        if self.__values is not None:
+            out[row] = self.__values
+        else:
+            out[row] = np.nan
+
+    def get_state(self) -> dict:
+        """
+        returns the state as plain (json/bson serialisable) dictionary
+        """
+        return {
+            "tenkan_sen_highs": self.tenkan_sen_highs.get_state(),
+            "tenkan_sen_lows": self.tenkan_sen_lows.get_state(),
+            "kijun_sen_highs": self.kijun_sen_highs.get_state(),
+            "kijun_sen_lows": self.kijun_sen_lows.get_state(),
+            "senko_span_highs": self.senko_span_highs.get_state(),
+            "senko_span_lows": self.senko_span_lows.get_state(),
+            "chikous": list(self.chikous),
+            "chikous_span_1s": list(self.chikous_span_1s),
+            "chikous_span_2s": list(self.chikous_span_2s),
+            "senko_a_history": list(self.senko_a_history),
+            "senko_b_history": list(self.senko_b_history),
+            "senko_a_count": self.__senko_a_count,
+            "latest": self.current_value(),
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        continues from a state provided by get_state
+        """
+        for extremum in ("tenkan_sen_highs", "tenkan_sen_lows", "kijun_sen_highs", "kijun_sen_lows", "senko_span_highs", "senko_span_lows"):
+            getattr(self, extremum).set_state(state[extremum])
+        for queue in ("chikous", "chikous_span_1s", "chikous_span_2s", "senko_a_history", "senko_b_history"):
+            setattr(self, queue, deque(state[queue], maxlen=getattr(self, queue).maxlen))
+        self.__senko_a_count = state["senko_a_count"]
+        if state["latest"] is not None:
+            self.__values = [state["latest"][field] for field in self.fields]
+        else:
+            self.__values = None
         
     def latest(self, history: QuerySet[HistoricData]) -> dict:
         if history.count() > self.__senko_span_length:
@@ -321,6 +774,310 @@ class Ichimoku:
             raise ValueError("History size not sufficient.")
 
 
+class IndicatorPipeline:
+    """
+    Feeds each bar exactly once into all declared indicators and returns all outputs together.
+
+    Indicators are nodes keyed by type and parameters, so identical windows share one state, e.g.
+    a SMA(20) serves the Bollinger Bands as well as a plain SMA(20) and the EMA(12)/EMA(26) of the
+    MACD are the same as plain EMAs of that length. Nodes are created dependencies first, hence
+    feeding them in insertion order evaluates a composite only after its inputs are updated.
+
+        pipeline = IndicatorPipeline()
+        pipeline.sma("sma50", 50)
+        pipeline.bollinger("bb")
+        for entry in history:
+            values = pipeline.add(close=entry.close)
+            values["bb"] ...
+
+    To process a whole series, run writes the outputs of each bar into preallocated arrays instead.
+    """
+
+    __slots__ = ("__nodes", "__outputs", "__latest")
+
+    def __init__(self):
+        # node key -> (indicator, function feeding the indicator with (close, high, low))
+        self.__nodes = dict()
+        # output name -> node key
+        self.__outputs = dict()
+        self.__latest = None
+
+    def __node(self, key: tuple, factory, feed):
+        if key not in self.__nodes:
+            indicator = factory()
+            self.__nodes[key] = (indicator, feed(indicator))
+        return self.__nodes[key][0]
+
+    def __declare(self, name: str, key: tuple) -> None:
+        self.__outputs[name] = key
+
+    def __sma(self, length: int) -> SMA:
+        return self.__node(
+            ("sma", length),
+            lambda: SMA(length),
+            lambda sma: lambda close, high, low: sma.add(close),
+        )
+
+    def __ema(self, length: int) -> EMA:
+        return self.__node(
+            ("ema", length),
+            lambda: EMA(length),
+            lambda ema: lambda close, high, low: ema.add(close),
+        )
+
+    def sma(self, name: str, length: int) -> SMA:
+        sma = self.__sma(length)
+        self.__declare(name, ("sma", length))
+        return sma
+
+    def ema(self, name: str, length: int) -> EMA:
+        ema = self.__ema(length)
+        self.__declare(name, ("ema", length))
+        return ema
+
+    def bollinger(self, name: str, window_size=20, std=2) -> BollingerBands:
+        sma = self.__sma(window_size)
+        key = ("bollinger", window_size, std)
+        bb = self.__node(
+            key,
+            lambda: BollingerBands(window_size, std, sma=sma),
+            # the shared sma is fed by its own node
+            lambda bb: lambda close, high, low: None,
+        )
+        self.__declare(name, key)
+        return bb
+
+    def macd(self, name: str, fast_period=12, slow_period=26, signal_period=9) -> MACD:
+        fast_ma = self.__ema(fast_period)
+        slow_ma = self.__ema(slow_period)
+        key = ("macd", fast_period, slow_period, signal_period)
+        macd = self.__node(
+            key,
+            lambda: MACD(fast_period, slow_period, signal_period, fast_ma=fast_ma, slow_ma=slow_ma),
+            lambda macd: lambda close, high, low: macd.update(close),
+        )
+        self.__declare(name, key)
+        return macd
+
+    def rsi(self, name: str, period=14) -> RSI:
+        key = ("rsi", period)
+        rsi = self.__node(
+            key,
+            lambda: RSI(period),
+            lambda rsi: lambda close, high, low: rsi.add(close),
+        )
+        self.__declare(name, key)
+        return rsi
+
+    def ichimoku(self, name: str, **lookbacks) -> Ichimoku:
+        """
+        requires high and low to be provided with each bar
+        """
+        key = ("ichimoku",) + tuple(sorted(lookbacks.items()))
+        ichimoku = self.__node(
+            key,
+            lambda: Ichimoku(**lookbacks),
+            lambda ichimoku: lambda close, high, low: ichimoku.update(high, low, close),
+        )
+        self.__declare(name, key)
+        return ichimoku
+
+    def __len__(self) -> int:
+        """
+        number of states fed per bar
+        """
+        return len(self.__nodes)
+
+    def indicator(self, name: str):
+        """
+        returns the (shared) indicator instance of the given output, i.e. to access SMA.sigma_delta
+        """
+        return self.__nodes[self.__outputs[name]][0]
+
+    def add(self, close: float, high: Optional[float] = None, low: Optional[float] = None) -> dict:
+        """
+        feeds the bar once into every node and returns the outputs by name
+        """
+        for indicator, feed in self.__nodes.values():
+            feed(close, high, low)
+
+        self.__latest = {name: self.__nodes[key][0].current_value() for name, key in self.__outputs.items()}
+        return self.__latest
+
+    def run(self, close, high=None, low=None) -> dict:
+        """
+        feeds the whole series and returns the outputs by name as arrays, NaN where add returns None;
+        outputs consisting of several values (bollinger, macd, ichimoku) are columns in that order
+
+        each bar is written directly into preallocated arrays, so neither tuples nor dictionaries
+        are created per bar
+        """
+        close = np.asarray(close, dtype=float)
+        size = len(close)
+        highs = repeat(None, size) if high is None else np.asarray(high, dtype=float).tolist()
+        lows = repeat(None, size) if low is None else np.asarray(low, dtype=float).tolist()
+
+        buffers = {
+            key: np.full(size if indicator.width == 1 else (size, indicator.width), np.nan)
+            for key, (indicator, feed) in self.__nodes.items()
+        }
+        nodes = [(feed, indicator.write, buffers[key]) for key, (indicator, feed) in self.__nodes.items()]
+
+        for row, (c, h, l) in enumerate(zip(close.tolist(), highs, lows)):
+            for feed, write, buffer in nodes:
+                feed(c, h, l)
+                write(buffer, row)
+
+        if size > 0:
+            self.__latest = {name: self.__nodes[key][0].current_value() for name, key in self.__outputs.items()}
+        return {name: buffers[key] for name, key in self.__outputs.items()}
+
+    def current_value(self) -> Optional[dict]:
+        """
+        returns the outputs of the latest add
+        """
+        return self.__latest
+
+    def get_state(self) -> dict:
+        """
+        returns the state of all nodes as plain (json/bson serialisable) dictionary
+        """
+        return {
+            "nodes": [[repr(key), indicator.get_state()] for key, (indicator, feed) in self.__nodes.items()],
+            "latest": self.__latest,
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        continues from a state provided by get_state, the same indicators have to be declared
+        """
+        if [key for key, node_state in state["nodes"]] != [repr(key) for key in self.__nodes]:
+            raise ValueError("State does not match the declared indicators.")
+
+        for (key, node_state), (indicator, feed) in zip(state["nodes"], self.__nodes.values()):
+            indicator.set_state(node_state)
+        self.__latest = state["latest"]
+
+
+def _snapshots():
+    return MetaData_Factory().db("market_analysis")["indicator_snapshots"]
+
+
+def save_snapshot(name: str, security: Security, interval: str, last_date: date, last_close: float, pipeline: IndicatorPipeline) -> None:
+    """
+    stores the state of the pipeline after adding the bar of last_date, identified by name, security
+    and interval
+    """
+    _data = {
+        "date": str(last_date),
+        "close": last_close,
+        "state": pipeline.get_state(),
+    }
+    _snapshots().update_one(
+        {"name": name, "security": security.pk, "interval": interval},
+        {"$set": _data},
+        upsert=True,
+    )
+
+
+def load_snapshot(name: str, security: Security, interval: str) -> Optional[dict]:
+    """
+    returns the snapshot identified by name, security and interval, None if there is none
+    """
+    snapshot = _snapshots().find_one({"name": name, "security": security.pk, "interval": interval})
+    if snapshot is None:
+        return None
+
+    snapshot["date"] = datetime.strptime(snapshot["date"], "%Y-%m-%d").date()
+    return snapshot
+
+
+def feed_history(name: str, security: Security, pipeline: IndicatorPipeline, look_back=400,
+                 frame: Optional[HistoryFrame] = None) -> Optional[dict]:
+    """
+    feeds the daily history into the pipeline and returns the latest outputs
+
+    if a snapshot of a previous run exists and the bar it ended with is unchanged, only the newer
+    bars are added, otherwise the last look_back bars are replayed; afterwards the snapshot is updated
+
+    frame, i.e. of HistoryFrame.load_many, holds the latest daily bars and replaces the queries; a
+    snapshot older than the frame is replayed
+    """
+    interval = "1d"
+
+    try:
+        snapshot = load_snapshot(name, security, interval)
+    except (RuntimeError, pymongo.errors.PyMongoError) as error:
+        logger.warning(f"Could not read snapshot {name} for {security}: {error}")
+        snapshot = None
+
+    if snapshot is not None:
+        # if the history has been revised in between, the snapshot is not valid anymore
+        if frame is None:
+            stored_close = (
+                security.daily_data.filter(date=snapshot["date"])
+                .values_list("close", flat=True)
+                .first()
+            )
+        else:
+            position = np.searchsorted(frame.date, np.datetime64(snapshot["date"], "D"))
+            stored_close = None
+            if position < len(frame) and frame.date[position] == np.datetime64(snapshot["date"], "D"):
+                stored_close = frame.close[position]
+        if stored_close is None or stored_close != snapshot["close"]:
+            logger.debug(f"history of {security} changed, replaying {name}")
+            snapshot = None
+
+    if snapshot is not None:
+        try:
+            pipeline.set_state(snapshot["state"])
+        except ValueError as error:
+            logger.debug(f"ignoring snapshot {name} for {security}: {error}")
+            snapshot = None
+
+    if frame is not None:
+        first = max(len(frame) - look_back, 0) if snapshot is None else position + 1
+        history = list(zip(
+            frame.date[first:].tolist(), frame.close[first:].tolist(), frame.high[first:].tolist(), frame.low[first:].tolist()
+        ))
+    else:
+        bars = security.daily_data.values_list("date", "close", "high_price", "low")
+        if snapshot is None:
+            history = list(reversed(bars[:look_back]))
+        else:
+            history = list(bars.filter(date__gt=snapshot["date"]).order_by("date"))
+
+    for day, close, high, low in history:
+        pipeline.add(close=close, high=high, low=low)
+
+    if len(history) > 0:
+        try:
+            save_snapshot(name, security, interval, history[-1][0], history[-1][1], pipeline)
+        except (RuntimeError, pymongo.errors.PyMongoError) as error:
+            logger.warning(f"Could not store snapshot {name} for {security}: {error}")
+
+    return pipeline.current_value()
+
+
+def sma_latest(closes, length: int = 50) -> dict:
+    """
+    as SMA.latest for the ascending closes: the sma, sigma delta and relative delta of the latest
+    close and the hurst of all closes
+    """
+    closes = np.asarray(closes, dtype=float)
+    if len(closes) <= length:
+        raise ValueError("History size not sufficient.")
+
+    sma = closes[-length:].mean()
+    return {
+        "sma": sma,
+        "sd": sigma_delta_series(closes[-length:], length)[-1],
+        "length": length,
+        "delta": 100 * (closes[-1] - sma) / sma,
+        "hurst": Hurst().hurst(closes),
+    }
+
+
 def evaluate_ikh(close:float, ikh:dict ) -> int:
 
     evaluation_value = 0
@@ -370,76 +1127,515 @@ class Hurst:
         # hurst = 0.5 - input_ts is effectively random/geometric brownian motion
         # hurst > 0.5 - input_ts is trending
 
-        tau = []
-        lagvec = []
-        # Step through the different lags
-        for lag in range(lags_to_test[0], lags_to_test[1]):
-            # produce time series difference with lag
-            pp = np.subtract(input_ts[lag:], input_ts[:-lag])
-            # Write the different lags into a vector
-            lagvec.append(lag)
-            # Calculate the variance of the difference vector
-            tau.append(np.std(pp))
-        # linear fit to double-log graph (gives power)
-        m = np.polyfit(np.log10(lagvec), np.log10(tau), 1)
-        # hurst exponent is the slope of the line of best fit
-        hurst = m[0]
-        return hurst
+        # the hurst of the whole input is the last (and only) window of the rolling hurst
+        return hurst_series(input_ts, len(input_ts), lags_to_test)[-1]
 
-from data.history_dao import History_DAO_Factory
-from data.helper import humanize_price
 
-def hl_watchlist(security:Security) -> dict:
+@lru_cache
+def _hurst_lag_weights(min_lag: int, max_lag: int) -> np.ndarray:
+    """
+    the slope of a least squares fit against log10(lags) is a weighted sum of the y values,
+    as the lags are the same for every window, the weights are calculated only once
+    """
+    log_lags = np.log10(np.arange(min_lag, max_lag))
+    centered = log_lags - log_lags.mean()
+    return centered / (centered @ centered)
 
-    watchlist_entry = dict()
-    watchlist_entry["security"] = security
-    history = security.daily_data.all()[:200]
-    
-    if security.data_provider.name == "Yahoo":
-        dao = History_DAO_Factory().get_online_dao(security.data_provider)
-        watchlist_entry["price"] = humanize_price(dao.lookupPrice(security.symbol))
-        try:
-            watchlist_entry["pe_forward"] = dao.lookup_summary_detail(security)[
-                "forwardPE"
-            ]["raw"]
-        except KeyError:
-            watchlist_entry["pe_forward"] = float("nan")
-    else:
-        
-        price = dict()
-        price["change_percent"] = (
-            100 * (history[0].close - history[1].close) / history[1].close
+
+#
+# vectorized full series, the counterpart to the streaming classes above
+#
+# each function takes the whole history as array (ascending by date) and returns numpy arrays of
+# the same length; where the streaming class returns None, the series holds NaN
+#
+
+
+def _rolling_windows(values: np.ndarray, length: int) -> np.ndarray:
+    """
+    returns a read only view holding the complete windows of the given length
+    """
+    return sliding_window_view(values, length)
+
+
+def _leading_nan(result: np.ndarray, size: int) -> np.ndarray:
+    """
+    pads the result of a rolling window calculation to the given size
+    """
+    padded = np.full(size, np.nan)
+    padded[size - len(result):] = result
+    return padded
+
+
+def rolling_max_series(values, length: int) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return _leading_nan(_rolling_windows(values, length).max(axis=1), len(values))
+
+
+def rolling_min_series(values, length: int) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return _leading_nan(_rolling_windows(values, length).min(axis=1), len(values))
+
+
+def sma_series(values, length: int) -> np.ndarray:
+    """
+    as SMA.add, the first length - 1 entries are the mean of the entries available so far
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.empty(len(values))
+    warm_up = min(length - 1, len(values))
+    result[:warm_up] = np.cumsum(values[:warm_up]) / np.arange(1, warm_up + 1)
+    if len(values) >= length:
+        result[warm_up:] = _rolling_windows(values, length).mean(axis=1)
+    return result
+
+
+def stdev_series(values, length: int) -> np.ndarray:
+    """
+    sample standard deviation over complete windows, as SMA.stdev
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < length:
+        return np.full(len(values), np.nan)
+    return _leading_nan(_rolling_windows(values, length).std(axis=1, ddof=1), len(values))
+
+
+def sigma_delta_series(values, length: int) -> np.ndarray:
+    """
+    distance of the value to its sma in standard deviations, as SMA.sigma_delta
+    """
+    values = np.asarray(values, dtype=float)
+    return (values - sma_series(values, length)) / stdev_series(values, length)
+
+
+def ema_series(values, length: int) -> np.ndarray:
+    """
+    as EMA.add, the sma of the first length entries is the basis for the ema, hence the first valid
+    entry is at position length
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if len(values) > length:
+        result[length:] = _ema(values, length)[length:]
+    return result
+
+
+def _ema(values: np.ndarray, length: int) -> np.ndarray:
+    """
+    ema including the sma seed at position length - 1
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) >= length:
+        seeded = values[length - 1:].copy()
+        seeded[0] = values[:length].mean()
+        result[length - 1:] = (
+            pd.Series(seeded).ewm(alpha=2 / (1 + length), adjust=False).mean().to_numpy()
         )
-        price["price"] = history[0].close
-        price["change"] = history[0].close - history[1].close
+    return result
 
-        price["timestamp"] = history[0].date
-        
-        price["local_timestamp"] = datetime.combine(history[0].date, datetime.min.time())
-        watchlist_entry["price"] = price
 
-    if len(history) > 50:
+def bollinger_series(values, window_size=20, std=2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    returning lower and upper band, as BollingerBands.add
+    """
+    values = np.asarray(values, dtype=float)
+    center = sma_series(values, window_size)
+    deviation = stdev_series(values, window_size) * std
+    return (center - deviation, center + deviation)
+
 
-        # create our SMA and Ichimokou instances
-        ikh = Ichimoku()
-        sma = SMA(50)
+def macd_series(values, fast_period=12, slow_period=26, signal_period=9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    returning macd line, signal line and histogram (normalized), as MACD.add
+    """
+    values = np.asarray(values, dtype=float)
+    size = len(values)
+    macd_line = np.full(size, np.nan)
+    signal_line = np.full(size, np.nan)
+
+    if size > slow_period:
+        macd_line[slow_period:] = (
+            100 * (ema_series(values, fast_period)[slow_period:] - ema_series(values, slow_period)[slow_period:])
+            / values[slow_period:]
+        )
+        signal_line[slow_period:] = ema_series(macd_line[slow_period:], signal_period)
+        # as long as there is no signal line, MACD.add returns None
+        macd_line[np.isnan(signal_line)] = np.nan
 
-        # loop over the history
-        for h in reversed(history):
-            close = float(h.close)
-            ikh.add(high=float(h.high_price), low=float(h.low), close=close)
-            sma.add(close)
-        
-        # update the watchlist_entry
-        watchlist_entry["ikh_evaluation"] = evaluate_ikh(close, ikh.current_value())
+    return (macd_line, signal_line, macd_line - signal_line)
+
+
+def rsi_series(values, period=14) -> np.ndarray:
+    """
+    as RSI.add, the average gain and loss are based on the sma of the price changes
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if len(values) > 1:
+        delta = np.diff(values)
+        avg_gain = sma_series(np.maximum(delta, 0), period)
+        avg_loss = sma_series(np.maximum(-delta, 0), period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - (100 / (1 + (avg_gain / avg_loss)))
+        rsi[(avg_gain == 0) | (avg_loss == 0)] = np.nan
+        result[1:] = rsi
+    return result
+
+
+def momentum_series(values, length=14) -> np.ndarray:
+    """
+    as Momentum.add, the difference between the oldest and the newest value of the window
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if len(values) >= length:
+        result[length - 1:] = values[:len(values) - length + 1] - values[length - 1:]
+    return result
+
+
+def hurst_series(values, length=50, lags_to_test=(2, 20)) -> np.ndarray:
+    """
+    rolling hurst exponent over windows of the given length, as SMA.hurst
+
+    for each lag, the standard deviation of the lagged differences is calculated for all windows at
+    once; the hurst exponent is the slope of log10(std) over log10(lag)
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if len(values) < length:
+        return result
+
+    result[length - 1:] = _hurst_of_windows(_rolling_windows(values, length), lags_to_test)
+    return result
+
+
+def _hurst_of_windows(windows: np.ndarray, lags_to_test=(2, 20)) -> np.ndarray:
+    """
+    hurst exponent of each row of the 2d array
+    """
+    tau = np.empty((len(windows), lags_to_test[1] - lags_to_test[0]))
+    for column, lag in enumerate(range(lags_to_test[0], lags_to_test[1])):
+        tau[:, column] = (windows[:, lag:] - windows[:, :-lag]).std(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log10(tau) @ _hurst_lag_weights(*lags_to_test)
+
+
+def ichimoku_series(high, low, close,
+                    kijun_lookback = 26,
+                    tenkan_lookback = 9,
+                    chikou_lookback = 26,
+                    senkou_span_b_lookback = 52) -> dict:
+    """
+    returns a dictionary with the same keys as Ichimoku.add, each holding the full series
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    size = len(close)
+
+    tenkan_sen = (rolling_max_series(high, tenkan_lookback) + rolling_min_series(low, tenkan_lookback)) / 2
+    kijun_sen = (rolling_max_series(high, kijun_lookback) + rolling_min_series(low, kijun_lookback)) / 2
+    senko_a = (tenkan_sen + kijun_sen) / 2
+    senko_b = (rolling_max_series(high, senkou_span_b_lookback) + rolling_min_series(low, senkou_span_b_lookback)) / 2
+
+    # Ichimoku.add starts returning values once the senko a history exceeds kijun + senko b lookback
+    first_senko_a = max(tenkan_lookback, kijun_lookback) - 1
+    first = first_senko_a + kijun_lookback + senkou_span_b_lookback
+
+    ikh = {key: np.full(size, np.nan) for key in (
+        "tenkan_sen", "kijun_sen",
+        "senko_span_1_current", "senko_span_2_current",
+        "close_at_chikou", "chikou_span_1", "chikou_span_2",
+        "senko_span_1_future", "senko_span_2_future",
+    )}
+
+    if size > first:
+        positions = np.arange(first, size)
+        ikh["tenkan_sen"][first:] = tenkan_sen[first:]
+        ikh["kijun_sen"][first:] = kijun_sen[first:]
+        ikh["senko_span_1_current"][first:] = senko_a[positions - kijun_lookback]
+        ikh["senko_span_2_current"][first:] = senko_b[positions - kijun_lookback]
+        ikh["close_at_chikou"][first:] = close[positions - chikou_lookback + 1]
+        chikou_positions = np.maximum(positions - chikou_lookback + 1, first)
+        ikh["chikou_span_1"][first:] = ikh["senko_span_1_current"][chikou_positions]
+        ikh["chikou_span_2"][first:] = ikh["senko_span_2_current"][chikou_positions]
+        ikh["senko_span_1_future"][first:] = senko_a[first:]
+        ikh["senko_span_2_future"][first:] = senko_b[first:]
+
+    return ikh
+
+
+def load_history_matrix(securities: list, length: int = 200, since: Optional[date] = None) -> dict:
+    """
+    loads the latest length daily bars of all securities with a single query
+
+    each row of the date, close, high and low arrays holds the history of one security in ascending
+    order, right aligned so that the last column is the latest bar; missing bars are NaN (NaT);
+    since limits the bars to be numbered by the database, which is the expensive part
+    """
+    matrix = {
+        "securities": securities,
+        "length": np.zeros(len(securities), dtype=int),
+        "date": np.full((len(securities), length), np.datetime64("NaT"), dtype="datetime64[D]"),
+        "close": np.full((len(securities), length), np.nan),
+        "high": np.full((len(securities), length), np.nan),
+        "low": np.full((len(securities), length), np.nan),
+    }
+
+    frames = HistoryFrame.load_many(securities, limit=length, since=since)
+    for row, security in enumerate(securities):
+        frame = frames[security.pk]
+        size = len(frame)
+        if size > 0:
+            matrix["length"][row] = size
+            matrix["date"][row, length - size:] = frame.date
+            matrix["close"][row, length - size:] = frame.close
+            matrix["high"][row, length - size:] = frame.high
+            matrix["low"][row, length - size:] = frame.low
+
+    return matrix
+
+
+def _rolling_midpoint_matrix(high: np.ndarray, low: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    (highest high + lowest low) / 2 for each row, windows with missing bars are NaN
+    """
+    midpoint = np.full(high.shape, np.nan)
+    midpoint[:, lookback - 1:] = (
+        sliding_window_view(high, lookback, axis=1).max(axis=2) + sliding_window_view(low, lookback, axis=1).min(axis=2)
+    ) / 2
+    return midpoint
+
+
+def evaluate_ikh_matrix(matrix: dict,
+                        kijun_lookback = 26,
+                        tenkan_lookback = 9,
+                        chikou_lookback = 26,
+                        senkou_span_b_lookback = 52) -> np.ndarray:
+    """
+    evaluate_ikh of the latest bar for each row of a history matrix, NaN where the history is too
+    short for the Ichimoku
+    """
+    close, high, low, length = matrix["close"], matrix["high"], matrix["low"], matrix["length"]
+    columns = close.shape[1]
+    latest = columns - 1
+    result = np.full(len(close), np.nan)
+    # Ichimoku.add starts returning values once the senko a history exceeds kijun + senko b lookback
+    first = max(tenkan_lookback, kijun_lookback) - 1 + kijun_lookback + senkou_span_b_lookback
+    valid = length > first
+    if columns <= first or not valid.any():
+        return result
+
+    close, high, low = close[valid], high[valid], low[valid]
+    rows = np.arange(len(close))
+
+    tenkan_sen = _rolling_midpoint_matrix(high, low, tenkan_lookback)
+    kijun_sen = _rolling_midpoint_matrix(high, low, kijun_lookback)
+    senko_a = (tenkan_sen + kijun_sen) / 2
+    senko_b = _rolling_midpoint_matrix(high, low, senkou_span_b_lookback)
+
+    # the chikou spans are the cloud at the chikou position, at most the first position with values
+    first_positions = columns - length[valid] + first
+    chikou_positions = np.maximum(latest - chikou_lookback + 1, first_positions)
+
+    current = close[:, latest]
+    tenkan, kijun = tenkan_sen[:, latest], kijun_sen[:, latest]
+    span_1, span_2 = senko_a[:, latest - kijun_lookback], senko_b[:, latest - kijun_lookback]
+    close_at_chikou = close[:, latest - chikou_lookback + 1]
+    chikou_span_1 = senko_a[rows, chikou_positions - kijun_lookback]
+    chikou_span_2 = senko_b[rows, chikou_positions - kijun_lookback]
+
+    result[valid] = _evaluate_ikh_arrays(
+        current, tenkan, kijun, span_1, span_2, close_at_chikou, chikou_span_1, chikou_span_2
+    )
+    return result
+
+
+def _evaluate_ikh_arrays(current, tenkan, kijun, span_1, span_2, close_at_chikou, chikou_span_1, chikou_span_2) -> np.ndarray:
+    """
+    same rules as evaluate_ikh, element wise
+    """
+    evaluation = np.zeros(len(current))
+    evaluation += (current > span_1) & (current > span_2)
+    evaluation -= (current < span_1) & (current < span_2)
+    evaluation += np.where(span_1 >= span_2, 1, -1)
+    evaluation += np.where(current > kijun, 1, -1)
+    evaluation += np.where(tenkan > kijun, 1, -1)
+    above, below = current > close_at_chikou, current < close_at_chikou
+    evaluation += above * (1 + ((current > chikou_span_1) & (current > chikou_span_2)))
+    evaluation -= below * (1 + ((current < chikou_span_1) & (current < chikou_span_2)))
+    return evaluation
+
+
+def evaluate_ikh_series(close, high, low, bars: int = 200,
+                        kijun_lookback = 26,
+                        tenkan_lookback = 9,
+                        chikou_lookback = 26,
+                        senkou_span_b_lookback = 52) -> np.ndarray:
+    """
+    evaluate_ikh_matrix of the latest bars bars ending at each bar of the series, without building
+    the windows: the cloud lines of a window are the lines of the complete series, only the first
+    valid position depends on the window
+    """
+    close = np.asarray(close, dtype=float)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    size = len(close)
+    result = np.full(size, np.nan)
+    first = max(tenkan_lookback, kijun_lookback) - 1 + kijun_lookback + senkou_span_b_lookback
+    if size <= first or bars <= first:
+        return result
+
+    tenkan_sen = (rolling_max_series(high, tenkan_lookback) + rolling_min_series(low, tenkan_lookback)) / 2
+    kijun_sen = (rolling_max_series(high, kijun_lookback) + rolling_min_series(low, kijun_lookback)) / 2
+    senko_a = (tenkan_sen + kijun_sen) / 2
+    senko_b = (rolling_max_series(high, senkou_span_b_lookback) + rolling_min_series(low, senkou_span_b_lookback)) / 2
+
+    # the bars with a window holding more than first bars
+    latest = np.arange(first, size)
+    window_start = np.maximum(latest - bars + 1, 0)
+    chikou_positions = np.maximum(latest - chikou_lookback + 1, window_start + first)
+
+    result[first:] = _evaluate_ikh_arrays(
+        close[latest],
+        tenkan_sen[latest],
+        kijun_sen[latest],
+        senko_a[latest - kijun_lookback],
+        senko_b[latest - kijun_lookback],
+        close[latest - chikou_lookback + 1],
+        senko_a[chikou_positions - kijun_lookback],
+        senko_b[chikou_positions - kijun_lookback],
+    )
+    return result
+
+
+from data.history_dao import History_DAO_Factory
+from data.helper import humanize_price
+
+def _lookup_pe_forward(security: Security) -> float:
+    """
+    forward pe of a yahoo security
+    """
+    dao = History_DAO_Factory().get_online_dao(security.data_provider)
+    try:
+        return dao.lookup_summary_detail(security)["forwardPE"]["raw"]
+    except KeyError:
+        return float("nan")
+
+
+def _watchlist_indicators(matrix: dict) -> dict:
+    """
+    sma(50) delta, its sigma delta, hurst and the ichimoku evaluation of the latest bar per row of the
+    history matrix, NaN if there are not more than 50 bars
+    """
+    close, length = matrix["close"], matrix["length"]
+    window = close[:, -50:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sma = window.mean(axis=1)
+        indicators = {
+            "sd": (close[:, -1] - sma) / window.std(axis=1, ddof=1),
+            "delta": 100 * (close[:, -1] - sma) / sma,
+            "hurst": _hurst_of_windows(window),
+            "ikh_evaluation": evaluate_ikh_matrix(matrix),
+        }
+    for values in indicators.values():
+        values[length <= 50] = np.nan
+    return indicators
+
+
+def _watchlist_since(securities: list) -> Optional[date]:
+    """
+    the date to limit the bars to be numbered by the database to, relative to the latest stored bar
+    of each security: 200 bars are less than 300 calendar days, hence 600 days before the oldest
+    latest bar keeps the latest 200 bars of all securities, outdated ones included
+    """
+    latest = Daily.objects.filter(security__in=securities).values("security").annotate(latest=Max("date"))
+    dates = [entry["latest"] for entry in latest]
+    if len(dates) == 0:
+        return None
+    return min(dates) - timedelta(days=600)
+
+
+def hl_watchlist_batch(securities: list) -> list:
+    """
+    builds the watchlist entries for all securities at once, the indicators are read from the
+    DailyIndicators of the latest bar; if they are not available, they are calculated on the
+    securities x bars matrix of the latest 200 daily bars
+    """
+    since = _watchlist_since(securities)
+    matrix = load_history_matrix(securities, 2, since=since)
+    close, length = matrix["close"], matrix["length"]
+
+    indicators = {name: np.full(len(securities), np.nan) for name in ("sd", "delta", "hurst", "ikh_evaluation")}
+    stored = DailyIndicators.latest(securities)
+    missing = list()
+    for row, security in enumerate(securities):
+        entry = stored.get(security.pk)
+        if length[row] == 0:
+            continue
+        if entry is None or entry["date"] != matrix["date"][row, -1].astype(object):
+            missing.append(row)
+        elif entry["sma50"] is not None:
+            indicators["sd"][row] = entry["sigma_delta50"]
+            indicators["delta"][row] = 100 * (close[row, -1] - entry["sma50"]) / entry["sma50"]
+            indicators["hurst"][row] = entry["hurst50"]
+            if entry["ikh_evaluation"] is not None:
+                indicators["ikh_evaluation"][row] = entry["ikh_evaluation"]
+
+    if len(missing) > 0:
+        calculated = _watchlist_indicators(load_history_matrix([securities[row] for row in missing], 200, since=since))
+        for name, values in calculated.items():
+            indicators[name][missing] = values
+
+    # the prices of all yahoo securities up front, the online lookups are I/O bound, hence threads
+    # instead of processes
+    yahoo = [security for security in securities if security.data_provider.name == "Yahoo"]
+    quotes = dict()
+    if len(yahoo) > 0:
+        prices = History_DAO_Factory().get_online_dao(yahoo[0].data_provider).lookupPrices(
+            [security.symbol for security in yahoo]
+        )
+        with ThreadPool(min(len(yahoo), 8)) as pool:
+            pe_forward = pool.map(_lookup_pe_forward, yahoo)
+        quotes = {
+            security.pk: (humanize_price(prices[security.symbol]), pe)
+            for security, pe in zip(yahoo, pe_forward)
+        }
+
+    watchlist_entries = list()
+    for row, security in enumerate(securities):
+        watchlist_entry = dict()
+        watchlist_entry["security"] = security
+
+        if security.pk in quotes:
+            watchlist_entry["price"], watchlist_entry["pe_forward"] = quotes[security.pk]
+        elif length[row] > 1:
+            latest, previous = close[row, -1], close[row, -2]
+            latest_date = matrix["date"][row, -1].astype(object)
+
+            price = dict()
+            price["change_percent"] = float(100 * (latest - previous) / previous)
+            price["price"] = float(latest)
+            price["change"] = float(latest - previous)
+            price["timestamp"] = latest_date
+            price["local_timestamp"] = datetime.combine(latest_date, datetime.min.time())
+            watchlist_entry["price"] = price
+
+        watchlist_entry["ikh_evaluation"] = float(indicators["ikh_evaluation"][row])
         watchlist_entry["sma"] = {
-            "hurst": sma.hurst(), 
-            "sd": sma.sigma_delta(),
-            "delta": 100 * (close - sma.current_value()) / sma.current_value()
-            }   
-    else:
-        watchlist_entry["ikh_evaluation"] = float("nan")
-        watchlist_entry["sma"] = {"hurst": float("nan"), "sd": float("nan"), "delta": float("nan")}
-    
-    return watchlist_entry
+            "hurst": float(indicators["hurst"][row]),
+            "sd": float(indicators["sd"][row]),
+            "delta": float(indicators["delta"][row]),
+        }
+
+        watchlist_entries.append(watchlist_entry)
+
+    return watchlist_entries
 
+
+def hl_watchlist(security:Security) -> dict:
+    return hl_watchlist_batch([security])[0]
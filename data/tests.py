@@ -1,10 +1,62 @@
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.db import connections
+from django.db.utils import load_backend
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.messages import get_messages
 from django.urls import reverse
 
-from data.models import User, Watchlist, Security, DataProvider, Daily
-from data.history_dao import History_DAO_Factory, Interval, ComWycaDAO
-from data.technical_analysis import SMA
+from data.models import User, Watchlist, Security, DataProvider, Daily, Weekly, DailyUpdate, DailyIndicators, HistoryFrame
+from data.history_dao import History_DAO_Factory, Interval, ComWycaDAO, YahooDAO
+from data import history_cache
+from data.lookup_cache import LookupCache
+from data.single_flight import SingleFlight
+from data import rate_limit
+from data.rate_limit import TokenBucket
+from data.history_helper import refresh_provider, update_history
+from data.routers import HistoryWriterRouter
+from data.indicator_helper import update_indicators
+from data.ikh import ichimoku
+from data.technical_analysis import (
+    SMA,
+    EMA,
+    MACD,
+    RSI,
+    Momentum,
+    Ichimoku,
+    BollingerBands,
+    RollingExtremum,
+    IndicatorPipeline,
+    sma_series,
+    ema_series,
+    sigma_delta_series,
+    bollinger_series,
+    macd_series,
+    rsi_series,
+    momentum_series,
+    ichimoku_series,
+    hurst_series,
+    evaluate_ikh,
+    load_history_matrix,
+    sma_latest,
+    hl_watchlist_batch,
+)
+
+from collections import deque
+from statistics import mean, stdev
+from time import perf_counter, sleep
+import tracemalloc
+
+import datetime
+import decimal
+import io
+import json
+import pathlib
+import tempfile
+import threading
+from unittest import mock
+import numpy as np
+import pymongo
 
 """
 Note, due to limitations on the API keys, we have disabled the Polygon and Tiingo tests
@@ -27,6 +79,1274 @@ class TechnicalAnalysis(TestCase):
             sma_value = sma.add(i)
             print(f"min: {sma.getMin()} max: {sma.getMax()}")
 
+    def test_sma_benchmark(self) -> None:
+        """
+        compares the running sum SMA against the former statistics.mean implementation on 5k bars
+        """
+        closes = list(100 + np.cumsum(np.random.default_rng(42).normal(0, 1, 5000)))
+
+        start = perf_counter()
+        queue = deque(maxlen=50)
+        reference = list()
+        for close in closes:
+            queue.appendleft(close)
+            reference.append(mean(queue))
+        mean_runtime = perf_counter() - start
+
+        start = perf_counter()
+        sma = SMA(50)
+        result = [sma.add(close) for close in closes]
+        sma_runtime = perf_counter() - start
+
+        print(f"sma(50) on 5k bars, statistics.mean: {mean_runtime:.4f}s running sum: {sma_runtime:.4f}s")
+        for expected, actual in zip(reference, result):
+            self.assertAlmostEqual(expected, actual, places=9)
+        self.assertLess(sma_runtime, mean_runtime)
+
+    def test_rolling_stdev(self) -> None:
+        """
+        the rolling variance has to match statistics.stdev within a relative tolerance of 1e-9
+        """
+        closes = list(100 + np.cumsum(np.random.default_rng(7).normal(0, 1, 5000)))
+
+        queue = deque(maxlen=20)
+        sma = SMA(20)
+        bb = BollingerBands(20, 2)
+        for close in closes:
+            queue.appendleft(close)
+            sma.add(close)
+            bollinger = bb.add(close)
+            if len(queue) == 20:
+                expected_stdev = stdev(queue)
+                expected_mean = mean(queue)
+                self.assertTrue(np.isclose(sma.stdev(), expected_stdev, rtol=1e-9, atol=0))
+                self.assertTrue(np.isclose(sma.sigma_delta(), (close - expected_mean) / expected_stdev, rtol=1e-9))
+                self.assertTrue(np.isclose(bollinger[1], expected_mean + 2 * expected_stdev, rtol=1e-9))
+            else:
+                self.assertIsNone(sma.stdev())
+                self.assertIsNone(bollinger)
+
+    def test_rsi_without_losses(self) -> None:
+        """
+        the rolling mean of a window full of zeros is not exactly zero, hence the RSI of a window
+        without losses is based on the non zero losses within it
+        """
+        rsi = RSI(14)
+        values = [rsi.add(close) for close in [100.3, 99.1, 101.7, 98.9, 100.2] + [100.2 + 0.1 * i for i in range(1, 41)]]
+        self.assertIsNotNone(values[5])
+        self.assertEqual(values[-26:], [None] * 26)
+
+    def test_rolling_extremum(self) -> None:
+        values = list(np.random.default_rng(3).normal(0, 1, 1000))
+
+        queue = deque(maxlen=26)
+        rolling_max = RollingExtremum(26, maximum=True)
+        rolling_min = RollingExtremum(26, maximum=False)
+        for value in values:
+            queue.append(value)
+            self.assertEqual(rolling_max.add(value), max(queue))
+            self.assertEqual(rolling_min.add(value), min(queue))
+            self.assertEqual(rolling_max.getN(), len(queue))
+
+    def test_hurst_series(self) -> None:
+        """
+        the rolling hurst has to match a polyfit over the lagged standard deviations of each window
+        """
+        closes = 100 + np.cumsum(np.random.default_rng(5).normal(0, 1, 400))
+        lags = np.arange(2, 20)
+
+        hurst_values = hurst_series(closes, 50)
+        self.assertTrue(np.isnan(hurst_values[:49]).all())
+        for end in range(50, 401):
+            window = closes[end - 50:end]
+            tau = [np.std(window[lag:] - window[:-lag]) for lag in lags]
+            expected = np.polyfit(np.log10(lags), np.log10(tau), 1)[0]
+            self.assertAlmostEqual(hurst_values[end - 1], expected, places=9)
+
+        sma = SMA(50)
+        for close in closes:
+            sma.add(close)
+        self.assertAlmostEqual(sma.hurst(), hurst_values[-1], places=9)
+
+    def test_indicator_pipeline(self) -> None:
+        """
+        shared states must not change the outputs compared to separate instances
+        """
+        rng = np.random.default_rng(13)
+        close = 100 + np.cumsum(rng.normal(0, 1, 500))
+        high = close + rng.random(500)
+        low = close - rng.random(500)
+
+        pipeline = IndicatorPipeline()
+        pipeline.sma("sma20", 20)
+        pipeline.bollinger("bb", 20)
+        pipeline.ema("ema12", 12)
+        pipeline.ema("ema26", 26)
+        pipeline.macd("macd")
+        pipeline.rsi("rsi")
+        pipeline.ichimoku("ikh")
+        # sma20, bb, ema12, ema26, macd, rsi and ichimoku
+        self.assertEqual(len(pipeline), 7)
+
+        sma, bb, ema12, ema26, macd, rsi, ikh = SMA(20), BollingerBands(20), EMA(12), EMA(26), MACD(), RSI(), Ichimoku()
+        for h, l, c in zip(high, low, close):
+            values = pipeline.add(c, high=h, low=l)
+            self.assertEqual(values["sma20"], sma.add(c))
+            self.assertEqual(values["bb"], bb.add(c))
+            self.assertEqual(values["ema12"], ema12.add(c))
+            self.assertEqual(values["ema26"], ema26.add(c))
+            self.assertEqual(values["macd"], macd.add(c))
+            self.assertEqual(values["rsi"], rsi.add(c))
+            self.assertEqual(values["ikh"], ikh.add(h, l, c))
+        self.assertEqual(pipeline.indicator("sma20").sigma_delta(), sma.sigma_delta())
+
+    def test_indicator_run_benchmark(self) -> None:
+        """
+        compares feeding 5k bars bar by bar via add, keeping the returned values, against run writing
+        into preallocated buffers: both have to give the same values, run allocating less
+        """
+        rng = np.random.default_rng(23)
+        close = 100 + np.cumsum(rng.normal(0, 1, 5000))
+        high = close + rng.random(5000)
+        low = close - rng.random(5000)
+
+        def declare() -> IndicatorPipeline:
+            pipeline = IndicatorPipeline()
+            pipeline.sma("sma50", 50)
+            pipeline.ema("ema20", 20)
+            pipeline.bollinger("bb")
+            pipeline.macd("macd")
+            pipeline.rsi("rsi")
+            pipeline.ichimoku("ikh")
+            return pipeline
+
+        # the indicators do not have an instance dictionary anymore
+        self.assertFalse(hasattr(SMA(5), "__dict__"))
+        self.assertFalse(hasattr(declare().indicator("ikh"), "__dict__"))
+
+        def add(pipeline: IndicatorPipeline) -> list:
+            return [pipeline.add(c, high=h, low=l) for c, h, l in zip(close.tolist(), high.tolist(), low.tolist())]
+
+        def run(pipeline: IndicatorPipeline) -> dict:
+            return pipeline.run(close, high=high, low=low)
+
+        def measure(feed) -> tuple:
+            """
+            runtime and peak of the allocated memory, tracing separately as it slows down the run
+            """
+            start = perf_counter()
+            feed(declare())
+            runtime = perf_counter() - start
+            tracemalloc.start()
+            feed(declare())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return runtime, peak
+
+        add_runtime, add_peak = measure(add)
+        run_runtime, run_peak = measure(run)
+
+        streamed = add(declare())
+        pipeline = declare()
+        buffers = run(pipeline)
+
+        print(
+            f"pipeline per bar, add: {1e6 * add_runtime / 5000:.1f}µs {add_peak / 1024:.0f}KiB peak, "
+            f"run: {1e6 * run_runtime / 5000:.1f}µs {run_peak / 1024:.0f}KiB peak"
+        )
+        self.assertSeriesEqual([values["sma50"] for values in streamed], buffers["sma50"])
+        self.assertSeriesEqual([values["ema20"] for values in streamed], buffers["ema20"])
+        self.assertSeriesEqual([values["rsi"] for values in streamed], buffers["rsi"])
+        for column in range(2):
+            self.assertSeriesEqual([values["bb"] and values["bb"][column] for values in streamed], buffers["bb"][:, column])
+        for column in range(3):
+            self.assertSeriesEqual([values["macd"] and values["macd"][column] for values in streamed], buffers["macd"][:, column])
+        for column, field in enumerate(Ichimoku.fields):
+            self.assertSeriesEqual([values["ikh"] and values["ikh"][field] for values in streamed], buffers["ikh"][:, column])
+        self.assertEqual(pipeline.current_value(), streamed[-1])
+        self.assertLess(run_peak, add_peak)
+
+    def test_indicator_state(self) -> None:
+        """
+        a pipeline restored from a serialised state has to continue exactly like the original one
+        """
+        rng = np.random.default_rng(17)
+        close = 100 + np.cumsum(rng.normal(0, 1, 600))
+        high = close + rng.random(600)
+        low = close - rng.random(600)
+
+        def declare() -> IndicatorPipeline:
+            pipeline = IndicatorPipeline()
+            pipeline.sma("sma50", 50)
+            pipeline.ema("ema20", 20)
+            pipeline.bollinger("bb")
+            pipeline.macd("macd")
+            pipeline.rsi("rsi")
+            pipeline.ichimoku("ikh")
+            return pipeline
+
+        original = declare()
+        for h, l, c in zip(high[:400], low[:400], close[:400]):
+            original.add(float(c), high=float(h), low=float(l))
+
+        restored = declare()
+        restored.set_state(json.loads(json.dumps(original.get_state())))
+        for h, l, c in zip(high[400:], low[400:], close[400:]):
+            expected = original.add(float(c), high=float(h), low=float(l))
+            self.assertEqual(restored.add(float(c), high=float(h), low=float(l)), expected)
+
+        other = IndicatorPipeline()
+        other.sma("sma50", 50)
+        with self.assertRaises(ValueError):
+            other.set_state(original.get_state())
+
+    def assertSeriesEqual(self, streamed: list, series: np.ndarray) -> None:
+        """
+        None in the streamed values has to be NaN in the series, all other values have to match
+        """
+        self.assertEqual(len(streamed), len(series))
+        for expected, actual in zip(streamed, series):
+            if expected is None:
+                self.assertTrue(np.isnan(actual))
+            else:
+                self.assertTrue(np.isclose(expected, actual, rtol=1e-9, atol=1e-12))
+
+    def test_vectorized_series(self) -> None:
+        """
+        the vectorized series have to match the streaming classes bar for bar
+        """
+        rng = np.random.default_rng(11)
+        close = 100 + np.cumsum(rng.normal(0, 1, 1000))
+        high = close + rng.random(1000)
+        low = close - rng.random(1000)
+
+        sma, sd = SMA(50), SMA(50)
+        self.assertSeriesEqual([sma.add(c) for c in close], sma_series(close, 50))
+        self.assertSeriesEqual([sd.add(c) and sd.sigma_delta() for c in close], sigma_delta_series(close, 50))
+
+        ema = EMA(20)
+        self.assertSeriesEqual([ema.add(c) for c in close], ema_series(close, 20))
+
+        bb = BollingerBands()
+        streamed = [bb.add(c) for c in close]
+        lower, upper = bollinger_series(close)
+        self.assertSeriesEqual([b and b[0] for b in streamed], lower)
+        self.assertSeriesEqual([b and b[1] for b in streamed], upper)
+
+        macd = MACD()
+        streamed = [macd.add(c) for c in close]
+        for position, series in enumerate(macd_series(close)):
+            self.assertSeriesEqual([m and m[position] for m in streamed], series)
+
+        rsi = RSI()
+        self.assertSeriesEqual([rsi.add(c) for c in close], rsi_series(close))
+
+        momentum = Momentum()
+        self.assertSeriesEqual([momentum.add(c) for c in close], momentum_series(close))
+
+        ichimoku = Ichimoku()
+        streamed = [ichimoku.add(h, l, c) for h, l, c in zip(high, low, close)]
+        series = ichimoku_series(high, low, close)
+        for key in series:
+            self.assertSeriesEqual([i and i[key] for i in streamed], series[key])
+
+    def test_ikh(self) -> None:
+        """
+        the projected lines have to match the streaming Ichimoku once it is warm
+        """
+        rng = np.random.default_rng(11)
+        close = 100 + np.cumsum(rng.normal(0, 1, 400))
+        high = close + rng.random(400)
+        low = close - rng.random(400)
+
+        ikh = ichimoku(high, low, close)
+        for key in ikh:
+            self.assertEqual(len(ikh[key]), 400 + 26)
+        self.assertTrue(np.isnan(ikh["tenkan_sen"][400:]).all())
+        self.assertFalse(np.isnan(ikh["senkou_span_b"][400:]).any())
+        self.assertTrue(np.isnan(ikh["chikou_span"][400 - 26:]).all())
+
+        streaming = Ichimoku()
+        for position, (h, l, c) in enumerate(zip(high, low, close)):
+            expected = streaming.add(h, l, c)
+            if expected is None:
+                continue
+            self.assertEqual(ikh["tenkan_sen"][position], expected["tenkan_sen"])
+            self.assertEqual(ikh["kijun_sen"][position], expected["kijun_sen"])
+            self.assertEqual(ikh["senkou_span_a"][position], expected["senko_span_1_current"])
+            self.assertEqual(ikh["senkou_span_b"][position], expected["senko_span_2_current"])
+            self.assertEqual(ikh["senkou_span_a"][position + 26], expected["senko_span_1_future"])
+            self.assertEqual(ikh["senkou_span_b"][position + 26], expected["senko_span_2_future"])
+            # the streaming chikou counts the current bar, hence one bar less shifted
+            self.assertEqual(ikh["chikou_span"][position - 2 * 26 + 1], expected["close_at_chikou"])
+
+    def test_hl_watchlist_batch(self) -> None:
+        """
+        the indicators of the securities x bars matrix have to match the streaming indicators
+        """
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        rng = np.random.default_rng(5)
+        histories = dict()
+        for symbol, size in (("A", 300), ("B", 120), ("C", 70), ("D", 30)):
+            security = Security.objects.create(symbol=symbol, name=symbol, data_provider=tiingo)
+            close = np.round(100 + np.cumsum(rng.normal(0, 1, size)), 6)
+            high, low = close + 1, close - 1
+            Daily.objects.bulk_create([
+                Daily(security=security, date=datetime.date.today() - datetime.timedelta(days=size - i),
+                      open_price=close[i], high_price=high[i], low=low[i], close=close[i], adj_close=close[i], volume=100)
+                for i in range(size)
+            ])
+            histories[security] = (close[-200:], high[-200:], low[-200:])
+
+        securities = list(histories)
+        with self.assertNumQueries(1):
+            matrix = load_history_matrix(securities, 200)
+        self.assertEqual(list(matrix["length"]), [200, 120, 70, 30])
+
+        for security, entry in zip(securities, hl_watchlist_batch(securities)):
+            close, high, low = histories[security]
+            self.assertEqual(entry["security"], security)
+            self.assertAlmostEqual(entry["price"]["price"], close[-1])
+
+            pipeline = IndicatorPipeline()
+            ikh = pipeline.ichimoku("ikh")
+            sma = pipeline.sma("sma", 50)
+            for c, h, l in zip(close, high, low):
+                pipeline.add(close=c, high=h, low=l)
+
+            if len(close) <= 50:
+                self.assertTrue(np.isnan(entry["sma"]["delta"]))
+                continue
+            self.assertAlmostEqual(entry["sma"]["delta"], 100 * (close[-1] - sma.current_value()) / sma.current_value())
+            self.assertAlmostEqual(entry["sma"]["sd"], sma.sigma_delta())
+            self.assertAlmostEqual(entry["sma"]["hurst"], sma.hurst())
+            if ikh.current_value() is None:
+                self.assertTrue(np.isnan(entry["ikh_evaluation"]))
+            else:
+                self.assertEqual(entry["ikh_evaluation"], evaluate_ikh(close[-1], ikh.current_value()))
+
+    def test_hl_watchlist_batch_outdated(self) -> None:
+        """
+        a security not updated for years still shows the indicators of its latest bars
+        """
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        close = np.round(100 + np.cumsum(np.random.default_rng(6).normal(0, 1, 120)), 6)
+        latest = datetime.date.today() - datetime.timedelta(days=3 * 365)
+        securities = list()
+        for symbol, last in (("CURRENT", datetime.date.today()), ("OUTDATED", latest)):
+            security = Security.objects.create(symbol=symbol, name=symbol, data_provider=tiingo)
+            Daily.objects.bulk_create([
+                Daily(security=security, date=last - datetime.timedelta(days=len(close) - i),
+                      open_price=close[i], high_price=close[i] + 1, low=close[i] - 1, close=close[i], adj_close=close[i], volume=100)
+                for i in range(len(close))
+            ])
+            securities.append(security)
+
+        current, outdated = hl_watchlist_batch(securities)
+        self.assertEqual(outdated["price"]["price"], close[-1])
+        for name in ("delta", "sd", "hurst"):
+            self.assertFalse(np.isnan(outdated["sma"][name]))
+            self.assertAlmostEqual(outdated["sma"][name], current["sma"][name])
+
+
+class HistoryFrameLoader(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        close = np.round(100 + np.cumsum(np.random.default_rng(3).normal(0, 1, 2000)), 6)
+        Daily.objects.bulk_create([
+            Daily(security=self.security, date=datetime.date(2015, 1, 1) + datetime.timedelta(days=i),
+                  open_price=close[i] - 0.5, high_price=close[i] + 1, low=close[i] - 1, close=close[i],
+                  adj_close=close[i], volume=1000 + i)
+            for i in range(2000)
+        ])
+        return super().setUp()
+
+    def test_load(self) -> None:
+        """
+        the columns have to hold the same values as the models, ascending by date
+        """
+        start = perf_counter()
+        models = list(reversed(self.security.daily_data.all()[:1000]))
+        closes = [float(entry.close) for entry in models]
+        models_runtime = perf_counter() - start
+
+        start = perf_counter()
+        frame = HistoryFrame.load(self.security, "d", limit=1000)
+        frame_runtime = perf_counter() - start
+        print(f"1000 daily bars, models: {models_runtime:.4f}s frame: {frame_runtime:.4f}s")
+
+        self.assertEqual(len(frame), 1000)
+        self.assertEqual(frame.times(), [str(entry.date) for entry in models])
+        self.assertEqual(frame.close.tolist(), closes)
+        self.assertEqual(frame.open.tolist(), [float(entry.open_price) for entry in models])
+        self.assertEqual(frame.high.tolist(), [float(entry.high_price) for entry in models])
+        self.assertEqual(frame.low.tolist(), [float(entry.low) for entry in models])
+        self.assertEqual(frame.volume.tolist(), [entry.volume for entry in models])
+        self.assertTrue(np.all(np.diff(frame.date) > np.timedelta64(0, "D")))
+
+    def test_range(self) -> None:
+        frame = HistoryFrame.load(self.security, "d", start=datetime.date(2015, 1, 10), end=datetime.date(2015, 1, 19))
+        self.assertEqual(frame.times()[0], "2015-01-10")
+        self.assertEqual(frame.times()[-1], "2015-01-19")
+        self.assertEqual(len(frame), 10)
+
+        frame = HistoryFrame.load(self.security, "d", end=datetime.date(2015, 1, 19), limit=5)
+        self.assertEqual(frame.times(), ["2015-01-15", "2015-01-16", "2015-01-17", "2015-01-18", "2015-01-19"])
+
+        # there is no weekly history
+        self.assertEqual(len(HistoryFrame.load(self.security, "w")), 0)
+        with self.assertRaises(ValueError):
+            HistoryFrame.load(self.security, "x")
+
+    def test_load_many(self) -> None:
+        """
+        the history of all securities is loaded with one query, as the single loads return it
+        """
+        provider = self.security.data_provider
+        short = Security.objects.create(symbol="MSFT", name="Microsoft", data_provider=provider)
+        Daily.objects.bulk_create([
+            Daily(security=short, date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i), open_price=i,
+                  high_price=i, low=i, close=i, adj_close=i, volume=i)
+            for i in range(30)
+        ])
+        empty = Security.objects.create(symbol="IBM", name="IBM", data_provider=provider)
+
+        securities = [self.security, short, empty]
+        for arguments in [{"limit": 50}, {"limit": 50, "since": datetime.date(2020, 1, 10)}, {}]:
+            with self.assertNumQueries(1):
+                frames = HistoryFrame.load_many(securities, **arguments)
+            self.assertEqual(list(frames.keys()), [security.pk for security in securities])
+            for security in securities:
+                start = arguments.get("since")
+                frame = HistoryFrame.load(security, start=start, limit=arguments.get("limit"))
+                for name in ["date", "open", "high", "low", "close", "adj_close", "volume"]:
+                    np.testing.assert_array_equal(getattr(frames[security.pk], name), getattr(frame, name))
+
+        self.assertEqual(len(HistoryFrame.load_many([short.pk], limit=10)[short.pk]), 10)
+        self.assertEqual(HistoryFrame.load_many([]), {})
+
+    def test_sma_latest(self) -> None:
+        frame = HistoryFrame.load(self.security, limit=55)
+        latest = sma_latest(frame.close, 50)
+        expected = SMA(50).latest(self.security.daily_data.all()[:55])
+        for key in expected:
+            self.assertAlmostEqual(latest[key], expected[key])
+        with self.assertRaises(ValueError):
+            sma_latest(frame.close[:50], 50)
+
+
+class HistoryMerge(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        return super().setUp()
+
+    def bars(self, closes: dict) -> list:
+        return [
+            Daily(date=datetime.date(2020, 1, day), open_price=close, high_price=close, low=close,
+                  close=close, adj_close=close, volume=100)
+            for day, close in closes.items()
+        ]
+
+    def test_merge(self) -> None:
+        counts = Daily.merge(self.security, self.bars({day: 100.0 + day for day in range(1, 11)}))
+        self.assertEqual(counts, {"inserted": 10, "updated": 0, "unchanged": 0, "deleted": 0})
+
+        # the same bars, as provided by a csv based dao
+        counts = Daily.merge(self.security, self.bars({day: decimal.Decimal(f"{100 + day}.000000") for day in range(1, 11)}))
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "unchanged": 10, "deleted": 0})
+
+        closes = {day: 100.0 + day for day in range(1, 14)}
+        closes[9] = closes[10] = 50.123456
+        counts = Daily.merge(self.security, self.bars(closes))
+        self.assertEqual(counts, {"inserted": 3, "updated": 2, "unchanged": 8, "deleted": 0})
+        self.assertEqual(
+            [float(close) for close in self.security.daily_data.order_by("date").values_list("close", flat=True)],
+            list(closes.values()),
+        )
+
+        counts = Daily.merge(self.security, self.bars({day: closes[day] for day in range(5, 14)}), prune=True)
+        self.assertEqual(counts, {"inserted": 0, "updated": 0, "unchanged": 9, "deleted": 4})
+        self.assertEqual(self.security.daily_data.count(), 9)
+
+    def test_prices(self) -> None:
+        # Decimal prices of older callers and index volumes beyond 32 bit
+        Daily.objects.create(security=self.security, date=datetime.date(2020, 1, 2), open_price=decimal.Decimal("10.5"),
+                             high_price="11.25", low=10, close=decimal.Decimal("11.123456"), adj_close=11.123456,
+                             volume=6_000_000_000)
+        bar = Daily.objects.get(security=self.security)
+        self.assertEqual((bar.open_price, bar.high_price, bar.low, bar.close), (10.5, 11.25, 10.0, 11.123456))
+        self.assertEqual(bar.volume, 6_000_000_000)
+        self.assertEqual(bar.decimal_close, decimal.Decimal("11.123456"))
+        self.assertEqual(bar.decimal("high_price"), decimal.Decimal("11.250000"))
+
+
+class ProviderHistory:
+    """
+    stands in for an online dao, serving the given closes as daily bars starting with first
+    """
+
+    first = datetime.date(2020, 1, 1)
+
+    def __init__(self, closes: list):
+        self.closes = closes
+        self.requests = list()
+
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date=None):
+        self.requests.append(start_date)
+        first = self.first
+        return [
+            Daily(security=security, date=first + datetime.timedelta(days=i), open_price=close,
+                  high_price=close, low=close, close=close, adj_close=close, volume=100)
+            for i, close in enumerate(self.closes)
+            if start_date is None or first + datetime.timedelta(days=i) >= start_date
+        ]
+
+
+class HistoryUpdate(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        return super().setUp()
+
+    def test_delta(self) -> None:
+        """
+        only the bars since the latest stored one are requested and added
+        """
+        provider = ProviderHistory([100.0 + i for i in range(50)])
+        self.assertEqual(update_history(self.security, online_dao=provider), 50)
+        self.assertEqual(provider.requests, [None])
+
+        provider.closes.extend([150.0, 151.0])
+        self.assertEqual(update_history(self.security, online_dao=provider), 2)
+        # the request starts with the overlap
+        self.assertEqual(provider.requests[-1], ProviderHistory.first + datetime.timedelta(days=45))
+        self.assertEqual(Daily.objects.filter(security=self.security).count(), 52)
+        self.assertEqual(float(self.security.daily_data.first().close), 151.0)
+
+    def test_revision(self) -> None:
+        """
+        a different close within the overlap, i.e. after a split, replaces the whole history
+        """
+        provider = ProviderHistory([100.0 + i for i in range(50)])
+        update_history(self.security, online_dao=provider)
+
+        provider.closes = [(100.0 + i) / 2 for i in range(51)]
+        self.assertEqual(update_history(self.security, online_dao=provider), 51)
+        self.assertEqual(provider.requests[-1], None)
+        self.assertEqual(
+            [float(close) for close in self.security.daily_data.values_list("close", flat=True)],
+            list(reversed(provider.closes)),
+        )
+
+
+    def test_resample(self) -> None:
+        """
+        weekly and monthly bars are derived from the daily history, recomputing the partial period
+        """
+        # 2020-01-01 is a Wednesday, the ISO week starts on 2019-12-30
+        provider = ProviderHistory([100.0 + i for i in range(50)])
+        update_history(self.security, online_dao=provider)
+
+        weekly = list(self.security.weekly_data.order_by("date"))
+        self.assertEqual(len(weekly), 8)
+        self.assertEqual(weekly[0].date, datetime.date(2019, 12, 30))
+        self.assertEqual((weekly[0].open_price, weekly[0].high_price, weekly[0].low, weekly[0].close), (100.0, 104.0, 100.0, 104.0))
+        self.assertEqual(weekly[0].volume, 500)
+        self.assertEqual((weekly[1].open_price, weekly[1].close, weekly[1].volume), (105.0, 111.0, 700))
+        # 2020-02-17 .. 2020-02-19
+        self.assertEqual((weekly[-1].date, weekly[-1].close, weekly[-1].volume), (datetime.date(2020, 2, 17), 149.0, 300))
+
+        monthly = list(self.security.monthly_data.order_by("date"))
+        self.assertEqual([bar.date for bar in monthly], [datetime.date(2020, 1, 1), datetime.date(2020, 2, 1)])
+        self.assertEqual((monthly[1].open_price, monthly[1].high_price, monthly[1].close, monthly[1].volume), (131.0, 149.0, 149.0, 1900))
+
+        # only the partial week and month are written again
+        provider.closes.extend([90.0, 200.0])
+        update_history(self.security, online_dao=provider)
+        weekly = list(self.security.weekly_data.order_by("date"))
+        self.assertEqual(len(weekly), 8)
+        self.assertEqual((weekly[-1].high_price, weekly[-1].low, weekly[-1].close, weekly[-1].volume), (200.0, 90.0, 200.0, 500))
+        self.assertEqual(self.security.monthly_data.first().close, 200.0)
+        self.assertIsNotNone(self.security.weeklyupdate_data.first())
+
+        # requesting the weekly history only requests daily bars
+        self.assertEqual(update_history(self.security, Interval.WEEKLY, online_dao=provider), 0)
+        self.assertEqual(provider.requests[-1], ProviderHistory.first + datetime.timedelta(days=47))
+
+
+class StandInResponse:
+    def __init__(self, status: int, data: bytes):
+        self.status = status
+        self.data = data
+
+
+class StandInHttp:
+    """
+    answers every request with the same response, recording the requests
+    """
+
+    def __init__(self, response: StandInResponse):
+        self.response = response
+        self.requests = list()
+
+    def request(self, method, url, fields=None, headers=None):
+        self.requests.append((url, fields))
+        return self.response
+
+
+class YahooHistory(TestCase):
+    def setUp(self) -> None:
+        yahoo = DataProvider.objects.create(name="Yahoo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=yahoo)
+        rows = [
+            f"{datetime.date(2020, 1, 6) + datetime.timedelta(days=i)},{70.0 + i},{71.0 + i},{69.0 + i},{70.5 + i},{70.25 + i},{1000 + i}"
+            for i in range(1, 15)
+        ]
+        csv_data = "\n".join([
+            "Date,Open,High,Low,Close,Adj Close,Volume",
+            "2020-01-02,74.06,75.15,73.80,75.09,73.46,135480400",
+            "2020-01-03,null,null,null,null,null,null",
+            "2020-01-06,73.45,74.99,73.19,74.95,73.33,118387200",
+            *rows,
+            f"{datetime.date.today()},80.00,81.00,79.00,80.50,80.50,100",
+        ])
+        self.http = StandInHttp(StandInResponse(200, csv_data.encode("utf-8")))
+        # the DAO without its mongo client, the history is not cached
+        self.dao = object.__new__(YahooDAO)
+        self.dao._history_client = self.http
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(RATE_LIMIT_DIR=pathlib.Path(directory.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        rate_limit._buckets.clear()
+        self.addCleanup(rate_limit._buckets.clear)
+        return super().setUp()
+
+    def test_lookup_history(self) -> None:
+        entries = self.dao.lookupHistory(self.security, start_date=datetime.date(2020, 1, 1))
+        # the bank holiday and today's bar are skipped
+        self.assertEqual(len(entries), 16)
+        self.assertEqual([entry.date for entry in entries[:2]], [datetime.date(2020, 1, 2), datetime.date(2020, 1, 6)])
+        self.assertIsInstance(entries[0], Daily)
+        self.assertEqual((entries[0].close, entries[0].adj_close, entries[0].volume), (75.09, 73.46, 135480400))
+
+        url, fields = self.http.requests[-1]
+        self.assertTrue(url.endswith("/AAPL"))
+        self.assertEqual(fields["interval"], Interval.DAILY.value)
+        self.assertEqual(
+            datetime.datetime.fromtimestamp(fields["period1"]).date(), datetime.date(2020, 1, 1)
+        )
+
+        entries = self.dao.lookupHistory(self.security, interval=Interval.WEEKLY)
+        self.assertIsInstance(entries[0], Weekly)
+
+    def test_update_history(self) -> None:
+        """
+        the default provider updates the history through the DAO
+        """
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertEqual(update_history(self.security, online_dao=self.dao), 16)
+        self.assertEqual(self.security.daily_data.count(), 16)
+
+
+class RecordingProviderHistory(ProviderHistory):
+    """
+    records the number of stored daily bars at each request
+    """
+
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date=None):
+        self.stored = getattr(self, "stored", []) + [Daily.objects.count()]
+        return super().lookupHistory(security, interval, look_back, start_date)
+
+
+class FailingProviderHistory(ProviderHistory):
+    """
+    fails to provide the history of MSFT
+    """
+
+    def lookupHistory(self, security: Security, interval=Interval.DAILY, look_back=200, start_date=None):
+        if security.symbol == "MSFT":
+            raise ValueError("No data available")
+        return super().lookupHistory(security, interval, look_back, start_date)
+
+
+class ProviderRefresh(TestCase):
+    def setUp(self) -> None:
+        self.tiingo = DataProvider.objects.create(name="Tiingo")
+        self.securities = [
+            Security.objects.create(symbol=symbol, name=symbol, data_provider=self.tiingo)
+            for symbol in ("AAPL", "MSFT", "IBM")
+        ]
+        return super().setUp()
+
+    def test_refresh(self) -> None:
+        """
+        each security is written as soon as its bars are received
+        """
+        provider = RecordingProviderHistory([100.0 + i for i in range(50)])
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertEqual(refresh_provider(self.tiingo, online_dao=provider), 150)
+        self.assertEqual(provider.stored, [0, 50, 100])
+        for security in self.securities:
+            self.assertEqual(security.daily_data.count(), 50)
+            self.assertEqual(security.weekly_data.count(), 8)
+            self.assertEqual(security.dailyindicators_data.count(), 50)
+
+        # securities updated today are skipped
+        self.assertEqual(refresh_provider(self.tiingo, online_dao=provider), 0)
+        self.assertEqual(len(provider.requests), 3)
+
+    def test_failure(self) -> None:
+        """
+        a security failing to update does not abort the refresh of the others
+        """
+        provider = FailingProviderHistory([100.0 + i for i in range(50)])
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertEqual(refresh_provider(self.tiingo, online_dao=provider), 100)
+        self.assertEqual([security.daily_data.count() for security in self.securities], [50, 0, 50])
+
+    def test_router(self) -> None:
+        router = HistoryWriterRouter()
+        # the in memory test database is written with the connection of the test case
+        self.assertEqual(router.db_for_write(Daily), "default")
+        self.assertEqual(router.db_for_write(DailyIndicators), "default")
+        self.assertIsNone(router.db_for_write(User))
+
+
+class HistoryWriterConnection(TransactionTestCase):
+    """
+    the history written with the writer alias, a second connection to a database file as in
+    production; the in memory test database is written with the default connection
+    """
+
+    databases = {"default", "writer"}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.wrappers = {alias: connections[alias] for alias in ("default", "writer")}
+        for alias, wrapper in cls.wrappers.items():
+            settings_dict = {**wrapper.settings_dict, "NAME": str(pathlib.Path(cls.directory.name) / "db.sqlite3")}
+            connections[alias] = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, alias)
+        call_command("migrate", database="default", verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        for alias, wrapper in cls.wrappers.items():
+            connections[alias].close()
+            connections[alias] = wrapper
+        cls.directory.cleanup()
+
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        settings = self.settings(HISTORY_CACHE_DIR=pathlib.Path(self.directory.name) / "history_cache")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return super().setUp()
+
+    def test_writer(self) -> None:
+        """
+        the history is written with the writer connection and read with the default one
+        """
+        self.assertEqual(HistoryWriterRouter().db_for_write(Daily), "writer")
+        self.assertIsNot(connections["writer"], connections["default"])
+
+        # cached by cachalot for the default alias
+        self.assertEqual(self.security.daily_data.count(), 0)
+        with CaptureQueriesContext(connections["writer"]) as written:
+            self.assertEqual(update_history(self.security, online_dao=ProviderHistory([100.0 + i for i in range(50)])), 50)
+        self.assertTrue(any(query["sql"].startswith("INSERT") for query in written.captured_queries))
+
+        # the invalidation of the writer is forwarded to the readers
+        self.assertEqual(self.security.daily_data.count(), 50)
+        self.assertEqual(self.security.dailyindicators_data.count(), 50)
+        self.assertEqual(DailyUpdate.objects.filter(security=self.security).count(), 1)
+
+
+class HistoryCache(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        closes = np.round(np.linspace(100, 130, 30), 6)
+        Daily.objects.bulk_create(
+            Daily(security=self.security, date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+                  open_price=close, high_price=close + 1, low=close - 1, close=close, adj_close=close, volume=i)
+            for i, close in enumerate(closes)
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = pathlib.Path(directory.name)
+        settings = self.settings(HISTORY_CACHE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return super().setUp()
+
+    def test_load(self) -> None:
+        # without an update marker the database is used
+        self.assertEqual(len(history_cache.load(self.security)), 30)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+        DailyUpdate.objects.create(security=self.security)
+        for arguments in [{}, {"limit": 10}, {"start": datetime.date(2020, 1, 5), "end": datetime.date(2020, 1, 20)}]:
+            cached = history_cache.load(self.security, **arguments)
+            frame = HistoryFrame.load(self.security, **arguments)
+            self.assertIsInstance(cached.close, np.memmap)
+            for name in ["date", "open", "high", "low", "close", "adj_close", "volume"]:
+                np.testing.assert_array_equal(getattr(cached, name), getattr(frame, name))
+        self.assertEqual(len(list(self.directory.glob("*.npy"))), 1)
+
+        with self.assertRaises(ValueError):
+            history_cache.load(self.security, "x")
+
+    def test_invalidation(self) -> None:
+        """
+        a new daily update marker replaces the cache file
+        """
+        DailyUpdate.objects.create(security=self.security)
+        history_cache.load(self.security)
+        previous = list(self.directory.glob("*.npy"))
+
+        provider = ProviderHistory([100.0 + i for i in range(40)])
+        with self.captureOnCommitCallbacks(execute=True):
+            update_history(self.security, online_dao=provider)
+
+        files = sorted(path.name.split("_")[1] for path in self.directory.glob("*.npy"))
+        self.assertEqual(files, ["d", "m", "w"])
+        self.assertFalse(previous[0].exists())
+        self.assertEqual(history_cache.load(self.security).close[-1], 139.0)
+        self.assertEqual(len(history_cache.load(self.security, "w")), len(self.security.weekly_data.all()))
+
+    def test_replaced_marker(self) -> None:
+        """
+        no file is left for a marker replaced while it is read or written
+        """
+        stale = DailyUpdate.objects.create(security=self.security)
+        marker = (stale.pk, stale.date)
+        stale.delete()
+        current = DailyUpdate.objects.create(security=self.security)
+        current_marker = (current.pk, current.date)
+
+        self.assertIsNone(history_cache.write(self.security, "d", marker))
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+        # a reader of the replaced marker maps the file of the current one
+        with mock.patch.object(history_cache, "_marker", side_effect=[marker, current_marker, current_marker]):
+            self.assertEqual(len(history_cache.load(self.security)), 30)
+        self.assertEqual(
+            [path.name for path in self.directory.glob("*.npy")],
+            [f"{self.security.pk}_d_{current.date:%Y%m%d}_{current.pk}.npy"],
+        )
+
+
+class StandInCollection:
+    """
+    the part of a mongo collection used by the lookup cache, counting the queries
+    """
+
+    name = full_name = "market_analysis.stand_in"
+
+    def __init__(self):
+        self.documents = dict()
+        self.queries = 0
+
+    def find(self, query):
+        self.queries += 1
+        return [dict(self.documents[key]) for key in query["symbol"]["$in"] if key in self.documents]
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            document = request._doc["$set"]
+            self.documents[request._filter["symbol"]] = {"symbol": request._filter["symbol"], **document}
+
+    def create_index(self, keys, **kwargs):
+        self.index = (keys, kwargs)
+
+
+class LookupCaching(TestCase):
+    def test_tiers(self) -> None:
+        collection = StandInCollection()
+        cache = LookupCache(collection, "price", ttl=300, size=2, retention=86400)
+        cache.put_many({"AAPL": {"price": 1}, "MSFT": {"price": 2}})
+        self.assertEqual(collection.index, ("updated", {"expireAfterSeconds": 86400}))
+
+        # served in process
+        self.assertEqual(cache.get_many(["AAPL", "MSFT"]), ({"AAPL": {"price": 1}, "MSFT": {"price": 2}}, {}))
+        self.assertEqual(collection.queries, 0)
+
+        # the least recently used entry is evicted and read from the collection again
+        cache.put("IBM", {"price": 3})
+        self.assertEqual(cache.get("AAPL"), {"price": 1})
+        self.assertEqual(collection.queries, 1)
+        self.assertIsNone(cache.get("GOOGL"))
+        self.assertEqual(cache.stats(), {"l1_hits": 2, "l2_hits": 1, "misses": 1, "size": 2})
+
+    def test_outdated(self) -> None:
+        collection = StandInCollection()
+        cache = LookupCache(collection, "price", ttl=300)
+        cache.put("AAPL", {"price": 1})
+        collection.documents["AAPL"]["timestamp"] -= 600
+        cache._entries.clear()
+
+        self.assertEqual(cache.get_many(["AAPL"]), ({}, {"AAPL": {"price": 1}}))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+class StandInLeases:
+    """
+    the part of a mongo collection used by the single flight
+    """
+
+    name = full_name = "market_analysis.leases"
+
+    def __init__(self):
+        self.documents = dict()
+
+    def insert_many(self, documents, ordered=True):
+        errors = list()
+        for index, document in enumerate(documents):
+            if document["_id"] in self.documents:
+                errors.append({"index": index, "code": 11000})
+            else:
+                self.documents[document["_id"]] = dict(document)
+        if len(errors) > 0:
+            raise pymongo.errors.BulkWriteError({"writeErrors": errors})
+
+    def find_one_and_update(self, query, update):
+        document = self.documents.get(query["_id"])
+        if document is None or document["expires"] >= query["expires"]["$lt"]:
+            return None
+        previous = dict(document)
+        document.update(update["$set"])
+        return previous
+
+    def update_many(self, query, update):
+        for key in query["_id"]["$in"]:
+            if key in self.documents and self.documents[key]["owner"] == query["owner"]:
+                self.documents[key].update(update["$set"])
+
+    def delete_many(self, query):
+        for key in query["_id"]["$in"]:
+            if key in self.documents and self.documents[key]["owner"] == query["owner"]:
+                del self.documents[key]
+
+    def count_documents(self, query):
+        return sum(
+            1 for key in query["_id"]["$in"]
+            if key in self.documents and self.documents[key]["expires"] > query["expires"]["$gt"]
+        )
+
+    def create_index(self, keys, **kwargs):
+        pass
+
+
+class SingleFlightLeases(TestCase):
+    def test_threads(self) -> None:
+        """
+        concurrent callers within the process wait for a single fetch
+        """
+        flight = SingleFlight(StandInLeases())
+        started, release = threading.Event(), threading.Event()
+        fetched = list()
+
+        def fetch(items):
+            fetched.append(items)
+            started.set()
+            release.wait(5)
+            return {item: item.lower() for item in items}
+
+        results = list()
+        leader = threading.Thread(target=lambda: results.append(flight.do_many("price", ["AAPL"], fetch, dict)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do_many("price", ["AAPL", "MSFT"], fetch, dict)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        # one of the followers fetches MSFT, the others wait for both fetches
+        while len(fetched) < 2:
+            release.wait(0.01)
+        release.wait(0.1)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(sorted(fetched), [["AAPL"], ["MSFT"]])
+        self.assertEqual(sorted(len(result) for result in results), [1, 2, 2, 2])
+        self.assertTrue(all(result["AAPL"] == "aapl" for result in results))
+        self.assertEqual(flight.leases.documents, {})
+
+    def test_processes(self) -> None:
+        """
+        the items leased by another process are read from the cache once its lease is released
+        """
+        leases = StandInLeases()
+        flight = SingleFlight(leases, lease_seconds=1, poll_seconds=0.01)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        leases.documents["price:AAPL"] = {"_id": "price:AAPL", "owner": "other", "expires": now + datetime.timedelta(seconds=60)}
+        leases.documents["price:MSFT"] = {"_id": "price:MSFT", "owner": "other", "expires": now - datetime.timedelta(seconds=1)}
+        fetched = list()
+
+        def fetch(items):
+            fetched.extend(items)
+            # meanwhile the other process writes the cache and releases its lease
+            leases.documents.pop("price:AAPL", None)
+            return {item: "fetched" for item in items}
+
+        def cached(items):
+            return {item: "cached" for item in items if item == "AAPL"}
+
+        values = flight.do_many("price", ["AAPL", "MSFT", "IBM"], fetch, cached)
+        # the expired lease is taken over
+        self.assertEqual(fetched, ["MSFT", "IBM"])
+        self.assertEqual(values, {"MSFT": "fetched", "IBM": "fetched", "AAPL": "cached"})
+
+    def test_slow_fetch(self) -> None:
+        """
+        a fetch taking longer than the lease is awaited by the other threads and processes, as the
+        lease is renewed meanwhile
+        """
+        leases = StandInLeases()
+        flight = SingleFlight(leases, lease_seconds=0.3, poll_seconds=0.01)
+        # another process sharing the leases
+        other = SingleFlight(leases, lease_seconds=0.3, poll_seconds=0.01)
+        cache = dict()
+        fetched = list()
+        started = threading.Event()
+
+        def fetch(items):
+            fetched.extend(items)
+            started.set()
+            sleep(1)
+            cache.update({item: item.lower() for item in items})
+            return {item: item.lower() for item in items}
+
+        def cached(items):
+            return {item: cache[item] for item in items if item in cache}
+
+        results = list()
+        leader = threading.Thread(target=lambda: results.append(flight.do_many("price", ["AAPL"], fetch, cached)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda single_flight=single_flight: results.append(
+                single_flight.do_many("price", ["AAPL"], fetch, cached)
+            ))
+            for single_flight in (flight, other)
+        ]
+        for follower in followers:
+            follower.start()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(fetched, ["AAPL"])
+        self.assertEqual(results, [{"AAPL": "aapl"}] * 3)
+        self.assertEqual(leases.documents, {})
+
+
+class RateLimiting(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = pathlib.Path(directory.name) / "Tiingo.bucket"
+        return super().setUp()
+
+    def test_burst(self) -> None:
+        # a clock advanced by the waits only
+        clock = [1000.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        # the clock and the rate are exact binary fractions, so are the waits
+        bucket = TokenBucket(self.path, rate=4, burst=2)
+        with mock.patch("data.rate_limit.time", lambda: clock[0]), mock.patch("data.rate_limit.sleep", sleep):
+            self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+            # the bucket is empty, a token is refilled after 1 / rate seconds
+            self.assertEqual(bucket.acquire(), 0.25)
+            clock[0] += 0.5
+            self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+            self.assertEqual(bucket.acquire(), 0.25)
+
+    def test_shared(self) -> None:
+        """
+        the buckets of the same file, as of different processes, share the tokens
+        """
+        bucket = TokenBucket(self.path, rate=0.001, burst=3)
+        other = TokenBucket(self.path, rate=0.001, burst=3)
+        self.assertEqual(bucket._take(2), 0.0)
+        self.assertEqual(other._take(1), 0.0)
+        self.assertGreater(bucket._take(1), 900)
+
+    def test_quotes(self) -> None:
+        """
+        the quote lookups of the views are not paced by the exhausted history bucket, a cold watchlist
+        of the S&P 500 does not wait for tokens
+        """
+        settings = self.settings(RATE_LIMIT_DIR=self.path.parent)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        rate_limit._buckets.clear()
+        self.addCleanup(rate_limit._buckets.clear)
+
+        history = rate_limit.limiter("Yahoo")
+        while history._take(1) == 0:
+            pass
+        quotes = rate_limit.limiter("YahooQuotes")
+        # price and forward pe of each security
+        self.assertEqual(max(quotes._take(1) for _ in range(2 * 500)), 0.0)
+
+        price = {"quoteSummary": {"result": [{"price": {"symbol": "AAPL"}}], "error": None}}
+        dao = object.__new__(YahooDAO)
+        dao._history_client = StandInHttp(StandInResponse(200, json.dumps(price).encode("utf-8")))
+        with mock.patch.object(rate_limit, "limiter", wraps=rate_limit.limiter) as limiter:
+            self.assertEqual(dao._request_price("AAPL"), ({"symbol": "AAPL"}, None))
+        limiter.assert_called_once_with("YahooQuotes")
+
+
+class ChartHistory(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        self.security = Security.objects.create(symbol="AAPL", name="Apple Inc.", data_provider=tiingo)
+        closes = 100 + np.cumsum(np.random.default_rng(7).normal(0, 1, 600))
+        Daily.objects.bulk_create(
+            Daily(security=self.security, date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+                  open_price=close, high_price=close + 1, low=close - 1, close=close, adj_close=close, volume=i)
+            for i, close in enumerate(closes)
+        )
+        self.client = Client()
+        self.client.force_login(User.objects.create(username="chart", role=1))
+        return super().setUp()
+
+    def _post(self, **payload) -> dict:
+        response = self.client.post(
+            reverse("security_history", args=[self.security.pk]),
+            data=json.dumps({"interval": "d", **payload}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_window(self) -> None:
+        complete = self._post()
+        self.assertEqual(len(complete["price"]), 600)
+        self.assertIsNone(complete["cursor"])
+
+        window = self._post(limit=100)
+        self.assertEqual([bar["time"] for bar in window["price"]], [bar["time"] for bar in complete["price"][-100:]])
+        self.assertEqual(window["cursor"], "2021-05-15")
+        # the overlays are settled at the start of the window
+        self.assertEqual(len(window["ema50"]), 100)
+        np.testing.assert_allclose(
+            [point["value"] for point in window["ema50"]],
+            [point["value"] for point in complete["ema50"][-100:]],
+            rtol=1e-6,
+        )
+
+        window = self._post(**{"from": "2020-02-01", "to": "2020-02-29"})
+        self.assertEqual((window["price"][0]["time"], window["price"][-1]["time"]), ("2020-02-01", "2020-02-29"))
+        self.assertEqual(window["volume"][0]["value"], 31.0)
+        self.assertEqual(window["ema50"][0]["time"], "2020-02-20")
+
+    def test_cursor(self) -> None:
+        """
+        paging back with the cursor returns the complete history
+        """
+        update_indicators(self.security)
+        complete = self._post()
+
+        pages, cursor = [], None
+        while True:
+            page = self._post(limit=250, cursor=cursor)
+            pages.insert(0, page)
+            cursor = page["cursor"]
+            if cursor is None:
+                break
+        self.assertEqual([len(page["price"]) for page in pages], [100, 250, 250])
+        for key in ["price", "ema50", "ema20", "bb_lower", "bb_upper", "macd", "volume"]:
+            self.assertEqual(sum((page[key] for page in pages), []), complete[key])
+
+    def test_invalid(self) -> None:
+        for payload in [{"limit": -1}, {"from": "yesterday"}, {"cursor": "2020-13-01"}]:
+            response = self.client.post(
+                reverse("security_history", args=[self.security.pk]),
+                data=json.dumps({"interval": "d", **payload}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.json()["error"], "invalid window")
+
+
+class DailyIndicatorsUpdate(TestCase):
+    def setUp(self) -> None:
+        tiingo = DataProvider.objects.create(name="Tiingo")
+        rng = np.random.default_rng(7)
+        self.securities = list()
+        for symbol, size in (("A", 400), ("B", 120), ("C", 30)):
+            security = Security.objects.create(symbol=symbol, name=symbol, data_provider=tiingo)
+            close = np.round(100 + np.cumsum(rng.normal(0, 1, size)), 6)
+            Daily.objects.bulk_create([
+                Daily(security=security, date=datetime.date.today() - datetime.timedelta(days=size - i),
+                      open_price=close[i], high_price=close[i] + 1, low=close[i] - 1, close=close[i],
+                      adj_close=close[i], volume=100)
+                for i in range(size)
+            ])
+            self.securities.append(security)
+        return super().setUp()
+
+    def test_incremental(self) -> None:
+        """
+        the incrementally written bars have the values of a complete calculation
+        """
+        security = self.securities[0]
+        self.assertEqual(update_indicators(security), 400)
+
+        Daily.objects.create(security=security, date=datetime.date.today(), open_price=90, high_price=91,
+                             low=89, close=90, adj_close=90, volume=100)
+        self.assertEqual(update_indicators(security), 1)
+        incremental = list(security.dailyindicators_data.order_by("date").values_list(*DailyIndicators.indicator_fields))
+
+        self.assertEqual(update_indicators(security, complete=True), 401)
+        complete = list(security.dailyindicators_data.order_by("date").values_list(*DailyIndicators.indicator_fields))
+        self.assertEqual(len(incremental), 401)
+        np.testing.assert_allclose(np.array(incremental, dtype=float), np.array(complete, dtype=float), rtol=1e-12)
+
+        latest = security.dailyindicators_data.first()
+        frame = HistoryFrame.load(security)
+        self.assertAlmostEqual(latest.ema50, ema_series(frame.close, 50)[-1])
+        self.assertAlmostEqual(latest.rsi, rsi_series(frame.close)[-1])
+        self.assertAlmostEqual(latest.macd_histogram, macd_series(frame.close)[2][-1])
+        self.assertIsNone(security.dailyindicators_data.order_by("date").first().ema20)
+
+    def test_watchlist(self) -> None:
+        """
+        the watchlist reads the stored indicators, with the same values as calculated
+        """
+        calculated = hl_watchlist_batch(self.securities)
+
+        call_command("backfill_indicators", processes=1, stdout=io.StringIO())
+        self.assertEqual(DailyIndicators.objects.count(), 550)
+        with self.assertNumQueries(2):
+            stored = hl_watchlist_batch(self.securities)
+
+        for expected, entry in zip(calculated, stored):
+            self.assertEqual(np.isnan(expected["ikh_evaluation"]), np.isnan(entry["ikh_evaluation"]))
+            if not np.isnan(expected["ikh_evaluation"]):
+                self.assertEqual(expected["ikh_evaluation"], entry["ikh_evaluation"])
+            for key in ["hurst", "sd", "delta"]:
+                if np.isnan(expected["sma"][key]):
+                    self.assertTrue(np.isnan(entry["sma"][key]))
+                else:
+                    self.assertAlmostEqual(expected["sma"][key], entry["sma"][key])
+
+
 class Onvista(TestCase):
     def setUp(self) -> None:
         onvista = DataProvider.objects.create(name="Onvista")
@@ -256,6 +1576,32 @@ class YahooYCL(TestCase):
         result = history_dao.lookupPrice("AAPP")
         self.assertEqual(result["error"], "Quote not found for ticker symbol: AAPP")
 
+    def test_read_prices(self):
+        data_provider = DataProvider.objects.get(name="Yahoo")
+        history_dao = History_DAO_Factory().get_online_dao(data_provider)
+
+        result = history_dao.lookupPrices(["AAPL", "MSFT", "AAPP"])
+        self.assertEqual(result["AAPL"]["shortName"], "Apple Inc.")
+        self.assertEqual(result["MSFT"]["symbol"], "MSFT")
+        self.assertEqual(result["AAPP"]["error"], "Quote not found for ticker symbol: AAPP")
+
+        # served from the cache
+        self.assertEqual(history_dao.lookupPrice("AAPL"), result["AAPL"])
+
+    def test_read_modules(self):
+        data_provider = DataProvider.objects.get(name="Yahoo")
+        history_dao = History_DAO_Factory().get_online_dao(data_provider)
+        apple = Security.objects.get(symbol="AAPL")
+        apple.type = "EQUITY"
+
+        modules = ["financialData", "defaultKeyStatistics", "summaryDetail"]
+        result = history_dao.lookup_modules(apple, modules)
+        self.assertEqual(list(result), modules)
+        self.assertIn("forwardPE", result["summaryDetail"])
+
+        # the modules are served from the cache, as by the single module lookups
+        self.assertEqual(history_dao.lookup_summary_detail(apple), result["summaryDetail"])
+
 
 from data.views import underlyings
 from data.open_interest import next_expiry_date, get_max_pain_history, update_data
@@ -10,8 +10,19 @@ from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
 
-from datetime import datetime, date
-from data.technical_analysis import EMA, SMA, BollingerBands, MACD, RSI, Ichimoku, hl_watchlist
+from datetime import datetime, date, timedelta
+from data.technical_analysis import (
+    EMA,
+    sma_latest,
+    IndicatorPipeline,
+    feed_history,
+    hl_watchlist_batch,
+    ema_series,
+    bollinger_series,
+    macd_series,
+)
+from data.ikh import ichimoku
+from data.indicator_helper import indicators_of, latest_of
 from data.ai_helper import generate
 from zoneinfo import ZoneInfo
 
@@ -21,6 +32,7 @@ logger = getLogger(__name__)
 
 import json
 import multiprocessing as mp
+import numpy as np
 import platform
 import time
 
@@ -28,7 +40,9 @@ if platform.system() == "Darwin":
     logger.info("As the system is 'Darwin', we are using 'fork' to start new processes.")
     mp.set_start_method("fork")
 
+from data import history_cache
 from data.history_dao import History_DAO_Factory, Interval
+from data.history_helper import refresh_provider, update_history
 from data.open_interest import (
     get_max_pain_history,
     next_expiry_date,
@@ -47,6 +61,7 @@ from .models import (
     WeeklyUpdate,
     Monthly,
     MonthlyUpdate,
+    HistoryFrame,
     Limit,
 )
 from .forms import WatchlistForm, SecurityForm, LimitForm
@@ -59,6 +74,38 @@ from typing import List, Dict
 RGB_RED = "rgba(255,82,82, 0.8)"
 RGB_GREEN = "rgba(0, 150, 136, 0.8)"
 
+
+# the bars of a chart window, and the bars preceding it for the overlays to be settled at its start
+CHART_BARS = 1000
+WARM_UP_BARS = 400
+
+
+def _history_window(provided_data: dict) -> tuple:
+    """
+    (start, end, limit) of the chart window of the payload, start and end are dates or None; the
+    cursor ends the window before the date it holds
+    """
+    start = provided_data.get("from")
+    end = provided_data.get("to")
+    cursor = provided_data.get("cursor")
+    limit = min(int(provided_data.get("limit") or CHART_BARS), CHART_BARS)
+    if limit < 1:
+        raise ValueError(f"Invalid limit {limit}.")
+
+    start = date.fromisoformat(start) if start else None
+    end = date.fromisoformat(end) if end else None
+    if cursor:
+        before = date.fromisoformat(cursor) - timedelta(days=1)
+        end = before if end is None else min(end, before)
+    return start, end, limit
+
+
+def _time_series(times: list, values: np.ndarray) -> list:
+    """
+    converts a vectorized indicator series to the (time:value) list used for charting, skipping NaN
+    """
+    return [{"time": times[i], "value": values[i]} for i in np.flatnonzero(~np.isnan(values))]
+
 # some decorators for user role management
 
 
@@ -104,12 +151,16 @@ def start(request):
 
     user = request.user
 
+    # the latest bars and the prices of all securities at once
+    frames = HistoryFrame.load_many(sec_2_watch, limit=400)
+    prices = dao.lookupPrices([security.symbol for security in sec_2_watch])
+
     for security in sec_2_watch:
         logger.debug(f"processing {security}")
         cheat = dict()
         cheat["security"] = security
         # used for reference and % display
-        price = dao.lookupPrice(security.symbol)
+        price = prices[security.symbol]
         current = price["regularMarketPrice"]["raw"]
         cheat["current"] = current
 
@@ -122,23 +173,19 @@ def start(request):
             }
         )
 
-        daily = security.daily_data.all()[:400]
+        # these are the predefined limits, resumed from the snapshot of the previous request
+        pipeline = IndicatorPipeline()
+        pipeline.ema("ema200", 200)
+        pipeline.ema("ema50", 50)
+        pipeline.ema("ema20", 20)
+        pipeline.bollinger("bb")
 
-        # these are the predefined limits
-        ema200 = EMA(200)
-        ema200_value = 0
-        ema50 = EMA(50)
-        ema50_value = 0
-        ema20 = EMA(20)
-        ema20_value = 0
-        bb = BollingerBands()
-        bb_entry = None
+        values = feed_history("start", security, pipeline, look_back=400, frame=frames[security.pk])
 
-        for entry in reversed(daily):
-            ema200_value = ema200.add(float(entry.close))
-            ema50_value = ema50.add(float(entry.close))
-            ema20_value = ema20.add(float(entry.close))
-            bb_entry = bb.add(float(entry.close))
+        ema200_value = values["ema200"]
+        ema50_value = values["ema50"]
+        ema20_value = values["ema20"]
+        bb_entry = values["bb"]
 
         entries.append(
             {
@@ -362,7 +409,7 @@ def watchlist_drop(request, watchlist_id):
 @login_required()
 def watchlist(request, watchlist_id: int):
     watchlist = Watchlist.objects.get(pk=watchlist_id)
-    securities = watchlist.securities.order_by("name").all()
+    securities = watchlist.securities.select_related("data_provider").order_by("name").all()
 
     # building watchlist
     watchlist_entries = list()
@@ -381,16 +428,11 @@ def watchlist(request, watchlist_id: int):
             # ... else, add to the the result 
             watchlist_entries.append(watchlist_entry)
             
-    # if anythig is to be processed ...
+    # if anythig is to be processed, calculate all entries at once
     if len(to_process) > 0:
-        # ... build a threat pool
-        with mp.Pool() as pool:
-            # process each entry
-            for result in pool.map(hl_watchlist, to_process):
-                # use a shallow copy, as the results come from another process
-                result_c = result.copy()
-                cache.add(result["security"].pk, result_c, timeout=300)
-                watchlist_entries.append(result_c)
+        for result in hl_watchlist_batch(to_process):
+            cache.add(result["security"].pk, result, timeout=300)
+            watchlist_entries.append(result)
         
     runtime = time.time() - start_time
     
@@ -544,28 +586,12 @@ def security_new(request, watchlist_id):
             #
             # add initial history for this entry
             #
-            online_dao = History_DAO_Factory().get_online_dao(sec.data_provider)
-
-            # request new history from online dao
-            result = online_dao.lookupHistory(security=sec, look_back=2000)
-            if len(result) > 10:
-                try:
-                    with transaction.atomic():
-                        # drop current history
-                        Daily.objects.filter(security=sec).delete()
-                        try:
-                            DailyUpdate.objects.get(security=sec).delete()
-                        except:
-                            pass
-
-                        # crate new history
-                        Daily.objects.bulk_create(result)
-                        DailyUpdate.objects.create(security=sec)
-                        messages.info(request, "History has been updated")
-
-                except DatabaseError as db_error:
-                    logger.error(db_error)
-                    messages.warning(request, "Error while updating")
+            try:
+                if update_history(sec, Interval.DAILY, look_back=2000) > 0:
+                    messages.info(request, "History has been updated")
+            except DatabaseError as db_error:
+                logger.error(db_error)
+                messages.warning(request, "Error while updating")
 
         else:
             if "__all__" in form.errors:
@@ -625,7 +651,7 @@ def security_search(request) -> JsonResponse:
     if request.method == "POST":
         securities = Security.objects.filter(
             Q(name__contains=query) | Q(symbol__contains=query)
-        )
+        ).select_related("data_provider")
         logger.info(f"found {securities.count()} entries for {query}")
 
         if securities.count() == 1:
@@ -641,14 +667,20 @@ def security_search(request) -> JsonResponse:
                 return HttpResponseRedirect(reverse("start"))
             else:
                 watchlist_entries: List = list()
+                # the bars required for the sma and the yahoo prices of all securities at once
+                frames = HistoryFrame.load_many(securities, limit=55)
+                yahoo = [security for security in securities if security.data_provider.name == "Yahoo"]
+                prices = dict()
+                if len(yahoo) > 0:
+                    prices = History_DAO_Factory().get_online_dao(yahoo[0].data_provider).lookupPrices(
+                        [security.symbol for security in yahoo]
+                    )
                 for security in securities:
                     watchlist_entry: Dict = dict()
                     watchlist_entry["security"] = security
                     dao = History_DAO_Factory().get_online_dao(security.data_provider)
                     if security.data_provider.name == "Yahoo":
-                        watchlist_entry["price"] = humanize_price(
-                            dao.lookupPrice(security.symbol)
-                        )
+                        watchlist_entry["price"] = humanize_price(prices[security.symbol])
 
                     try:
                         watchlist_entry["pe_forward"] = dao.lookup_summary_detail(
@@ -658,8 +690,7 @@ def security_search(request) -> JsonResponse:
                         watchlist_entry["pe_forward"] = "-"
 
                     try:
-                        history = security.daily_data.all()[:55]
-                        watchlist_entry["sma"] = SMA(50).latest(history)
+                        watchlist_entry["sma"] = sma_latest(frames[security.pk].close, 50)
                     except ValueError as va:
                         messages.warning(request, va)
 
@@ -701,53 +732,14 @@ def history_update(request, security_id):
                 reverse("security", kwargs={"security_id": sec.id})
             )
 
-    online_dao = History_DAO_Factory().get_online_dao(sec.data_provider)
-
-    # request new history from online dao
-    result = online_dao.lookupHistory(security=sec, interval=_interval, look_back=5000)
-    if len(result) > 10:
-        try:
-            with transaction.atomic():
-                if interval == "1d":
-                    # drop current history
-                    Daily.objects.filter(security=sec).delete()
-                    try:
-                        DailyUpdate.objects.get(security=sec).delete()
-                    except:
-                        pass
-
-                    # crate new history
-                    Daily.objects.bulk_create(result)
-                    DailyUpdate.objects.create(security=sec)
-                    messages.info(request, "Daily history has been updated")
-                elif interval == "1w":
-                    # drop current history
-                    Weekly.objects.filter(security=sec).delete()
-                    try:
-                        WeeklyUpdate.objects.get(security=sec).delete()
-                    except:
-                        pass
-
-                    # crate new history
-                    Weekly.objects.bulk_create(result)
-                    WeeklyUpdate.objects.create(security=sec)
-                    messages.info(request, "Weekly history has been updated")
-                elif interval == "1mo":
-                    # drop current history
-                    Monthly.objects.filter(security=sec).delete()
-                    try:
-                        MonthlyUpdate.objects.get(security=sec).delete()
-                    except:
-                        pass
-
-                    # crate new history
-                    Monthly.objects.bulk_create(result)
-                    MonthlyUpdate.objects.create(security=sec)
-                    messages.info(request, "Monthly history has been updated")
-
-        except DatabaseError as db_error:
-            logger.warn(db_error)
-            messages.warning(request, "Error while updating")
+    # request only the daily bars missing since the last update from online dao, the weekly and
+    # monthly bars are resampled from them
+    try:
+        if update_history(sec, _interval, look_back=5000) > 0:
+            messages.info(request, f"{_interval.name.capitalize()} history has been updated")
+    except DatabaseError as db_error:
+        logger.warn(db_error)
+        messages.warning(request, "Error while updating")
 
     # forward to security overview page
     return HttpResponseRedirect(reverse("security", kwargs={"security_id": sec.id}))
@@ -767,45 +759,32 @@ def technical_parameter(request, security_id) -> JsonResponse:
         data: Dict = dict()
         data["view"] = view
         if view == "sd":
-            daily = sec.daily_data.all()[:1000]
-
-            hurst_data = list()
-            sma50 = SMA(50)
-
-            for entry in reversed(daily):
-                sma50.add(float(entry.close))
-                sd_value = sma50.sigma_delta()
-                if sd_value is not None:
-                    hurst_data.append({"time": str(entry.date), "value": sd_value})
+            daily = history_cache.load(sec, "d", limit=1000)
 
-            data["tp_data"] = hurst_data
+            sd_values = indicators_of(sec, daily)["sigma_delta50"]
+            data["tp_data"] = _time_series(daily.times(), sd_values)
         elif view == "hurst":
-            daily = sec.daily_data.all()[:400]
+            daily = history_cache.load(sec, "d", limit=400)
 
-            hurst_data = list()
-            sma50 = SMA(50)
-
-            for entry in reversed(daily):
-                sma50.add(float(entry.close))
-                hurst_value = sma50.hurst()
-                if hurst_value is not None:
-                    hurst_data.append({"time": str(entry.date), "value": hurst_value})
-
-            data["tp_data"] = hurst_data
+            hurst_values = indicators_of(sec, daily)["hurst50"]
+            data["tp_data"] = _time_series(daily.times(), hurst_values)
         elif view == "ikh":
-            daily = sec.daily_data.all()[:400]
+            daily = history_cache.load(sec, "d", limit=400)
 
-            ikh_data = list()
-            ichimoku = Ichimoku()
+            ikh = ichimoku(high=daily.high, low=daily.low, close=daily.close)
 
-            for entry in reversed(daily):
-                ichimoku_entry = ichimoku.add(high=float(entry.open),
-                             low=float(entry.low),
-                              close=float(entry.close) )
-                
-                if ichimoku_entry is not None:
-                    ikh_data.append({"time":str(entry.date), "ikh": ichimoku_entry})
-                data["tp_data"] = ikh_data
+            # the projected cloud continues on the following business days
+            times = daily.times()
+            if len(daily) > 0:
+                projection = len(ikh["tenkan_sen"]) - len(daily)
+                future = np.busday_offset(daily.date[-1], np.arange(1, projection + 1), roll="forward")
+                times.extend(np.datetime_as_string(future, unit="D").tolist())
+
+            data["tp_data"] = [
+                {"time": times[i], "ikh": {key: (None if np.isnan(ikh[key][i]) else ikh[key][i]) for key in ikh}}
+                for i in range(len(times))
+                if not all(np.isnan(ikh[key][i]) for key in ikh)
+            ]
 
         logger.debug(data)
 
@@ -824,41 +803,35 @@ def tech_analysis(request, security_id) -> JsonResponse:
         data["error", "security has not been found"]
         return JsonResponse(data, status=404)
 
-    sma50 = SMA(50)
-    ema50 = EMA(50)
-    ema20 = EMA(20)
-
-    macd = MACD()
-    rsi = RSI()
-    bb = BollingerBands()
-
-    daily = sec.daily_data.all()[:1000]
-    for entry in reversed(daily):
-        close = float(entry.close)
-        sma50.add(close)
-        ema50_value = ema50.add(close)
-        ema20_value = ema20.add(close)
-        macd_value = macd.add(close)
-        rsi_value = rsi.add(close)
-        bb_value = bb.add(close)
-
-    if ema50_value is not None:
+    daily = history_cache.load(sec, "d", limit=1000)
+    if len(daily) == 0:
+        return JsonResponse(data, status=201)
+
+    close = daily.close[-1]
+    indicators = latest_of(sec, daily)
+
+    ema50_value = indicators["ema50"]
+    if not np.isnan(ema50_value):
         data["δEMA(50)[%]"] = 100 * (close - ema50_value) / ema50_value
 
-    if ema20_value is not None:
+    ema20_value = indicators["ema20"]
+    if not np.isnan(ema20_value):
         data["δEMA(20)[%]"] = 100 * (close - ema20_value) / ema20_value
 
-    if macd_value is not None:
-        data["MACD <sub>Histogram</sub>"] = macd_value[2]
+    macd_histogram = indicators["macd_histogram"]
+    if not np.isnan(macd_histogram):
+        data["MACD <sub>Histogram</sub>"] = macd_histogram
 
-    if rsi_value is not None:
+    rsi_value = indicators["rsi"]
+    if not np.isnan(rsi_value):
         data["RSI"] = rsi_value
 
-    sma50_sigma_delta = sma50.sigma_delta()
-    if sma50_sigma_delta is not None:
+    sma50_sigma_delta = indicators["sigma_delta50"]
+    if not np.isnan(sma50_sigma_delta):
         data["MA(50) spread"] = sma50_sigma_delta
 
-    if bb_value is not None:
+    bb_value = (indicators["bb_lower"], indicators["bb_upper"])
+    if not np.isnan(bb_value[0]):
         bb_center = (bb_value[0] + bb_value[1]) / 2
         bb_position_rel = close - bb_center
         if bb_position_rel >= 0:  # we are in the upper band
@@ -866,8 +839,8 @@ def tech_analysis(request, security_id) -> JsonResponse:
         else:
             data["BBands"] = -100 * bb_position_rel / (bb_value[0] - bb_center)
 
-    sma50_hurst = sma50.hurst()
-    if sma50_hurst is not None:
+    sma50_hurst = indicators["hurst50"]
+    if not np.isnan(sma50_hurst):
         if sma50_hurst > 0.5:
             data["Hurst<sub>trending</sub>"] = sma50_hurst
         else:
@@ -887,10 +860,12 @@ def fundamental_analysis(request, security_id) -> JsonResponse:
 
     if sec.type == "EQUITY" and sec.data_provider.name == "Yahoo":
         online_dao = History_DAO_Factory().get_online_dao(sec.data_provider)
+        # a single request for the modules not cached
+        modules = online_dao.lookup_modules(sec, ["financialData", "defaultKeyStatistics", "summaryDetail"])
         data = humanize_fundamentals(
-            online_dao.lookup_financial_data(sec),
-            online_dao.lookup_default_key_statistics(sec),
-            online_dao.lookup_summary_detail(sec),
+            modules["financialData"],
+            modules["defaultKeyStatistics"],
+            modules["summaryDetail"],
         )
         return JsonResponse(data, status=201)
     else:
@@ -903,6 +878,13 @@ def security_history(request, security_id) -> JsonResponse:
     POST: return a JsonResponse with a data dictionary holding:
         candle - ohlcv, Note: using the lookupPrice, we add the regular market as well
         EMA(50) and EMA(20)
+
+    the payload selects the window of bars:
+        interval - d, w or m
+        from, to - ISO dates of the first and the last bar (both including), optional
+        limit - the number of bars, at most and by default CHART_BARS
+        cursor - the cursor returned with a previous window, selecting the bars before that window
+    the returned cursor selects the preceding window, it is null if there are no earlier bars
     """
     data: Dict = dict()
 
@@ -915,77 +897,75 @@ def security_history(request, security_id) -> JsonResponse:
             provided_data = json.loads(request.body)
             interval = provided_data.get("interval")
             data["interval"] = interval
-            if interval == "d":
-                history = security.daily_data.all()[:1000]
-
-            elif interval == "w":
-                history = security.weekly_data.all()[:1000]
-            elif interval == "m":
-                history = security.monthly_data.all()[:1000]
-            else:
+            try:
+                start, end, limit = _history_window(provided_data)
+            except (TypeError, ValueError):
+                data["error"] = "invalid window"
+                return JsonResponse(data, status=500)
+            try:
+                # the bars up to the end of the window, mapped from the cache; without a start only the
+                # window and its warm-up bars are needed
+                history = history_cache.load(
+                    security, interval, end=end, limit=None if start is not None else limit + WARM_UP_BARS
+                )
+            except ValueError:
                 data["error"] = "invalid interval"
                 return JsonResponse(data, status=500)
 
-            prices_data = list()
-            ema50_data = list()
-            ema50 = EMA(50)
-
-            ema20_data = list()
-            ema20 = EMA(20)
+            last = len(history)
+            first = 0 if start is None else int(np.searchsorted(history.date, np.datetime64(start, "D")))
+            first = max(first, last - limit)
+            # the overlays are calculated including the warm-up bars preceding the window
+            warm_up = max(first - WARM_UP_BARS, 0)
+            history = history[warm_up:]
+            window = slice(first - warm_up, None)
 
-            bb = BollingerBands()
-            bb_lower = list()
-            bb_upper = list()
+            close = history.close
 
-            macd = MACD()
-            macd_history_data = list()
+            if interval == "d":
+                # the daily overlays are maintained with the history
+                indicators = indicators_of(security, history)
+                ema50, ema20 = indicators["ema50"], indicators["ema20"]
+                lower, upper = indicators["bb_lower"], indicators["bb_upper"]
+                macd_histogram = indicators["macd_histogram"]
+            else:
+                ema50, ema20 = ema_series(close, 50), ema_series(close, 20)
+                lower, upper = bollinger_series(close)
+                macd_histogram = macd_series(close)[2]
 
-            volume_data = list()
+            previous_close = np.concatenate(([0.0], close[:-1]))[window]
+            history = history[window]
+            close = history.close
+            times = history.times()
 
-            previous_close: float = 0
-            for entry in reversed(history):
-                close = float(entry.close)
-                # building the prices data using time and ohlc
-                prices_data.append(
-                    {
-                        "time": str(entry.date),
-                        "open": float(entry.open_price),
-                        "high": float(entry.high_price),
-                        "low": float(entry.low),
-                        "close": close,
-                    }
+            prices_data = [
+                {
+                    "time": day,
+                    "open": open_price,
+                    "high": high,
+                    "low": low,
+                    "close": close_price,
+                }
+                for day, open_price, high, low, close_price in zip(
+                    times, history.open.tolist(), history.high.tolist(), history.low.tolist(), close.tolist()
                 )
+            ]
 
-                ema50_value = ema50.add(close)
-                if ema50_value is not None:
-                    ema50_data.append({"time": str(entry.date), "value": ema50_value})
-
-                ema20_value = ema20.add(close)
-                if ema20_value is not None:
-                    ema20_data.append({"time": str(entry.date), "value": ema20_value})
-
-                volume_value = float(entry.volume)
-                if volume_value > 0:
-                    volume_data.append(
-                        {
-                            "time": str(entry.date),
-                            "value": volume_value,
-                            "color": RGB_GREEN if close >= previous_close else RGB_RED,
-                        }
-                    )
-
-                bollinger = bb.add(close)
-                if bollinger is not None:
-                    bb_lower.append({"time": str(entry.date), "value": bollinger[0]})
-                    bb_upper.append({"time": str(entry.date), "value": bollinger[1]})
+            ema50_data = _time_series(times, ema50[window])
+            ema20_data = _time_series(times, ema20[window])
+            bb_lower = _time_series(times, lower[window])
+            bb_upper = _time_series(times, upper[window])
+            macd_history_data = _time_series(times, macd_histogram[window])
 
-                macd_value = macd.add(close)
-                if macd_value is not None:
-                    macd_history_data.append(
-                        {"time": str(entry.date), "value": macd_value[2]}
-                    )
-
-                previous_close = close
+            volume = history.volume.astype(float)
+            volume_data = [
+                {
+                    "time": times[i],
+                    "value": volume[i],
+                    "color": RGB_GREEN if close[i] >= previous_close[i] else RGB_RED,
+                }
+                for i in np.flatnonzero(volume > 0)
+            ]
 
             data["price"] = prices_data
             data["ema50"] = ema50_data
@@ -994,14 +974,16 @@ def security_history(request, security_id) -> JsonResponse:
             data["macd"] = macd_history_data
             data["bb_upper"] = bb_upper
             data["bb_lower"] = bb_lower
+            # the first bar of the window, if there are earlier ones
+            data["cursor"] = times[0] if first > 0 and len(times) > 0 else None
         else:
             data["error"] = "security not found"
 
         symbol = security.symbol
         dataProvider = security.data_provider
 
-        if dataProvider.name == "Yahoo":
-            # looking up additional information
+        if dataProvider.name == "Yahoo" and end is None:
+            # looking up additional information, if the window includes the latest bar
             online_dao = History_DAO_Factory().get_online_dao(dataProvider)
 
             price = online_dao.lookupPrice(symbol)
@@ -1039,39 +1021,11 @@ def update_by_provider(request, data_provider:str):
         data["error"] = f"no data provider found for '{data_provider}'"
         return JsonResponse(data, status=501)
 
-    for security in Security.objects.filter(data_provider=dp).all():
-        _today = date.today()
-        last_updated: DailyUpdate = security.dailyupdate_data.first()
-
-        if last_updated is not None:
-            if last_updated.date == _today:
-                logger.info(f"no update required for {security}")
-                continue
-
-        online_dao = History_DAO_Factory().get_online_dao(security.data_provider)
-
-        # request new history from online dao
-        result = online_dao.lookupHistory(security=security, look_back=5000)
-        logger.info(len(result))
-        if len(result) > 10:
-            try:
-                with transaction.atomic():
-                    # drop current history
-                    Daily.objects.filter(security=security).delete()
-                    try:
-                        DailyUpdate.objects.get(security=security).delete()
-                    except:
-                        pass
-
-                    # crate new history
-                    Daily.objects.bulk_create(result)
-                    DailyUpdate.objects.create(security=security)
-                    logger.info(f"Daily history has been updated for {security.symbol}")
-
-            except DatabaseError as db_error:
-                logger.error(db_error)
-
-        time.sleep(5)
+    # each security is merged within its own short transaction, readers are not blocked by the refresh
+    try:
+        data["bars"] = refresh_provider(dp, look_back=5000)
+    except DatabaseError as db_error:
+        logger.error(db_error)
 
     return JsonResponse(data, status=200)
 
@@ -86,9 +86,20 @@ DATABASES = {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
         # "NAME": "/data/market_analysis/db.sqlite3"
-    }
+    },
+    # a dedicated connection for the history updates, see data/routers.py
+    "writer": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["data.routers.HistoryWriterRouter"]
+
+# the alias the history is written with
+HISTORY_WRITER_DB = "writer"
+
 AUTH_USER_MODEL = "data.User"
 LOGIN_URL = "login"
 
@@ -99,6 +110,12 @@ CACHES = {
     }
 }
 
+# memory mapped history files shared by all processes, see data/history_cache.py
+HISTORY_CACHE_DIR = BASE_DIR / "history_cache"
+
+# token buckets limiting the requests per provider shared by all processes, see data/rate_limit.py
+RATE_LIMIT_DIR = BASE_DIR / "rate_limits"
+
 #CRONJOBS = [
 #    ("*/2 * * * *", "data.cron.my_cron_job")
 #]